@@ -1,9 +1,26 @@
 import os
+import time
+from core.timing import span, NULL_SPAN
+from core.metrics import STEGO_APPLY, STEGO_APPLY_SECONDS
 from core.algorithm_stubs import (
     run_simple_jpg_steg,
     mp3_steg,
-    mp4_steg
+    mp4_steg,
+    run_s_uniward,
+    run_wow,
+    run_hugo,
+    run_mvg,
+    run_stc,
+    run_jpeg_dct,
+    lsb_capacity,
+    extract_lsb,
+    embed_cost_ordered_batch,
+    PayloadTooLarge,
+    LSB_COST_FUNCTIONS,
+    HEADER_MARKER
 )
+from core.raster import RASTER_EXTENSIONS
+from core.jpeg_coeffs import JPEG_EXTENSIONS
 
 ALGORITHM_FN_MAP = {
     "jpg": run_simple_jpg_steg,
@@ -13,6 +30,22 @@ ALGORITHM_FN_MAP = {
     "mp4": mp4_steg
 }
 
+# Cost-ordered LSB algorithms only survive lossless re-encoding, so they are routed by the carrier's
+# algorithm name for these extensions; everything else is routed by extension.
+LSB_ALGORITHM_FN_MAP = {
+    "s-uniward": run_s_uniward,
+    "wow": run_wow,
+    "hugo": run_hugo,
+    "mvg": run_mvg
+}
+LOSSLESS_IMAGE_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff")
+# Sequential STC embeds into the pixel samples of uncompressed BMP/TIFF files (core.raster), in place
+RASTER_ALGORITHM_FN_MAP = {
+    "stc": run_stc
+}
+# JPEGs would lose pixel LSBs on re-encoding, so the same algorithm names embed into their quantized
+# DCT coefficients instead (core.jpeg_coeffs); progressive or too-small JPEGs keep the extension's route
+
 ALGORITHM_MAP = {
     ".png": "s-uniward",
     ".jpg": "wow",
@@ -43,40 +76,162 @@ def is_extension_supported(file_path):
 def list_supported_extensions():
     return sorted(ALGORITHM_MAP.keys())
 
-def route_algorithm(path):
+def route_algorithm(path, algorithm=None):
     ext = os.path.splitext(path)[1].lower()
+    lsb_fn = LSB_ALGORITHM_FN_MAP.get((algorithm or "").lower())
+    if lsb_fn is not None and ext in LOSSLESS_IMAGE_EXTENSIONS:
+        return lsb_fn
+    if lsb_fn is not None and ext in JPEG_EXTENSIONS:
+        return run_jpeg_dct
+    raster_fn = RASTER_ALGORITHM_FN_MAP.get((algorithm or "").lower())
+    if raster_fn is not None and ext in RASTER_EXTENSIONS:
+        return raster_fn
     algo_key = ext.lstrip('.')
     return ALGORITHM_FN_MAP.get(algo_key)
 
-def stego_apply(carrier_path, payload, algorithm, output_path=None):
-    fn = route_algorithm(carrier_path)
+def _payload_size(payload):
+    if isinstance(payload, (str, os.PathLike)):
+        return os.path.getsize(payload)
+    return sum(memoryview(buf).nbytes for buf in payload)
+
+def _resolve_apply(carrier_path, payload, algorithm, output_path):
+    """Routed stego function, payload buffers and output path for one stego_apply call."""
+    fn = route_algorithm(carrier_path, algorithm)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = [memoryview(payload)]
+    lsb_fns = list(LSB_ALGORITHM_FN_MAP.values()) + list(RASTER_ALGORITHM_FN_MAP.values()) + [run_jpeg_dct]
+    if fn in lsb_fns and _payload_size(payload) > lsb_capacity(carrier_path, algorithm.lower()):
+        fallback = route_algorithm(carrier_path)
+        span("stego_apply.fallback", algorithm=algorithm, fallback=getattr(fallback, "__name__", None)).end()
+        fn = fallback
     if fn is None:
         raise ValueError(f"No stego function found for extension: {carrier_path}")
 
     if output_path is None:
         output_path = os.path.splitext(carrier_path)[0] + "_stego" + os.path.splitext(carrier_path)[1]
+    return fn, payload, output_path
+
+def _record_apply(fn, output_path, ok=True, s=NULL_SPAN, error=None):
+    """Counts the call and tags its span with the outcome (the caller reports errors to the user)."""
+    if ok and os.path.exists(output_path):
+        STEGO_APPLY.inc(algorithm=fn.__name__, status="success")
+        s.tag(status="success")
+        return
+    STEGO_APPLY.inc(algorithm=fn.__name__, status="error")
+    s.tag(status="error", error=str(error) if error is not None else f"Output file not found: {output_path}")
 
-    print(f"[stego_apply] Running {fn.__name__} on {carrier_path} → {output_path}")
-    if isinstance(payload, bytes):
-        temp_payload_path = output_path + ".payload"
-        with open(temp_payload_path, "wb") as f:
-            f.write(payload)
-        payload_path = temp_payload_path
-    else:
-        payload_path = payload
-
-    try:
-        result = fn(carrier_path, payload_path, output_path)
-        if not os.path.exists(output_path):
-            print(f"[ERROR] Output file not found after embedding: {output_path}")
+def stego_apply(carrier_path, payload, algorithm, output_path=None, progress=None):
+    """
+    Embeds `payload` into the carrier with the routed algorithm.
+    payload may be a file path, a bytes-like object, or a list of buffers (e.g. [header, body]
+    memoryviews); buffers are handed to the algorithm as-is, without temp files or concatenation.
+    `progress` (core.progress.TaskProgress) receives per-phase progress; if its job is cancelled,
+    JobCancelled propagates out of here instead of being reported as an algorithm failure.
+    Lossless images and JPEGs use the named LSB algorithm when the payload fits, otherwise the extension's route.
+    """
+    fn, payload, output_path = _resolve_apply(carrier_path, payload, algorithm, output_path)
+    return _run_apply(fn, carrier_path, payload, output_path, progress)
+
+def _run_apply(fn, carrier_path, payload, output_path, progress):
+    started = time.perf_counter()
+    with span(f"stego_apply.{fn.__name__}", carrier=os.path.basename(carrier_path)) as s:
+        try:
+            result = fn(carrier_path, payload, output_path, progress=progress)
+            _record_apply(fn, output_path, s=s)
+            return result
+        except PayloadTooLarge as e:
+            # Wet samples only show up in the cost map the embed builds anyway, so capacity is settled here
+            fallback = route_algorithm(carrier_path)
+            _record_apply(fn, output_path, ok=False, s=s, error=e)
+            if fallback is None or fallback is fn:
+                return None
+            s.tag(fallback=fallback.__name__)
+            return _run_apply(fallback, carrier_path, payload, output_path, progress)
+        except Exception as e:
+            _record_apply(fn, output_path, ok=False, s=s, error=e)
+            return None
+        finally:
+            STEGO_APPLY_SECONDS.observe(time.perf_counter() - started, algorithm=fn.__name__)
+
+def stego_apply_batch(jobs, progress=None, workers=None):
+    """
+    stego_apply for many (carrier_path, payload, algorithm, output_path) jobs at once. Jobs routed to
+    the same cost-ordered LSB algorithm on lossless images are embedded together: carriers of the
+    same size are stacked and costed in one vectorized pass, and decoded/written on `workers`
+    threads (see embed_cost_ordered_batch). Other jobs run through stego_apply one at a time.
+    Returns one result per job, in order (output path or None).
+    """
+    results = [None] * len(jobs)
+    batches = {}
+    for i, (carrier_path, payload, algorithm, output_path) in enumerate(jobs):
+        try:
+            fn, payload, output_path = _resolve_apply(carrier_path, payload, algorithm, output_path)
+        except (ValueError, OSError) as e:
+            span("stego_apply", carrier=os.path.basename(carrier_path), status="error", error=str(e)).end()
+            continue
+        if fn in LSB_ALGORITHM_FN_MAP.values():
+            batches.setdefault(algorithm.lower(), []).append((i, (carrier_path, payload, output_path)))
         else:
-            print(f"[OK] Stego file created: {output_path}")
-        return result
-    except Exception as e:
-        print(f"[stego_apply ERROR] {e}")
-        return None
-
-def stego_extract(carrier_path, output_path=None):
-    # Placeholder — to be implemented
-    pass
+            results[i] = _run_apply(fn, carrier_path, payload, output_path, progress)
+
+    for name, members in batches.items():
+        fn = LSB_ALGORITHM_FN_MAP[name]
+        started = time.perf_counter()
+        with span(f"stego_apply.{fn.__name__}", amount=len(members), unit="files") as s:
+            outputs = embed_cost_ordered_batch([job for _, job in members], LSB_COST_FUNCTIONS[name],
+                                               progress=progress, workers=workers)
+            s.tag(failed=sum(output is None for output in outputs))
+        per_job = (time.perf_counter() - started) / len(members)
+        for (i, (carrier_path, payload, output_path)), output in zip(members, outputs):
+            if output is None:  # E.g. the payload needed wet samples: alone, stego_apply can fall back
+                output = _run_apply(fn, carrier_path, payload, output_path, progress)
+            else:
+                _record_apply(fn, output_path)
+                STEGO_APPLY_SECONDS.observe(per_job, algorithm=fn.__name__)
+            results[i] = output
+    return results
+
+def _lsb_candidates(carrier_path, exhaustive=True):
+    """
+    LSB algorithms that may have embedded into this carrier: STC (no cost map) first, then the
+    extension's default, which is what the embed tab picks. Without `exhaustive` the other
+    cost-ordered algorithms are left out, so a carrier with no payload costs at most one cost map.
+    """
+    ext = os.path.splitext(carrier_path)[1].lower()
+    if ext in JPEG_EXTENSIONS:
+        return [ALGORITHM_MAP[ext]]  # Every LSB algorithm name embeds JPEGs the same way
+    if ext not in LOSSLESS_IMAGE_EXTENSIONS:
+        return []
+    default = ALGORITHM_MAP.get(ext)
+    names = (list(RASTER_ALGORITHM_FN_MAP) if ext in RASTER_EXTENSIONS else []) + list(LSB_ALGORITHM_FN_MAP)
+    names = sorted(names, key=lambda name: (name not in RASTER_ALGORITHM_FN_MAP, name != default))
+    if not exhaustive:
+        names = [name for name in names if name in RASTER_ALGORITHM_FN_MAP or name == default]
+    return names
+
+def stego_extract(carrier_path, output_path=None, algorithm=None, expect_prefix=HEADER_MARKER, progress=None,
+                  exhaustive=True):
+    """
+    Recovers a payload embedded in pixel/sample LSBs (appended payloads are read by steg_engine directly).
+    Without `algorithm`, each candidate for the extension is tried (see _lsb_candidates for `exhaustive`);
+    a wrong guess is rejected after the length prefix and `expect_prefix` (the metadata marker), so only
+    the cost map is computed per try.
+    `progress` receives each try's cost_map phase; cancelling it raises JobCancelled.
+    Returns the embedded bytes (also written to output_path if given), or None.
+    """
+    candidates = [algorithm.lower()] if algorithm else _lsb_candidates(carrier_path, exhaustive)
+    for name in candidates:
+        with span(f"stego_extract.{name}") as s:
+            try:
+                data = extract_lsb(carrier_path, name, expect_prefix, progress)
+            except Exception as e:
+                s.tag(error=str(e))
+                data = None
+        if data is None:
+            continue
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(data)
+        return data
+    return None
 
@@ -1,262 +1,882 @@
 import os
+import sys
+import functools
 import numpy as np
 from PIL import Image
-import pywt
 import math
 import hashlib
+import zlib
 from datetime import datetime
 import json
 from pydub import AudioSegment
 import wave
 import contextlib
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from scipy.signal import wiener
 from scipy.fftpack import dct , idct
-from scipy.ndimage import uniform_filter, convolve
+from scipy.ndimage import convolve
 from utils.key_encoder import generate_dict_checksum
+from core.progress import ensure_progress
+from core.timing import span
+from core.raster import parse_raster, clone_file, map_raster, RASTER_EXTENSIONS
+from core.jpeg_coeffs import read_jpeg, JPEG_EXTENSIONS
+from core.parallel_costs import compute_costs
+from core.filter_bank import pad_symmetric, residuals, spread, spread_each, crop, PADDING
+from core.embedding_simulator import simulate
 
 HEADER_MARKER = b"RYGELHDR\0"
 
-def run_stc(carrier_path, payload_path, output_path):
+# Algorithms receive an optional `progress` (core.progress.TaskProgress). They report work per phase
+# (cost_map, selection, embed, write) and check for cancellation every chunk of this many units.
+PROGRESS_CHUNK = 1 << 16
+WRITE_CHUNK = 4 << 20  # Bytes per writev call, so long writes stay cancellable
+
+
+# --- Payload buffers ---
+# Algorithms receive the payload either as a file path (legacy), a bytes-like object, or a list of
+# buffers such as [header, body] memoryviews from steg_engine. Buffers are written straight to the
+# output with os.writev, so the payload is never concatenated or staged in a temp file.
+def _payload_buffers(payload) -> list:
+    if isinstance(payload, (str, os.PathLike)):
+        with open(payload, 'rb') as f:
+            return [memoryview(f.read())]
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return [memoryview(payload).cast('B')]
+    return [memoryview(buf).cast('B') for buf in payload]
+
+
+def _payload_bytes(payload) -> bytes:
+    """Contiguous payload for algorithms that need random access to its bits."""
+    with span("payload_join") as s:
+        buffers = _payload_buffers(payload)
+        data = buffers[0].tobytes() if len(buffers) == 1 else b"".join(buffers)
+        s.add(len(data))
+    return data
+
+
+def _is_framed(buffers) -> bool:
+    """True when the payload already starts with steg_engine's metadata header."""
+    return bool(buffers) and buffers[0][:len(HEADER_MARKER)].tobytes() == HEADER_MARKER
+
+
+def _writev_all(fd, buffers, progress=None):
+    progress = ensure_progress(progress)
+    views = [memoryview(buf).cast('B') for buf in buffers if len(buf)]
+    if not hasattr(os, "writev"):  # Windows
+        for view in views:
+            while view:
+                written = os.write(fd, view[:WRITE_CHUNK])
+                view = view[written:]
+                progress.advance(written)
+        return
+    while views:
+        # Batch up to IOV_MAX buffers and about WRITE_CHUNK bytes per call
+        batch, size = [], 0
+        for view in views[:1024]:
+            if size >= WRITE_CHUNK:
+                break
+            batch.append(view[:WRITE_CHUNK - size])
+            size += len(batch[-1])
+        written = os.writev(fd, batch)
+        progress.advance(written)
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if written:
+            views[0] = views[0][written:]
+
+
+def _frame_payload(buffers, metadata=None) -> list:
     """
-    STC-like simulation: Embed payload bits into carrier using selective bit flipping with parity-style constraint
+    Wraps a raw payload in a metadata header (and null terminator) for the media helpers.
+    Payloads from steg_engine already carry their header and are passed through untouched;
+    wrapping them again would hide the real header from extract_payload.
     """
+    if _is_framed(buffers):
+        return buffers
+    metadata = metadata or {}
+    metadata.setdefault("version", "RYG-1.0")
+    metadata.setdefault("timestamp", datetime.now().isoformat())
+    metadata.setdefault("type", "genuine")
+    metadata.setdefault("dict_checksum", generate_dict_checksum())
+    metadata.setdefault("matryoshka_layers", 1)
+    metadata.setdefault("encryption", "None")
+    metadata.setdefault("masked", False)
+    metadata_block = HEADER_MARKER + json.dumps(metadata).encode("utf-8") + b"\0"
+    return [memoryview(metadata_block)] + buffers + [memoryview(b"\0")]
+
+
+def _write_buffers(output_path, buffers, progress=None):
+    progress = ensure_progress(progress)
+    progress.phase("write", sum(len(buf) for buf in buffers), "bytes")
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
     try:
-        with open(carrier_path, 'rb') as f:
-            carrier_bytes = bytearray(f.read())
+        _writev_all(fd, buffers, progress)
+    finally:
+        os.close(fd)
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
 
-        payload_bits = ''.join(f'{byte:08b}' for byte in payload)
-        payload_index = 0
+def _open_grayscale(carrier_path):
+    """Decodes the carrier to 8-bit grayscale (timed as the "decode" stage)."""
+    with span("decode", unit="pixels") as s:
+        img = Image.open(carrier_path).convert("L")
+        s.add(img.size[0] * img.size[1])
+    return img
 
-        block_size = 8
-        max_capacity = len(carrier_bytes) // block_size
 
-        if len(payload_bits) > max_capacity * block_size:
-            raise ValueError("Payload too large to embed in carrier.")
+def _save_image(img, output_path, progress):
+    progress.phase("write", img.size[0] * img.size[1], "pixels")
+    img.save(output_path)
+    progress.advance(img.size[0] * img.size[1])
 
-        for i in range(0, len(carrier_bytes), block_size):
-            if payload_index >= len(payload_bits):
-                break
 
-            for j in range(block_size):
-                bit_pos = i + j
-                if bit_pos >= len(carrier_bytes) or payload_index >= len(payload_bits):
-                    break
-                target_bit = int(payload_bits[payload_index])
-                carrier_bytes[bit_pos] = (carrier_bytes[bit_pos] & 0xFE) | target_bit
-                payload_index += 1
+def _open_pixels(carrier_path):
+    """
+    Decodes a carrier for the LSB algorithms into an (H, W, C) uint8 array of its color channels
+    (C = 1 for grayscale, 3 for color), its alpha channel (or None) and the mode it is saved in.
+    Palette and other modes are expanded to RGB/RGBA, since palette-index LSBs are not colors.
+    """
+    with span("decode", unit="pixels") as s:
+        with Image.open(carrier_path) as img:
+            mode = img.mode
+            if mode not in ("L", "LA", "RGB", "RGBA"):
+                mode = "RGBA" if img.has_transparency_data else "RGB"
+            data = np.array(img if img.mode == mode else img.convert(mode), dtype=np.uint8)
+        s.add(data.shape[0] * data.shape[1])
+    if data.ndim == 2:
+        data = data[:, :, None]
+    alpha = None
+    if mode in ("LA", "RGBA"):
+        alpha = data[:, :, -1]
+        data = np.ascontiguousarray(data[:, :, :-1])
+    return data, alpha, mode
+
+
+def _save_pixels(pixels, alpha, output_path, progress):
+    """Saves channels from _open_pixels with the alpha channel reattached (same mode as the carrier)."""
+    data = pixels if alpha is None else np.dstack([pixels, alpha])
+    if data.shape[2] == 1:
+        data = data[:, :, 0]
+    _save_image(Image.fromarray(data), output_path, progress)
+
+
+# --- Cost-ordered LSB embedding ---
+# The LSB algorithms embed a 32-bit big-endian length, the payload and a CRC-32 of the payload,
+# one bit per sample LSB, in order of increasing cost. Color carriers are embedded jointly: costs are
+# computed per channel on (H, W, C) arrays and the cheapest samples of all channels are used.
+# Cost functions also take (N, H, W, C) stacks of same-size carriers, costing each image exactly
+# as they would on its own.
+# Costs are computed from the image with its LSBs cleared, so they are identical before and
+# after embedding and extraction can rebuild the exact same order from the stego image.
+# Algorithms that embed with ±1 changes clear the two lowest bits instead (PM1_MASK).
+LENGTH_PREFIX_BITS = 32
+FRAME_CHECK_BITS = 32
+LSB_MASK = 0xFE
+PM1_MASK = 0xFC  # A ±1 change kept inside its aligned group of four values never touches bits 2-7
+EMBED_CHUNK_BITS = PROGRESS_CHUNK * 16  # Bits written per vectorized step between progress checks
+SELECT_BLOCK = 1 << 20  # Costs compared per step while collecting the cheapest samples, bounding the temporaries
+
+
+def _frame_bits(payload) -> np.ndarray:
+    data = _payload_bytes(payload)
+    if len(data) >= 1 << LENGTH_PREFIX_BITS:
+        raise ValueError("Payload too large for the 32-bit length prefix.")
+    prefix = np.unpackbits(np.frombuffer(len(data).to_bytes(4, "big"), dtype=np.uint8))
+    check = np.unpackbits(np.frombuffer(zlib.crc32(data).to_bytes(4, "big"), dtype=np.uint8))
+    return np.concatenate([prefix, np.unpackbits(np.frombuffer(data, dtype=np.uint8)), check])
+
+
+def _float_order(values: np.ndarray) -> np.ndarray:
+    """uint32 view of float32 `values`, remapped in place so unsigned order is float order (-0.0 folded into 0.0)."""
+    values += np.float32(0)
+    bits = values.view(np.uint32)
+    negative = bits >= 0x80000000
+    np.invert(bits, out=bits, where=negative)
+    np.bitwise_or(bits, np.uint32(0x80000000), out=bits, where=~negative)
+    return bits
+
+
+def _cheapest_indices(costs: np.ndarray, k: int) -> np.ndarray:
+    """
+    The first k indices of np.argsort(costs, kind="stable") (ties broken by position), found
+    with a partition so only the selected k costs are sorted. Embedding and extraction both
+    use this, so the order never depends on the sort implementation. float32 costs are selected
+    block by block straight into uint64 (cost, position) sort keys and returned as int32, so no
+    full-size index array is ever built.
+    """
+    n = costs.size
+    if k <= 0:
+        return np.empty(0, dtype=np.int32)
+    if costs.dtype != np.float32 or n >= 1 << 31:
+        if k >= n:
+            return np.argsort(costs, kind="stable")
+        kth = np.partition(costs, k - 1)[k - 1]
+        below = np.flatnonzero(costs < kth)
+        ties = np.flatnonzero(costs == kth)[:k - below.size]
+        chosen = np.concatenate([below, ties])
+        chosen.sort()
+        return chosen[np.argsort(costs[chosen], kind="stable")]
+
+    k = min(k, n)
+    keys = np.empty(k, dtype=np.uint64)
+    words = keys.view(np.uint32).reshape(k, 2)
+    low = 0 if sys.byteorder == "little" else 1
+    positions, ranks = words[:, low], words[:, 1 - low]
+    if k == n:
+        positions[:] = np.arange(n, dtype=np.uint32)
+    else:
+        kth = np.partition(costs, k - 1)[k - 1]
+        count, ties, tie_count = 0, [], 0
+        for start in range(0, n, SELECT_BLOCK):
+            block = costs[start:start + SELECT_BLOCK]
+            below = np.flatnonzero(block < kth)
+            positions[count:count + below.size] = below + start
+            count += below.size
+            if tie_count < k:  # Never more than k ties are needed
+                tie = np.flatnonzero(block == kth)[:k - tie_count]
+                ties.append((tie + start).astype(np.uint32))
+                tie_count += tie.size
+        positions[count:] = np.concatenate(ties)[:k - count]
+    ranks[:] = _float_order(costs[positions])
+    keys.sort()
+    return positions.astype(np.int32)
+
+
+def _embed_lsb(flat: np.ndarray, positions: np.ndarray, bits: np.ndarray, progress, layout=None, matching=None):
+    """
+    Writes `bits` into the LSBs of flat[positions]. With a core.raster layout, `flat` is the
+    mapped file and positions are sample indices, translated to file offsets chunk by chunk.
+    With a `matching` Generator, samples whose LSB differs are moved by ±1 instead of having the
+    LSB replaced, without leaving their aligned group of four values: +1 at the bottom of the
+    group, -1 at the top, and a random direction in between.
+    """
+    progress.phase("embed", bits.size, "bits")
+    for start in range(0, bits.size, EMBED_CHUNK_BITS):
+        idx = positions[start:start + EMBED_CHUNK_BITS]
+        chunk = bits[start:start + EMBED_CHUNK_BITS]
+        if layout is not None:
+            idx = layout.sample_offsets(idx)
+        if matching is None:
+            flat[idx] = (flat[idx] & LSB_MASK) | chunk
+        else:
+            values = flat[idx].astype(np.int16)
+            low = values & 3
+            up = (low == 0) | ((low != 3) & (matching.random(idx.size) < 0.5))
+            flat[idx] = values + np.where(up, 1, -1) * ((values & 1) != chunk)
+        progress.advance(idx.size)
+
+
+def _read_lsb(flat: np.ndarray, costs: np.ndarray = None, expect_prefix: bytes = b"", layout=None):
+    """
+    Reads a length-prefixed payload from the LSBs of `flat`, in cost order (or in sequence
+    when costs is None). Returns None when the length or `expect_prefix` doesn't match,
+    which is how a wrong algorithm guess is rejected after reading only a few dozen bits,
+    or when the payload fails its CRC-32.
+    With a core.raster layout, `flat` is the mapped file and only the selected samples are read.
+    """
+    def positions(k):
+        idx = np.arange(k) if costs is None else _cheapest_indices(costs, k)
+        return idx if layout is None else layout.sample_offsets(idx)
 
-        with open(output_path, 'wb') as f:
-            f.write(carrier_bytes)
+    samples = flat.size if layout is None else layout.samples
+    if samples < LENGTH_PREFIX_BITS:
+        return None
+    length = int.from_bytes(np.packbits(flat[positions(LENGTH_PREFIX_BITS)] & 1).tobytes(), "big")
+    end = LENGTH_PREFIX_BITS + 8 * length
+    if length < len(expect_prefix) or end + FRAME_CHECK_BITS > samples:
+        return None
+    if expect_prefix:
+        probe = positions(LENGTH_PREFIX_BITS + 8 * len(expect_prefix))[LENGTH_PREFIX_BITS:]
+        if np.packbits(flat[probe] & 1).tobytes() != expect_prefix:
+            return None
+    idx = positions(end + FRAME_CHECK_BITS)
+    data = np.packbits(flat[idx[LENGTH_PREFIX_BITS:end]] & 1).tobytes()
+    check = int.from_bytes(np.packbits(flat[idx[end:]] & 1).tobytes(), "big")
+    return data if zlib.crc32(data) == check else None
 
-        return output_path
 
-    except Exception as e:
-        print(f"[run_stc ERROR] {e}")
-        return None
+WOW_P = -1  # Hölder norm exponent aggregating the three directional suitabilities
+WOW_WET_COST = 1e10  # Pixels flat in some direction are never used
+WOW_FLAT_XI = 1e-2  # Suitability treated as flat (0); FFT round-off leaves ~1e-4 where the image is flat
 
 
-def run_s_uniward(carrier_path, payload_path, output_path):
+def _wow_costs(pixels: np.ndarray) -> np.ndarray:
     """
-    Python-based approximation of S-UNIWARD using wavelet-domain distortion modeling.
-    Input: grayscale PNG/JPEG, payload file (binary), output file path.
+    WOW: each direction's embedding suitability xi_k = |R_k| convolved with |rot180(K_k)|, from the
+    db8 directional residuals (core.filter_bank), aggregated by the Hölder norm with p = -1:
+    rho = (Σ_k xi_k^p)^(-1/p) = Σ_k 1/xi_k. A pixel is only cheap if it is textured in every direction.
     """
-    try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
-
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
-
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
+    xi = (crop(x) for x in spread_each(np.abs(r, out=r) for r in residuals(pad_symmetric(pixels))))
+    with np.errstate(divide="ignore"):
+        rho = sum(np.where(x > WOW_FLAT_XI, x, 0) ** WOW_P for x in xi) ** (-1 / WOW_P)
+    return np.minimum(rho, WOW_WET_COST)
 
-        coeffs = pywt.wavedec2(img_np, 'db8', level=2)
-        _, (LH, HL, HH) = coeffs[1]
-        cost_map = np.abs(LH) + np.abs(HL) + np.abs(HH)
-        cost_map = 1 / (1 + cost_map)
-        cost_map = np.clip(cost_map, 0.001, 1.0)
 
-        flat_img = img_np.flatten()
-        flat_costs = np.repeat(cost_map.flatten(), 1)
-        modifiable_indices = np.argsort(flat_costs)
+S_UNIWARD_SIGMA = 1.0  # Keeps 1/|residual| finite in flat regions (the reference spatial-domain value)
 
-        if total_bits > len(modifiable_indices):
-            raise ValueError("Payload too large to embed with distortion constraints.")
 
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            current_pixel = int(flat_img[idx])
-            if (current_pixel % 2) != bit:
-                flat_img[idx] = np.clip(current_pixel ^ 1, 0, 255)
+def _s_uniward_costs(pixels: np.ndarray) -> np.ndarray:
+    """
+    S-UNIWARD relative distortion at full resolution: the sum, over the three db8 directional
+    residuals and every residual sample a pixel feeds, of |filter tap| / (sigma + |residual|).
+    Changes in textured regions barely move the residuals relative to their size, so they are cheap.
+    """
+    maps = residuals(pad_symmetric(pixels))
+    return crop(spread(1 / (S_UNIWARD_SIGMA + np.abs(r, out=r)) for r in maps))
+
+
+def _hugo_costs(pixels: np.ndarray, gamma: float = 1.0, sigma: float = 1.0) -> np.ndarray:
+    # Cost of -1 plus cost of +1 from 3-pixel difference cliques along four directions
+    img = pixels.astype(np.float32)
+    padded = np.pad(img, pad_width=((0, 0),) * (img.ndim - 3) + ((3, 3), (3, 3), (0, 0)), mode='reflect')
+    rows, cols = img.shape[-3:-1]
+    del img
+
+    def add_cost(out, k, l, m):
+        # out += (sigma + |(k, l, m)|) ** -gamma, in one temporary
+        t = k * k
+        t += l * l
+        t += m * m
+        np.sqrt(t, out=t)
+        t += sigma
+        out += np.power(t, -gamma, out=t)
+
+    minus = np.zeros(pixels.shape, dtype=np.float32)
+    plus = np.zeros(pixels.shape, dtype=np.float32)
+    for dr, dc in ((-1, 1), (0, 1), (1, 1), (1, 0)):
+        p = [padded[..., 3 + dr * k:3 + dr * k + rows, 3 + dc * k:3 + dc * k + cols, :] for k in range(-3, 4)]
+        d = [p[i + 1] - p[i] for i in range(6)]
+        for sign, out in ((-1, minus), (1, plus)):
+            add_cost(out, d[0], d[1], d[2] + sign)
+            add_cost(out, d[1], d[2] + sign, d[3] - sign)
+            add_cost(out, d[2] + sign, d[3] - sign, d[4])
+            add_cost(out, d[3] - sign, d[4], d[5])
+    plus[pixels == 255] = np.inf
+    minus[pixels == 0] = np.inf
+    minus += plus
+    return minus
+
+
+def _window_sums(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Separable weighted sums over every len(weights)^2 window of (..., H, W, C) values ('valid' region)."""
+    n = len(weights)
+    rows = sum(w * values[..., i:values.shape[-3] - n + 1 + i, :, :] for i, w in enumerate(weights))
+    return sum(w * rows[..., i:rows.shape[-2] - n + 1 + i, :] for i, w in enumerate(weights))
+
+
+def _mvg_costs(pixels: np.ndarray, window_size: int = 8) -> np.ndarray:
+    """
+    Negative Fisher information 1/variance^2, where each pixel's variance is the summed DCT-coefficient
+    variance of the 8x8 windows covering it. The orthonormal DCT keeps the sum of squares, and the
+    coefficient sum of a window is w^T B w with w = column sums of the DCT matrix, so every window's
+    variance comes from two separable window sums instead of a DCT per window.
+    """
+    img = pixels.astype(np.float64)
+    size = window_size * window_size
+    w = dct(np.eye(window_size), norm='ortho', axis=0).sum(axis=0)
+    energy = _window_sums(img * img, np.ones(window_size))
+    coeff_sum = _window_sums(img, w)
+    window_var = np.maximum(energy / size - (coeff_sum / size) ** 2, 0.0)
+    # Scatter each window's variance onto its pixels: full-size window sums of the zero-padded map
+    spatial = (window_size - 1, window_size - 1)
+    padding = ((0, 0),) * (window_var.ndim - 3) + (spatial, spatial, (0, 0))
+    variances = _window_sums(np.pad(window_var, padding), np.ones(window_size)) / size
+    with np.errstate(divide='ignore'):
+        fisher_map = np.reciprocal(np.square(variances, out=variances), out=variances)
+    np.nan_to_num(fisher_map, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.negative(fisher_map, out=fisher_map).astype(np.float32)  # Highest Fisher information first
+
+
+# Rows of neighbours each cost depends on, so the cost map can be computed in tiles
+COST_HALOS = {
+    _s_uniward_costs: PADDING,
+    _wow_costs: PADDING,
+    _hugo_costs: 3,
+    _mvg_costs: 7,
+}
+# Cost functions whose algorithms embed with ±1 changes (LSB matching) instead of LSB replacement
+PM1_COST_FUNCTIONS = (_wow_costs,)
+
+
+def _base_cost_fn(cost_fn):
+    return getattr(cost_fn, "func", cost_fn)  # functools.partial carries its parameters
+
+
+# The cost order is recomputed at extraction, possibly on another host. FFTs, np.power and
+# reductions differ there in the last bits (library versions, SIMD dispatch), so costs are rounded
+# to COST_PRECISION_BITS significand bits first (a ~3% cost step; the k cheapest cost <0.5% more).
+# Only a cost within an ulp of a rounding midpoint, about 1 in 2^18 per ulp of difference, can
+# still land differently, instead of every cost that has a near neighbour.
+COST_PRECISION_BITS = 4
+
+
+def _quantize_costs(costs: np.ndarray) -> np.ndarray:
+    """Rounds float32 costs in place to COST_PRECISION_BITS significand bits (nearest, ties away from zero)."""
+    drop = 23 - COST_PRECISION_BITS
+    half, keep = np.uint32(1 << (drop - 1)), np.uint32((0xFFFFFFFF << drop) & 0xFFFFFFFF)
+    flat = costs.reshape(-1)
+    for start in range(0, flat.size, SELECT_BLOCK):
+        bits = flat[start:start + SELECT_BLOCK].view(np.uint32)
+        np.add(bits, half, out=bits, where=(bits & 0x7F800000) != 0x7F800000)  # inf/NaN stay as they are
+        bits &= keep
+    return costs
+
+
+def _cost_map(cost_fn, pixels: np.ndarray, progress=None) -> np.ndarray:
+    """
+    Flat float32 costs of the masked pixels, tiled (and parallel for large images) where the cost
+    function allows, quantized so their order survives last-bit differences between hosts.
+    """
+    mask = PM1_MASK if _base_cost_fn(cost_fn) in PM1_COST_FUNCTIONS else LSB_MASK
+    costs = compute_costs(cost_fn, pixels & mask, COST_HALOS.get(_base_cost_fn(cost_fn)), progress)
+    return _quantize_costs(costs.astype(np.float32, copy=False)).ravel()
 
-        stego_img = Image.fromarray(flat_img.reshape(img_np.shape).astype(np.uint8))
-        stego_img.save(output_path)
-        return output_path
 
-    except Exception as e:
-        print(f"[run_s_uniward ERROR] {e}")
+def _matching_rng(cost_fn, bits: np.ndarray):
+    """±1 direction generator for the LSB-matching algorithms (None: LSB replacement), seeded from the payload."""
+    if _base_cost_fn(cost_fn) not in PM1_COST_FUNCTIONS:
         return None
+    return np.random.default_rng(int.from_bytes(hashlib.sha256(np.packbits(bits).tobytes()).digest()[:8], "big"))
 
 
-def run_hugo(carrier_path, payload_path, output_path, gamma=1.0, sigma=1.0):
+def _raster_layout(carrier_path, output_path=None):
     """
-    HUGO-inspired embedding: calculates pixel-wise costs using directional differences and embeds data minimizing distortion.
+    core.raster layout of an uncompressed BMP/TIFF carrier, or None. Such carriers are embedded
+    in place: the file is cloned to the output and only the selected samples are rewritten,
+    instead of decoding the image and encoding it again.
     """
+    if output_path is not None and os.path.splitext(output_path)[1].lower() != os.path.splitext(carrier_path)[1].lower():
+        return None
+    return parse_raster(carrier_path)
+
+
+def _read_raster(layout, data):
+    with span("decode", unit="pixels") as s:
+        pixels, _ = layout.read_pixels(data)
+        s.add(layout.width * layout.height)
+    return pixels
+
+
+def _write_raster(carrier_path, output_path, layout, positions, bits, progress, matching=None):
+    """Clones the carrier and writes the payload bits at `positions` straight into the output file."""
+    clone_file(carrier_path, output_path)
+    mm = map_raster(output_path, writable=True)
     try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.int32)
-        padded = np.pad(img_np, pad_width=3, mode='reflect')
+        _embed_lsb(mm, positions, bits, progress, layout, matching)
+        progress.phase("write", bits.size, "bits")
+        mm.flush()
+        progress.advance(bits.size)
+    finally:
+        del mm
 
-        rows, cols = img_np.shape
-        costs = np.zeros((rows, cols, 3), dtype=np.float32)  # [decrease, unchanged, increase]
 
-        def eval_cost(k, l, m):
-            return (sigma + math.sqrt(k*k + l*l + m*m)) ** -gamma
+class PayloadTooLarge(ValueError):
+    """The payload does not fit the carrier with this algorithm; stego_apply falls back to the format's route."""
 
-        def eval_direction(r, c, dr, dc):
-            p = [padded[r + dr*k, c + dc*k] for k in range(-3, 4)]
-            d = [p[i+1] - p[i] for i in range(6)]
-            pixel_costs = np.zeros(3)
 
-            pixel_costs[0] += eval_cost(d[0], d[1], d[2]-1) + eval_cost(d[1], d[2]-1, d[3]+1)
-            pixel_costs[2] += eval_cost(d[0], d[1], d[2]+1) + eval_cost(d[1], d[2]+1, d[3]-1)
+def _select_positions(costs: np.ndarray, k: int) -> np.ndarray:
+    """The k cheapest positions; PayloadTooLarge if the payload would need wet (never-used) samples."""
+    positions = _cheapest_indices(costs, k)
+    if k and not costs[positions[-1]] < WOW_WET_COST:  # The last selected cost is the largest (inf/NaN too)
+        raise PayloadTooLarge("Payload too large for the carrier's non-wet capacity.")
+    return positions
 
-            pixel_costs[0] += eval_cost(d[2]-1, d[3]+1, d[4]) + eval_cost(d[3]+1, d[4], d[5])
-            pixel_costs[2] += eval_cost(d[2]+1, d[3]-1, d[4]) + eval_cost(d[3]-1, d[4], d[5])
 
-            return pixel_costs
+def _usable_samples(carrier_path, cost_fn) -> int:
+    """Carrier samples whose cost is below WOW_WET_COST, i.e. that the algorithm may change."""
+    layout = _raster_layout(carrier_path)
+    pixels = _read_raster(layout, map_raster(carrier_path)) if layout is not None else _open_pixels(carrier_path)[0]
+    return int(np.count_nonzero(_cost_map(cost_fn, pixels) < WOW_WET_COST))
 
-        for r in range(rows):
-            for c in range(cols):
-                r_p, c_p = r + 3, c + 3
-                total = eval_direction(r_p, c_p, -1, 1) + eval_direction(r_p, c_p, 0, 1) + \
-                        eval_direction(r_p, c_p, 1, 1) + eval_direction(r_p, c_p, 1, 0)
-                if img_np[r, c] == 255:
-                    total[2] = np.inf
-                if img_np[r, c] == 0:
-                    total[0] = np.inf
-                costs[r, c] = [total[0], 0, total[2]]
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
+def _embed_cost_ordered(carrier_path, payload_path, output_path, cost_fn, progress):
+    layout = _raster_layout(carrier_path, output_path)
+    if layout is not None:
+        pixels, alpha = _read_raster(layout, map_raster(carrier_path)), None
+    else:
+        pixels, alpha, _ = _open_pixels(carrier_path)
+    bits = _frame_bits(payload_path)
+    if bits.size > pixels.size:
+        raise PayloadTooLarge("Payload too large to embed into carrier.")
+
+    progress.phase("cost_map", pixels.size, "pixels")
+    costs = _cost_map(cost_fn, pixels, progress)
+
+    progress.phase("selection", bits.size, "pixels")
+    positions = _select_positions(costs, bits.size)
+    progress.advance(bits.size)
+
+    del costs
+    matching = _matching_rng(cost_fn, bits)
+    if layout is not None:
+        del pixels
+        _write_raster(carrier_path, output_path, layout, positions, bits, progress, matching)
+        return output_path
+    _embed_lsb(pixels.reshape(-1), positions, bits, progress, matching=matching)
+    _save_pixels(pixels, alpha, output_path, progress)
+    return output_path
 
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
 
-        flat_img = img_np.flatten()
-        cost_scores = (costs[:, :, 0] + costs[:, :, 2]).flatten()
-        modifiable_indices = np.argsort(cost_scores)
+# --- Batched cost-ordered embedding ---
+# Stacking only pays off while per-call overhead dominates (thumbnail-sized carriers); larger
+# stacks push the cost temporaries out of cache and run slower than one image at a time.
+BATCH_MAX_SAMPLES = 1 << 16
 
-        if total_bits > len(modifiable_indices):
-            raise ValueError("Payload too large to embed into carrier.")
 
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            pixel_val = flat_img[idx]
-            if (pixel_val % 2) != bit:
-                flat_img[idx] = np.clip(pixel_val ^ 1, 0, 255)
+def _carrier_shape(carrier_path) -> tuple:
+    """(H, W, C) that _open_pixels/_read_raster would decode, read from the header only."""
+    layout = parse_raster(carrier_path)
+    if layout is not None:
+        return layout.height, layout.width, layout.channels
+    with Image.open(carrier_path) as img:
+        return img.size[1], img.size[0], 1 if img.mode in ("L", "LA") else 3
+
+
+def _load_job(job):
+    carrier_path, payload, output_path = job
+    layout = _raster_layout(carrier_path, output_path)
+    if layout is not None:
+        pixels, alpha = _read_raster(layout, map_raster(carrier_path)), None
+    else:
+        pixels, alpha, _ = _open_pixels(carrier_path)
+    bits = _frame_bits(payload)
+    if bits.size > pixels.size:
+        raise PayloadTooLarge("Payload too large to embed into carrier.")
+    return pixels, alpha, layout, bits
+
+
+def _embed_stack(jobs, members, cost_fn) -> dict:
+    """Embeds same-shape carriers whose costs are computed as one (N, H, W, C) stack; job index -> output."""
+    loaded, outputs = {}, {}
+    for i in members:
+        try:
+            loaded[i] = _load_job(jobs[i])
+        except PayloadTooLarge:
+            pass  # Left None for the caller (stego_apply_batch retries it alone, with its fallback)
+        except Exception as e:
+            print(f"[embed_cost_ordered_batch ERROR] {jobs[i][0]}: {e}")
+    if not loaded:
+        return outputs
+    costs = _cost_map(cost_fn, np.stack([pixels for pixels, _, _, _ in loaded.values()])).reshape(len(loaded), -1)
+    progress = ensure_progress(None)  # Runs on a pool thread; the batch reports progress per file
+    for row, (i, (pixels, alpha, layout, bits)) in enumerate(loaded.items()):
+        carrier_path, _, output_path = jobs[i]
+        try:
+            positions = _select_positions(costs[row], bits.size)
+            matching = _matching_rng(cost_fn, bits)
+            if layout is not None:
+                _write_raster(carrier_path, output_path, layout, positions, bits, progress, matching)
+            else:
+                _embed_lsb(pixels.reshape(-1), positions, bits, progress, matching=matching)
+                _save_pixels(pixels, alpha, output_path, progress)
+            outputs[i] = output_path
+        except PayloadTooLarge:
+            pass
+        except Exception as e:
+            print(f"[embed_cost_ordered_batch ERROR] {carrier_path}: {e}")
+    return outputs
+
+
+def embed_cost_ordered_batch(jobs, cost_fn, progress=None, workers=None) -> list:
+    """
+    Embeds many (carrier_path, payload, output_path) jobs with one cost-ordered LSB algorithm.
+    Small carriers of the same shape are stacked into (N, H, W, C) arrays costed in one pass, and
+    stacks are decoded, costed and written concurrently on `workers` threads. Every carrier gets
+    exactly the costs, and so the output, it would get on its own. Returns output path or None per job.
+    """
+    progress = ensure_progress(progress)
+    groups = {}
+    for i, (carrier_path, _, _) in enumerate(jobs):
+        try:
+            groups.setdefault(_carrier_shape(carrier_path), []).append(i)
+        except Exception as e:
+            print(f"[embed_cost_ordered_batch ERROR] {carrier_path}: {e}")
+    stacks = []
+    for shape, members in groups.items():
+        per_stack = max(1, BATCH_MAX_SAMPLES // int(np.prod(shape)))
+        stacks.extend(members[start:start + per_stack] for start in range(0, len(members), per_stack))
+
+    results = [None] * len(jobs)
+    progress.phase("embed", len(jobs), "files")
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or os.cpu_count() or 1, len(stacks) or 1))) as pool:
+        futures = [pool.submit(_embed_stack, jobs, members, cost_fn) for members in stacks]
+        try:
+            for members, future in zip(stacks, futures):
+                for i, output in future.result().items():
+                    results[i] = output
+                progress.advance(len(members))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+
+# --- JPEG coefficient-domain embedding ---
+# JPEG carriers are embedded in their quantized DCT coefficients instead of their pixels, which would
+# not survive re-encoding. Only nonzero AC coefficients with |c| >= 2 are used: changing their LSB
+# keeps them nonzero and in the same Huffman size category, so core.jpeg_coeffs only flips one bit of
+# the scan per changed coefficient. Costs are quantizer step / (|c| with its LSB cleared), so they are
+# the same before and after embedding, and cheapest coefficients are used first as for the pixels.
+def _is_jpeg(path) -> bool:
+    return os.path.splitext(path)[1].lower() in JPEG_EXTENSIONS
+
+
+def _open_jpeg(carrier_path):
+    with span("decode", unit="coefficients") as s:
+        jc = read_jpeg(carrier_path)
+        if jc is None:
+            raise ValueError("Only baseline Huffman-coded JPEGs can be embedded in the coefficient domain.")
+        s.add(jc.ac["k"].size)
+    return jc
+
+
+def _jpeg_usable(jc):
+    """Indices into jc.ac of the usable coefficients, their values and their embedding costs."""
+    usable = np.flatnonzero(jc.ac["size"] >= 2)
+    values = jc.ac["value"][usable]
+    steps = np.stack([jc.quant_tables[comp["tq"]] for comp in jc.components])
+    component = jc.blocks[0][jc.ac["block"][usable]]
+    costs = np.divide(steps[component, jc.ac["k"][usable]], np.abs(values) & ~1, dtype=np.float32)
+    return usable, values, costs
+
+
+def _embed_jpeg(carrier_path, payload_path, output_path, progress):
+    jc = _open_jpeg(carrier_path)
+    bits = _frame_bits(payload_path)
+    progress.phase("cost_map", jc.ac["k"].size, "coefficients")
+    usable, values, costs = _jpeg_usable(jc)
+    progress.advance(jc.ac["k"].size)
+    if bits.size > usable.size:
+        raise ValueError("Payload too large to embed into carrier.")
+
+    progress.phase("selection", bits.size, "coefficients")
+    positions = _cheapest_indices(costs, bits.size)
+    progress.advance(bits.size)
+
+    progress.phase("embed", bits.size, "bits")
+    changed = positions[(values[positions] & 1) != bits]
+    progress.advance(bits.size)
+    progress.phase("write", len(jc.data), "bytes")
+    jc.write(output_path, jc.ac["end_bit"][usable[changed]] - 1)  # Last magnitude bit = LSB of |c|
+    progress.advance(len(jc.data))
+    return output_path
+
+
+LSB_COST_FUNCTIONS = {
+    "s-uniward": _s_uniward_costs,
+    "wow": _wow_costs,
+    "hugo": _hugo_costs,
+    "mvg": _mvg_costs,
+}
+# Algorithms whose costs mark samples wet (WOW: flat in some direction; HUGO: 0/1 can't go down),
+# so their capacity needs the cost map instead of the sample count
+WET_COST_ALGORITHMS = ("wow", "hugo")
+
+
+def lsb_capacity(carrier_path, algorithm: str, exclude_wet: bool = False) -> int:
+    """
+    Largest payload (bytes) the LSB algorithm can embed in this carrier. For WOW and HUGO this is
+    an upper bound unless exclude_wet=True, which counts only samples that are not wet and takes a
+    pass over the cost map; embedding itself raises PayloadTooLarge when the wet samples are needed.
+    """
+    layout = parse_raster(carrier_path)
+    if _is_jpeg(carrier_path):
+        try:
+            jc = read_jpeg(carrier_path)
+        except ValueError:  # Corrupt scan
+            jc = None
+        bits = int(np.count_nonzero(jc.ac["size"] >= 2)) if jc is not None else 0
+    elif exclude_wet and algorithm in WET_COST_ALGORITHMS:
+        bits = _usable_samples(carrier_path, LSB_COST_FUNCTIONS[algorithm])
+    elif layout is not None:
+        bits = layout.samples
+    elif algorithm == "stc":
+        # Raw byte LSBs would overwrite an image's header; unparsed BMP/TIFF files get no STC capacity
+        bits = 0 if os.path.splitext(carrier_path)[1].lower() in RASTER_EXTENSIONS else os.path.getsize(carrier_path)
+    else:
+        bits = int(np.prod(_carrier_shape(carrier_path)))
+    return max(0, (bits - LENGTH_PREFIX_BITS - FRAME_CHECK_BITS) // 8)
 
-        stego_img = Image.fromarray(flat_img.reshape(rows, cols).astype(np.uint8))
-        stego_img.save(output_path)
+
+def extract_lsb(carrier_path, algorithm: str, expect_prefix: bytes = b"", progress=None):
+    """
+    Recovers a payload embedded by run_stc or one of the cost-ordered LSB algorithms.
+    Returns the payload bytes, or None if the carrier holds no payload for this algorithm.
+    `progress` receives the cost_map phase of the cost-ordered algorithms.
+    """
+    progress = ensure_progress(progress)
+    if _is_jpeg(carrier_path):
+        jc = _open_jpeg(carrier_path)
+        _, values, costs = _jpeg_usable(jc)
+        return _read_lsb((values & 1).astype(np.uint8), costs, expect_prefix)
+    layout = parse_raster(carrier_path)
+    if algorithm == "stc":
+        if layout is not None:
+            return _read_lsb(map_raster(carrier_path), expect_prefix=expect_prefix, layout=layout)
+        flat = np.fromfile(carrier_path, dtype=np.uint8)
+        return _read_lsb(flat, expect_prefix=expect_prefix)
+    cost_fn = LSB_COST_FUNCTIONS.get(algorithm)
+    if cost_fn is None:
+        raise ValueError(f"No LSB extractor for algorithm: {algorithm}")
+    if layout is not None:
+        data = map_raster(carrier_path)
+        progress.phase("cost_map", layout.samples, "pixels")
+        costs = _cost_map(cost_fn, _read_raster(layout, data), progress)
+        return _read_lsb(data, costs, expect_prefix, layout)
+    pixels, _, _ = _open_pixels(carrier_path)
+    progress.phase("cost_map", pixels.size, "pixels")
+    costs = _cost_map(cost_fn, pixels, progress)
+    return _read_lsb(pixels.reshape(-1), costs, expect_prefix)
+
+
+# --- Payload-limited sender simulation ---
+# Steganalysis experiments need the changes an optimal coder would make at a given payload, not an
+# extractable payload: core.embedding_simulator draws them from the algorithm's cost map. The run_*
+# embedders do not go through it. MVG costs rank pixels (negative Fisher information) rather than
+# measure distortion, so MVG is not simulated.
+SIMULATED_ALGORITHMS = ("s-uniward", "wow", "hugo")
+
+
+def simulate_embedding(carrier_path, output_path, algorithm, relative_payload, seed=None, progress=None):
+    """
+    Saves the carrier with the ±1 changes of a payload-limited sender embedding `relative_payload` bits
+    per sample (e.g. 0.4) with minimal expected distortion under `algorithm`'s costs. The changes are
+    drawn from a seeded generator (same seed, same output). The result holds no extractable payload.
+    """
+    progress = ensure_progress(progress)
+    try:
+        if algorithm not in SIMULATED_ALGORITHMS:
+            raise ValueError(f"No embedding simulator for algorithm: {algorithm}")
+        pixels, alpha, _ = _open_pixels(carrier_path)
+        cost_fn = LSB_COST_FUNCTIONS[algorithm]
+
+        progress.phase("cost_map", pixels.size, "pixels")
+        rho = compute_costs(cost_fn, pixels, COST_HALOS.get(cost_fn), progress)
+
+        progress.phase("embed", pixels.size, "pixels")
+        rho_minus = rho.copy()
+        rho_minus[pixels == 0] = np.inf
+        rho[pixels == 255] = np.inf  # rho becomes the +1 costs
+        changes, _ = simulate(rho_minus, rho, relative_payload * pixels.size, seed)
+        del rho_minus, rho
+        flat = pixels.reshape(-1)
+        np.add(flat, changes.reshape(-1), out=flat, casting="unsafe")
+        progress.advance(pixels.size)
+
+        _save_pixels(pixels, alpha, output_path, progress)
         return output_path
 
     except Exception as e:
-        print(f"[run_hugo ERROR] {e}")
+        print(f"[simulate_embedding ERROR] {e}")
         return None
 
 
-def run_mvg(carrier_path, payload_path, output_path):
+def run_stc(carrier_path, payload_path, output_path, progress=None):
     """
-    MVG-like steganography based on local Fisher information embedding simulation.
+    STC-like simulation: Embed payload bits into the carrier bytes' LSBs in sequence, behind a 32-bit length.
+    Uncompressed BMP/TIFF carriers are embedded into their pixel samples in place, touching only the
+    samples that hold payload bits.
     """
+    progress = ensure_progress(progress)
     try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
-        shape = img_np.shape
+        layout = _raster_layout(carrier_path, output_path)
+        if layout is not None:
+            bits = _frame_bits(payload_path)
+            if bits.size > layout.samples:
+                raise ValueError("Payload too large to embed in carrier.")
+            _write_raster(carrier_path, output_path, layout, np.arange(bits.size), bits, progress)
+            return output_path
 
-        # Read payload and convert to bits
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
+        with open(carrier_path, 'rb') as f:
+            carrier_bytes = bytearray(f.read())
 
-        # 1. Compute Wiener-filtered residuals
-        residuals = img_np - wiener(img_np, (3, 3))
-
-        # 2. Estimate local variance using blockwise DCT energy
-        def local_variance(block):
-            dct_block = dct(dct(block.T, norm='ortho').T, norm='ortho')
-            return np.var(dct_block)
-
-        window_size = 8
-        variances = np.zeros(shape)
-        for i in range(0, shape[0] - window_size + 1):
-            for j in range(0, shape[1] - window_size + 1):
-                block = img_np[i:i+window_size, j:j+window_size]
-                var = local_variance(block)
-                variances[i:i+window_size, j:j+window_size] += var
-        variances /= (window_size * window_size)
-
-        # 3. Compute Fisher Information (1/variance^2)
-        with np.errstate(divide='ignore'): # handle division by zero
-            fisher_map = 1.0 / (variances**2)
-            fisher_map = np.nan_to_num(fisher_map, nan=0.0, posinf=0.0, neginf=0.0)
-        fisher_flat = fisher_map.flatten()
-
-        # 4. Probabilistic ±1, ±2 pixel modifications
-        beta = 2.0
-        theta = 0.25
-        rand_map = np.random.rand(fisher_flat.shape[0])
-        flat_img = img_np.flatten()
-        payload_index = 0
-
-        for idx in np.argsort(-fisher_flat): # descending FI importance
-            if payload_index >= total_bits:
-                break
+        bits = _frame_bits(payload_path)
+        if bits.size > len(carrier_bytes):
+            raise ValueError("Payload too large to embed in carrier.")
 
-            bit = int(payload_bits[payload_index])
-            current_pixel = flat_img[idx]
-            modified_pixel = current_pixel
+        flat = np.frombuffer(carrier_bytes, dtype=np.uint8)
+        _embed_lsb(flat, np.arange(bits.size), bits, progress)
 
-            # Decide modification based on cost and bit
-            cost_plus_1 = fisher_flat[idx]
-            cost_minus_1 = fisher_flat[idx]
+        _write_buffers(output_path, [carrier_bytes], progress)
 
-            if (current_pixel % 2) != bit:
-                if rand_map[idx] < (cost_plus_1 / (cost_plus_1 + cost_minus_1)):
-                    modified_pixel += 1
-                else:
-                    modified_pixel -= 1
-            else:
-                if rand_map[idx] < theta:
-                    if rand_map[idx] < (theta * cost_plus_1 / (cost_plus_1 + cost_minus_1)):
-                        modified_pixel += 2
-                    else:
-                        modified_pixel -= 2
+        return output_path
 
-            flat_img[idx] = np.clip(modified_pixel, 0, 255)
-            payload_index += 1
+    except Exception as e:
+        print(f"[run_stc ERROR] {e}")
+        return None
 
-        stego_img = Image.fromarray(flat_img.reshape(shape).astype(np.uint8))
-        stego_img.save(output_path)
-        return output_path
 
+def run_s_uniward(carrier_path, payload_path, output_path, progress=None):
+    """
+    S-UNIWARD: pixels in order of the relative distortion they cause in the full-resolution db8
+    directional residuals (core.filter_bank), cheapest first.
+    Input: lossless grayscale or color image (channels embedded jointly), payload file (binary), output file path.
+    """
+    progress = ensure_progress(progress)
+    try:
+        return _embed_cost_ordered(carrier_path, payload_path, output_path, _s_uniward_costs, progress)
+
+    except PayloadTooLarge:
+        raise  # stego_apply routes the payload elsewhere
+    except Exception as e:
+        print(f"[run_s_uniward ERROR] {e}")
+        return None
+
+
+def run_hugo(carrier_path, payload_path, output_path, gamma=1.0, sigma=1.0, progress=None):
+    """
+    HUGO-inspired embedding: calculates pixel-wise costs using directional differences and embeds data minimizing distortion.
+    """
+    progress = ensure_progress(progress)
+    try:
+        cost_fn = functools.partial(_hugo_costs, gamma=gamma, sigma=sigma)  # Picklable for the cost workers
+        return _embed_cost_ordered(carrier_path, payload_path, output_path, cost_fn, progress)
+
+    except PayloadTooLarge:
+        raise  # stego_apply routes the payload elsewhere
+    except Exception as e:
+        print(f"[run_hugo ERROR] {e}")
+        return None
+
+
+def run_mvg(carrier_path, payload_path, output_path, progress=None):
+    """
+    MVG-like steganography based on local Fisher information embedding simulation.
+    Pixels are taken in descending Fisher information order and their LSBs replaced.
+    """
+    progress = ensure_progress(progress)
+    try:
+        return _embed_cost_ordered(carrier_path, payload_path, output_path, _mvg_costs, progress)
+
+    except PayloadTooLarge:
+        raise  # stego_apply routes the payload elsewhere
     except Exception as e:
         print(f"[run_mvg ERROR] {e}")
         return None
 
 
-def run_simple_jpg_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None):
+def run_jpeg_dct(carrier_path, payload_path, output_path, progress=None):
+    """
+    Coefficient-domain embedding for baseline JPEGs: LSBs of the cheapest nonzero AC coefficients
+    (|c| >= 2), written back into the original scan without decoding or re-encoding pixels.
+    """
+    progress = ensure_progress(progress)
+    try:
+        return _embed_jpeg(carrier_path, payload_path, output_path, progress)
+
+    except Exception as e:
+        print(f"[run_jpeg_dct ERROR] {e}")
+        return None
+
+
+def run_simple_jpg_steg(carrier_path, payload_path=None, output_path=None, extract=False, payload=None, progress=None):
     """
     Simple JPG/PNG steganography: embeds data by appending it.
     For extraction, it returns the full content to steg_engine.py to parse the header.
     """
+    progress = ensure_progress(progress)
     if extract:
         # For extraction, simply read the entire stego file content and return it.
         # steg_engine.py will then be responsible for finding the HEADER_MARKER and parsing.
@@ -276,29 +896,21 @@ def run_simple_jpg_steg(carrier_path, payload_path=None, output_path=None, extra
             with open(carrier_path, 'rb') as f:
                 carrier_data = f.read()
 
-            # Read the payload data (which includes the header/metadata from steg_engine)
-            if payload is None and payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload = f.read()
+            # Payload data (which includes the header/metadata from steg_engine): path, bytes or buffers
+            if payload is None and payload_path is not None:
+                payload = payload_path
             elif payload is None:
                 raise ValueError("Payload or payload_path must be provided for embedding.")
-
-            # Simple appending: concatenate carrier data with payload
-            # This is a basic method; more robust methods embed within specific data sections
-            stego_data = carrier_data + payload
+            buffers = _payload_buffers(payload)
 
             if output_path is None:
                 # Default output path if not provided
                 name, ext = os.path.splitext(carrier_path)
                 output_path = f"{name}_stego{ext}"
 
-            # Write the new stego file
-            with open(output_path, 'wb') as f:
-                f.write(stego_data)
-
-            # Clean up temporary payload file if it was created
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
+            # Simple appending: carrier data followed by the payload buffers, written in one writev
+            # This is a basic method; more robust methods embed within specific data sections
+            _write_buffers(output_path, [carrier_data] + buffers, progress)
 
             return output_path # Return the path to the created stego file
         except Exception as e:
@@ -306,11 +918,12 @@ def run_simple_jpg_steg(carrier_path, payload_path=None, output_path=None, extra
             return None
 
 
-def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, metadata=None):
+def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, metadata=None, payload=None, progress=None):
     """
     MP3 steganography: embeds data into a new ID3v2 tag or appends it.
     For extraction, it returns the full content to steg_engine.py to parse the header.
     """
+    progress = ensure_progress(progress)
     if extract:
         # For extraction, simply read the entire stego MP3 file content and return it.
         # steg_engine.py will then be responsible for finding the HEADER_MARKER and parsing.
@@ -328,39 +941,19 @@ def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, m
         try:
             audio = AudioSegment.from_file(carrier_path)
 
-            if payload is None and payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
+            if payload is None and payload_path is not None:
+                payload = payload_path
             elif payload is None:
                 raise ValueError("Payload or payload_path must be provided for embedding.")
-            else:
-                payload_data = payload
-
-            metadata = metadata or {}
-            metadata.setdefault("version", "RYG-1.0")
-            metadata.setdefault("timestamp", datetime.now().isoformat())
-            metadata.setdefault("type", "genuine")
-            metadata.setdefault("dict_checksum", generate_dict_checksum())
-            metadata.setdefault("matryoshka_layers", 1)
-            metadata.setdefault("encryption", "None")
-            metadata.setdefault("masked", False)
-
-            metadata_block = HEADER_MARKER + json.dumps(metadata).encode("utf-8") + b"\0"
-            full_payload_with_header = metadata_block + payload_data + b"\0"
-
-            # Append the full payload to the audio data
-            # This is a simplified approach; more robust methods might embed in specific ID3 frames
-            stego_audio_bytes = audio.export(format="mp3").read() + full_payload_with_header
+            payload_buffers = _frame_payload(_payload_buffers(payload), metadata)
 
             if output_path is None:
                 name, ext = os.path.splitext(carrier_path)
                 output_path = f"{name}_stego{ext}"
 
-            with open(output_path, "wb") as f:
-                f.write(stego_audio_bytes)
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
+            # Append the full payload to the audio data
+            # This is a simplified approach; more robust methods might embed in specific ID3 frames
+            _write_buffers(output_path, [audio.export(format="mp3").read()] + payload_buffers, progress)
 
             return output_path
         except Exception as e:
@@ -368,11 +961,12 @@ def mp3_steg(carrier_path, payload_path=None, output_path=None, extract=False, m
             return None
 
 
-def mp4_steg(carrier_path, payload_path=None, output_path=None, metadata=None, extract=False, payload=None):
+def mp4_steg(carrier_path, payload_path=None, output_path=None, metadata=None, extract=False, payload=None, progress=None):
     """
     MP4 steganography: embeds data into a 'free' box.
     For extraction, it returns the full content to steg_engine.py to parse the header.
     """
+    progress = ensure_progress(progress)
     if extract:
         # For extraction, simply read the entire stego MP4 file content and return it.
         # steg_engine.py will then be responsible for finding the HEADER_MARKER and parsing.
@@ -391,43 +985,24 @@ def mp4_steg(carrier_path, payload_path=None, output_path=None, metadata=None, e
             with open(carrier_path, 'rb') as f:
                 mp4_data = f.read()
 
-            if payload is None and payload_path:
-                with open(payload_path, 'rb') as f:
-                    payload_data = f.read()
+            if payload is None and payload_path is not None:
+                payload = payload_path
             elif payload is None:
                 raise ValueError("Payload or payload_path must be provided for embedding.")
-            else:
-                payload_data = payload
-
-            metadata = metadata or {}
-            metadata.setdefault("version", "RYG-1.0")
-            metadata.setdefault("timestamp", datetime.now().isoformat())
-            metadata.setdefault("type", "genuine")
-            metadata.setdefault("dict_checksum", generate_dict_checksum())
-            metadata.setdefault("matryoshka_layers", 1)
-            metadata.setdefault("encryption", "None")
-            metadata.setdefault("masked", False)
-            metadata_block = HEADER_MARKER + json.dumps(metadata).encode("utf-8") + b"\0"
-            full_payload = metadata_block + payload_data + b"\0"
+            payload_buffers = _frame_payload(_payload_buffers(payload), metadata)
 
             box_type = b'free'
-            payload_box_size = 8 + len(full_payload)
-            payload_box = payload_box_size.to_bytes(4, byteorder='big') + box_type + full_payload
-
-            # Insert the 'free' box just before the 'mdat' atom or at the end
-            # This is a simplified insertion. A more robust parser would be needed for complex MP4 structures.
-            # For simplicity, appending for now.
-            new_data = mp4_data + payload_box
+            payload_box_size = 8 + sum(len(buf) for buf in payload_buffers)
+            box_header = payload_box_size.to_bytes(4, byteorder='big') + box_type
 
             if output_path is None:
                 name, ext = os.path.splitext(carrier_path)
                 output_path = f"{name}_stego{ext}"
 
-            with open(output_path, "wb") as f:
-                f.write(new_data)
-
-            if payload_path and payload_path.endswith(".payload"):
-                os.remove(payload_path)
+            # Insert the 'free' box just before the 'mdat' atom or at the end
+            # This is a simplified insertion. A more robust parser would be needed for complex MP4 structures.
+            # For simplicity, appending for now.
+            _write_buffers(output_path, [mp4_data, box_header] + payload_buffers, progress)
 
             return output_path
 
@@ -436,19 +1011,21 @@ def mp4_steg(carrier_path, payload_path=None, output_path=None, metadata=None, e
             return None
 
 
-def run_mipod(carrier_path, payload_path, output_path):
+def run_mipod(carrier_path, payload_path, output_path, progress=None):
     """
     MIPOD-like simulation: embeds data by modifying DCT coefficients in JPEG/image files.
     """
+    progress = ensure_progress(progress)
     try:
-        img = Image.open(carrier_path).convert("L")
+        img = _open_grayscale(carrier_path)
         img_np = np.array(img, dtype=np.float32)
 
         # Apply DCT
+        progress.phase("cost_map", img_np.size, "pixels")
         dct_coeffs = dct(dct(img_np.T, norm='ortho').T, norm='ortho')
+        progress.advance(img_np.size)
 
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
+        payload = _payload_bytes(payload_path)
 
         payload_bits = ''.join(f'{b:08b}' for b in payload)
         total_bits = len(payload_bits)
@@ -461,9 +1038,12 @@ def run_mipod(carrier_path, payload_path, output_path):
         if total_bits > len(flat_coeffs) // 2: # Can embed about half the coefficients
             raise ValueError("Payload too large for MIPOD embedding capacity.")
 
+        progress.phase("embed", total_bits, "bits")
         for i in range(total_bits):
             if payload_idx >= len(flat_coeffs):
                 break # No more space
+            if i % PROGRESS_CHUNK == 0:
+                progress.update(i)
 
             # Modify coefficient based on payload bit (LSB-like for DCT)
             # This is a conceptual modification, real MIPOD is more complex
@@ -490,7 +1070,7 @@ def run_mipod(carrier_path, payload_path, output_path):
         # Clip and convert back to image
         stego_img_np = np.clip(stego_img_np, 0, 255).astype(np.uint8)
         stego_img = Image.fromarray(stego_img_np)
-        stego_img.save(output_path)
+        _save_image(stego_img, output_path, progress)
         return output_path
 
     except Exception as e:
@@ -498,85 +1078,45 @@ def run_mipod(carrier_path, payload_path, output_path):
         return None
 
 
-def run_wow(carrier_path, payload_path, output_path):
+def run_wow(carrier_path, payload_path, output_path, progress=None):
     """
-    WOW-like simulation: Embeds data by modifying pixel values in a way that minimizes changes based on local complexity.
-    This is a simplified example.
+    WOW: pixels in order of their directional-residual cost (db8 filter bank, Hölder p = -1), cheapest
+    first, each changed by ±1 where its LSB differs from the payload bit.
     """
+    progress = ensure_progress(progress)
     try:
-        img = Image.open(carrier_path).convert("L")
-        img_np = np.array(img).astype(np.float32)
-
-        with open(payload_path, 'rb') as f:
-            payload = f.read()
-        payload_bits = ''.join(f'{b:08b}' for b in payload)
-        total_bits = len(payload_bits)
-
-        # Calculate local complexity (e.g., using variance or gradient magnitude)
-        # This is a very simple approximation; actual WOW uses more sophisticated cost functions
-        complexity_map = uniform_filter(img_np, size=3) # Example: blur for smoothness, inverse for complexity
-        complexity_map = np.abs(img_np - complexity_map) + 1 # Higher difference = higher complexity
-        cost_map = 1 / complexity_map # Lower cost for higher complexity areas
-        cost_map = np.clip(cost_map, 0.001, 1.0) # Avoid division by zero, ensure valid range
-
-        flat_img = img_np.flatten()
-        flat_costs = cost_map.flatten()
-        modifiable_indices = np.argsort(flat_costs) # Sort by increasing cost (embed in cheapest first)
-
-        if total_bits > len(modifiable_indices):
-            raise ValueError("Payload too large to embed with WOW distortion constraints.")
-
-        for i in range(total_bits):
-            idx = modifiable_indices[i]
-            bit = int(payload_bits[i])
-            current_pixel = int(flat_img[idx])
-
-            if (current_pixel % 2) != bit:
-                # Modify pixel to match bit, with minimal change (+1 or -1)
-                if current_pixel == 0: # Can only increase
-                    flat_img[idx] = 1 if bit == 1 else 0 # Should ideally be 0 if bit is 0
-                elif current_pixel == 255: # Can only decrease
-                    flat_img[idx] = 254 if bit == 0 else 255 # Should ideally be 255 if bit is 1
-                else:
-                    # Choose direction that results in lower distortion if possible, or just flip
-                    flat_img[idx] = current_pixel ^ 1 # Simple flip for demonstration
-
-        stego_img = Image.fromarray(flat_img.reshape(img_np.shape).astype(np.uint8))
-        stego_img.save(output_path)
-        return output_path
+        return _embed_cost_ordered(carrier_path, payload_path, output_path, _wow_costs, progress)
 
+    except PayloadTooLarge:
+        raise  # stego_apply routes the payload elsewhere
     except Exception as e:
         print(f"[run_wow ERROR] {e}")
         return None
 
 
-def synch_steg(carrier_path, payload_path, output_path):
+def synch_steg(carrier_path, payload_path, output_path, progress=None):
     """
     SYNCH steganography simulation for video (MP4, MKV, AVI).
     Embeds data by appending it to a 'free' box, similar to MP4 handling.
     This is a placeholder for actual video steganography.
     """
+    progress = ensure_progress(progress)
     try:
         with open(carrier_path, 'rb') as f:
             video_data = f.read()
 
-        with open(payload_path, 'rb') as f:
-            payload_data = f.read()
-
-        # Simple appending of the payload
-        stego_data = video_data + payload_data + b"\0" # Add a null terminator for safety
+        payload_buffers = _payload_buffers(payload_path)
+        if not _is_framed(payload_buffers):
+            payload_buffers.append(memoryview(b"\0")) # Add a null terminator for safety
 
         if output_path is None:
             name, ext = os.path.splitext(carrier_path)
             output_path = f"{name}_stego{ext}"
 
-        with open(output_path, "wb") as f:
-            f.write(stego_data)
-
-        if payload_path and payload_path.endswith(".payload"):
-            os.remove(payload_path)
+        # Simple appending of the payload
+        _write_buffers(output_path, [video_data] + payload_buffers, progress)
 
         return output_path
     except Exception as e:
         print(f"[synch_steg ERROR] {e}")
-        return None
\ No newline at end of file
+        return None
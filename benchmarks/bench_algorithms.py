@@ -0,0 +1,241 @@
+# benchmarks/bench_algorithms.py — Embedding throughput and peak memory per algorithm, checked against baselines
+#
+# Run from the project root:
+#   python -m benchmarks.bench_algorithms                          # quick corpus, compare with baselines
+#   python -m benchmarks.bench_algorithms --scale full --algorithms wow s-uniward
+#   python -m benchmarks.bench_algorithms --save-baseline          # record this machine's numbers
+#
+# Each case runs in a fresh interpreter so its peak RSS is its own. Baselines are machine-specific:
+# save them on the host that runs the comparison. Exits with 1 when a case regresses by more than
+# --threshold (throughput) or --rss-threshold (peak RSS).
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from benchmarks.corpus import build_corpus, DEFAULT_CORPUS_DIR, DEFAULT_SEED, SCALES
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "algorithms.json")
+DEFAULT_RATIOS = (0.05, 0.2, 0.4)
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_RSS_THRESHOLD = 0.25
+DEFAULT_MIN_TIME = 0.5  # Short cases are repeated until they have run this long in total...
+MAX_RUNS = 50           # ...up to this many runs
+
+# algorithm -> (function name in core.algorithm_stubs, carrier types, capacity model, max megapixels)
+# Capacity models: "pixels" embeds one bit per pixel, "bytes" one bit per carrier byte, and
+# "append" stores the payload next to the carrier (ratio is payload/carrier size).
+ALGORITHMS = {
+    "append": ("run_simple_jpg_steg", ("image",), "append", None),  # Routed for .jpg/.jpeg/.png
+    "mp4": ("mp4_steg", ("mp4",), "append", None),
+    "mp3": ("mp3_steg", ("mp3",), "append", None),
+    "synch": ("synch_steg", ("mp4",), "append", None),
+    "stc": ("run_stc", ("wav",), "bytes", None),
+    "s-uniward": ("run_s_uniward", ("image",), "pixels", None),
+    "wow": ("run_wow", ("image",), "pixels", None),
+    "mipod": ("run_mipod", ("image",), "pixels", None),
+    "hugo": ("run_hugo", ("image",), "pixels", None),
+    "mvg": ("run_mvg", ("image",), "pixels", None),
+}
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def payload_size(algorithm: str, carrier: dict, ratio: float) -> int:
+    model = ALGORITHMS[algorithm][2]
+    if model == "pixels":
+        return max(1, int(carrier["pixels"] * ratio) // 8)
+    if model == "bytes":
+        return max(1, int(carrier["bytes"] * ratio) // 8)
+    return max(1, int(carrier["bytes"] * ratio))
+
+
+def plan_cases(corpus: list, algorithms, ratios, max_mp=None) -> list:
+    cases = []
+    for algorithm in algorithms:
+        _, types, _, cap = ALGORITHMS[algorithm]
+        limit = max_mp if max_mp is not None else cap
+        for carrier in corpus:
+            if carrier["type"] not in types:
+                continue
+            if limit is not None and carrier.get("pixels", 0) > limit * 1e6 * 1.01:
+                continue
+            for ratio in ratios:
+                cases.append({"id": f"{algorithm}/{carrier['name']}/{ratio:g}", "algorithm": algorithm,
+                              "carrier": carrier, "ratio": ratio,
+                              "payload_bytes": payload_size(algorithm, carrier, ratio)})
+    return cases
+
+
+# --- Child process: one case ---
+def run_case(case: dict, repeat: int, seed: int, min_time: float = DEFAULT_MIN_TIME) -> dict:
+    import numpy as np
+    from core import algorithm_stubs
+
+    fn = getattr(algorithm_stubs, ALGORITHMS[case["algorithm"]][0])
+    carrier = case["carrier"]
+    payload = np.random.default_rng(seed).integers(0, 256, case["payload_bytes"], dtype=np.uint8).tobytes()
+    rss_before = _peak_rss_bytes()
+
+    times = []
+    log = io.StringIO()  # Algorithms print their errors instead of raising
+    with tempfile.TemporaryDirectory(prefix="rygelock_bench_") as out_dir:
+        output = os.path.join(out_dir, "stego_" + os.path.basename(carrier["path"]))
+        while len(times) < repeat or (sum(times) < min_time and len(times) < MAX_RUNS):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(log):
+                produced = fn(carrier["path"], payload, output)
+            times.append(time.perf_counter() - start)
+            if not produced or not os.path.exists(output):
+                return {"id": case["id"], "status": "error", "detail": log.getvalue().strip()[-300:]}
+            os.remove(output)
+
+    best = min(times)
+    result = {
+        "id": case["id"],
+        "status": "ok",
+        "seconds": round(best, 6),
+        "runs": len(times),
+        "mb_per_s": round(carrier["bytes"] / best / 1e6, 3),
+        "payload_mb_per_s": round(case["payload_bytes"] / best / 1e6, 3),
+        "peak_rss_mb": None,
+        "rss_growth_mb": None,
+    }
+    if "pixels" in carrier:
+        result["mp_per_s"] = round(carrier["pixels"] / best / 1e6, 3)
+    peak = _peak_rss_bytes()
+    if peak is not None:
+        result["peak_rss_mb"] = round(peak / 1e6, 1)
+        result["rss_growth_mb"] = round((peak - rss_before) / 1e6, 1)
+    return result
+
+
+def _run_in_child(case: dict, repeat: int, seed: int, min_time: float, timeout: float) -> dict:
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"case": case, "repeat": repeat, "seed": seed, "min_time": min_time}, f)
+        spec_path = f.name
+    try:
+        proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_algorithms", "--child", spec_path],
+                              capture_output=True, text=True, timeout=timeout)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            return {"id": case["id"], "status": "error", "detail": proc.stderr.strip()[-300:]}
+        return json.loads(lines[-1])  # Algorithms may print before the result line
+    except subprocess.TimeoutExpired:
+        return {"id": case["id"], "status": "timeout"}
+    finally:
+        os.remove(spec_path)
+
+
+# --- Baselines ---
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f).get("cases", {})
+
+
+def save_baselines(path: str, results: list, scale: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cases = {r["id"]: {k: r[k] for k in ("mb_per_s", "mp_per_s", "peak_rss_mb") if r.get(k) is not None}
+             for r in results if r["status"] == "ok"}
+    existing = load_baselines(path)
+    existing.update(cases)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"scale": scale, "python": sys.version.split()[0], "cases": existing}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_regressions(results: list, baselines: dict, threshold: float, rss_threshold: float) -> list:
+    regressions = []
+    for r in results:
+        base = baselines.get(r["id"])
+        if not base:
+            continue
+        if r["status"] != "ok":
+            regressions.append(f"{r['id']}: {r['status']} (passed in the baseline)")
+            continue
+        if r["mb_per_s"] < base["mb_per_s"] * (1 - threshold):
+            regressions.append(f"{r['id']}: {r['mb_per_s']:.2f} MB/s vs baseline {base['mb_per_s']:.2f} MB/s")
+        if r.get("peak_rss_mb") and base.get("peak_rss_mb") and r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append(f"{r['id']}: peak RSS {r['peak_rss_mb']:.0f} MB vs baseline {base['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark embedding algorithms on a synthetic corpus")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--algorithms", nargs="+", choices=sorted(ALGORITHMS), default=sorted(ALGORITHMS))
+    parser.add_argument("--ratios", nargs="+", type=float, default=list(DEFAULT_RATIOS),
+                        help="Payload size: bits per pixel/byte of capacity, or payload/carrier size for appends")
+    parser.add_argument("--max-mp", type=float, help="Skip images above this many megapixels (overrides per-algorithm caps)")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum runs per case; the fastest is reported")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="Minimum total seconds per case")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds per case")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed throughput drop (0.15 = 15%%)")
+    parser.add_argument("--rss-threshold", type=float, default=DEFAULT_RSS_THRESHOLD, help="Allowed peak RSS growth")
+    parser.add_argument("--json", help="Also write all results to this file")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        with open(args.child, "r") as f:
+            spec = json.load(f)
+        print(json.dumps(run_case(spec["case"], spec["repeat"], spec["seed"], spec["min_time"])))
+        return 0
+
+    corpus = build_corpus(args.corpus_dir, args.scale, args.seed)
+    cases = plan_cases(corpus, args.algorithms, args.ratios, args.max_mp)
+    print(f"{len(cases)} cases on the {args.scale} corpus ({args.corpus_dir}), best of {args.repeat}")
+    print(f"  {'case':<52} {'MB/s':>9} {'MP/s':>8} {'peak RSS':>10}")
+
+    results = []
+    for case in cases:
+        r = _run_in_child(case, args.repeat, args.seed, args.min_time, args.timeout)
+        results.append(r)
+        if r["status"] != "ok":
+            print(f"  {case['id']:<52} {r['status'].upper():>9}  {r.get('detail', '')}")
+            continue
+        mp = f"{r['mp_per_s']:8.2f}" if "mp_per_s" in r else f"{'-':>8}"
+        rss = f"{r['peak_rss_mb']:7.0f} MB" if r["peak_rss_mb"] is not None else f"{'-':>10}"
+        print(f"  {case['id']:<52} {r['mb_per_s']:9.2f} {mp} {rss}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": args.scale, "seed": args.seed, "results": results}, f, indent=2)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results, args.scale)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baselines = load_baselines(args.baseline)
+    if not baselines:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    regressions = find_regressions(results, baselines, args.threshold, args.rss_threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# benchmarks/bench_batch.py — stego_apply one carrier at a time vs stego_apply_batch on a library of same-size carriers
+#
+# Run from the project root:  python -m benchmarks.bench_batch [--copies 64] [--algorithm wow] [--workers 8]
+#
+# Simulates a carrier library at a few fixed resolutions: each lossless corpus image is copied
+# --copies times and every copy gets its own payload. Both paths embed the whole library; the
+# outputs must be byte-identical. Reports carriers per second and the batch speedup per resolution.
+
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+from benchmarks.corpus import build_corpus, DEFAULT_CORPUS_DIR, DEFAULT_SEED, SCALES
+from core.algorithm import stego_apply, stego_apply_batch, LSB_ALGORITHM_FN_MAP
+from core.algorithm_stubs import lsb_capacity
+
+FILL = 0.2  # Payload size as a fraction of the LSB capacity
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-carrier and batched LSB embedding")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--algorithm", choices=sorted(LSB_ALGORITHM_FN_MAP), default="wow")
+    parser.add_argument("--copies", type=int, default=64, help="Carriers per resolution")
+    parser.add_argument("--workers", type=int, help="Batch threads (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    carriers = [c for c in build_corpus(args.corpus_dir, args.scale, args.seed)
+                if c["type"] == "image" and c["name"].endswith(".png")]
+    rng = np.random.default_rng(args.seed)
+    print(f"{args.algorithm}: {args.copies} carriers per resolution, payload {FILL:.0%} of capacity")
+    print(f"  {'carrier':<30} {'single/s':>9} {'batch/s':>9} {'speedup':>8}  identical")
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="rygelock_bench_batch_") as work_dir:
+        for carrier in carriers:
+            capacity = lsb_capacity(carrier["path"], args.algorithm, exclude_wet=True)
+            jobs = []
+            for i in range(args.copies):
+                path = os.path.join(work_dir, f"carrier_{i}.png")
+                shutil.copyfile(carrier["path"], path)
+                payload = rng.integers(0, 256, int(capacity * FILL), dtype=np.uint8).tobytes()
+                jobs.append((path, payload, args.algorithm, os.path.join(work_dir, f"single_{i}.png")))
+
+            with contextlib.redirect_stdout(io.StringIO()):  # stego_apply prints per carrier
+                start = time.perf_counter()
+                for job in jobs:
+                    stego_apply(*job)
+                single_s = time.perf_counter() - start
+                batch_jobs = [(path, payload, algorithm, output.replace("single_", "batch_"))
+                              for path, payload, algorithm, output in jobs]
+                start = time.perf_counter()
+                stego_apply_batch(batch_jobs, workers=args.workers)
+                batch_s = time.perf_counter() - start
+
+            identical = True
+            for (_, _, _, single_out), (_, _, _, batch_out) in zip(jobs, batch_jobs):
+                with open(single_out, "rb") as a, open(batch_out, "rb") as b:
+                    identical &= a.read() == b.read()
+            failures += not identical
+            print(f"  {carrier['name']:<30} {len(jobs) / single_s:9.1f} {len(jobs) / batch_s:9.1f}"
+                  f" {single_s / batch_s:8.2f}  {'yes' if identical else 'NO'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# benchmarks/bench_cost_order.py — Does the embedding order survive last-ulp differences in the cost maps?
+#
+# Run from the project root:  python -m benchmarks.bench_cost_order [--size 64] [--fractions 0.25 0.5 1.0]
+#
+# Extraction recomputes the cost map and must select exactly the samples the embedder did, but a
+# different host may produce costs that differ in the last bit. For each LSB cost function this
+# nudges every cost of a seeded RGB image up or down by one ulp, quantizes both maps the way
+# _cost_map does, and checks _cheapest_indices returns the same indices, in the same order, for each
+# fraction of the samples. Reports how many positions the unquantized order loses for comparison.
+# Exits with status 1 if any quantized selection changes.
+
+import sys
+import argparse
+import numpy as np
+from core.algorithm_stubs import LSB_COST_FUNCTIONS, PM1_COST_FUNCTIONS, PM1_MASK, LSB_MASK, _quantize_costs, _cheapest_indices
+
+
+def _nudge(costs: np.ndarray, rng) -> np.ndarray:
+    """Every cost moved one ulp up or down at random."""
+    up = rng.random(costs.size) < 0.5
+    return np.where(up, np.nextafter(costs, np.float32(np.inf)), np.nextafter(costs, np.float32(-np.inf)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that quantized cost orders survive one-ulp cost differences")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--fractions", nargs="+", type=float, default=[0.25, 0.5, 1.0])
+    parser.add_argument("--seed", type=int, default=1337)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    pixels = rng.normal(128, 40, (args.size, args.size, 3)).clip(0, 255).astype(np.uint8)
+    failures = 0
+    print(f"{args.size}x{args.size} RGB image, every cost nudged by one ulp; positions whose selected index changed")
+    print(f"  {'cost':<10} {'fraction':>8} {'raw':>7} {'quantized':>10}  result")
+    for name, cost_fn in LSB_COST_FUNCTIONS.items():
+        mask = PM1_MASK if cost_fn in PM1_COST_FUNCTIONS else LSB_MASK
+        costs = cost_fn(pixels & mask).astype(np.float32).ravel()
+        nudged = _nudge(costs, rng)
+        quantized, quantized_nudged = _quantize_costs(costs.copy()), _quantize_costs(nudged.copy())
+        for fraction in args.fractions:
+            k = int(costs.size * fraction)
+            raw = np.count_nonzero(_cheapest_indices(costs, k) != _cheapest_indices(nudged, k))
+            moved = np.count_nonzero(_cheapest_indices(quantized, k) != _cheapest_indices(quantized_nudged, k))
+            failures += moved > 0
+            print(f"  {name:<10} {fraction:8.2f} {raw:7d} {moved:10d}  {'CHANGED' if moved else 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
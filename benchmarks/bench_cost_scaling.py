@@ -0,0 +1,75 @@
+# benchmarks/bench_cost_scaling.py — Cost-map speedup of the shared-memory tile pool over worker counts
+#
+# Run from the project root:  python -m benchmarks.bench_cost_scaling [--megapixels 40] [--workers 1 2 4 8 16]
+#
+# Computes each tiled cost map on a seeded synthetic grayscale image with 1..N worker processes,
+# checks that every worker count produces the same costs bit for bit, and reports the speedup and
+# parallel efficiency relative to one worker. The pool is warmed up before timing, so process
+# startup is not counted.
+
+import sys
+import time
+import argparse
+import functools
+import numpy as np
+from core import parallel_costs
+from core.algorithm_stubs import COST_HALOS, LSB_MASK, _wow_costs, _hugo_costs, _mvg_costs
+
+COST_FUNCTIONS = {
+    "wow": _wow_costs,
+    "hugo": functools.partial(_hugo_costs, gamma=1.0, sigma=1.0),
+    "mvg": _mvg_costs,
+}
+
+
+def synthetic_image(megapixels: float, seed: int) -> np.ndarray:
+    """Smooth gradients plus texture, 4:3, so costs vary across tiles the way photos do."""
+    rng = np.random.default_rng(seed)
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(megapixels * 1e6 // height)
+    rows = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    cols = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    base = 128 + 60 * np.sin(6 * rows) * np.cos(4 * cols)
+    noise = rng.normal(0, 12, (height, width)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)[:, :, None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cost-map scaling across worker processes")
+    parser.add_argument("--megapixels", type=float, default=40.0)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--costs", nargs="+", choices=sorted(COST_FUNCTIONS), default=sorted(COST_FUNCTIONS))
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pixels = synthetic_image(args.megapixels, args.seed) & LSB_MASK
+    parallel_costs.PARALLEL_MIN_PIXELS = 0  # Use the pool at any --megapixels
+    print(f"{pixels.shape[1]}x{pixels.shape[0]} image, {len(parallel_costs.tile_bounds(pixels.shape[0]))} tiles"
+          f" of {parallel_costs.TILE_ROWS} rows, best of {args.repeat}")
+    print(f"  {'cost':<6} {'workers':>7} {'seconds':>8} {'MP/s':>7} {'speedup':>8} {'efficiency':>10}  same costs")
+    mismatches = 0
+    for name in args.costs:
+        fn = COST_FUNCTIONS[name]
+        halo = COST_HALOS[getattr(fn, "func", fn)]
+        reference, base_time = None, None
+        for workers in args.workers:
+            parallel_costs.compute_costs(fn, pixels[:4 * parallel_costs.TILE_ROWS], halo, workers=workers)  # Warm-up
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                costs = parallel_costs.compute_costs(fn, pixels, halo, workers=workers)
+                best = min(best, time.perf_counter() - start)
+            if reference is None:
+                reference, base_time = costs, best
+            same = np.array_equal(costs, reference, equal_nan=True)
+            mismatches += not same
+            speedup = base_time / best
+            print(f"  {name:<6} {workers:>7} {best:8.3f} {pixels.size / best / 1e6:7.1f} {speedup:8.2f}"
+                  f" {speedup / workers:10.0%}  {'yes' if same else 'NO'}")
+    parallel_costs.shutdown_pool()
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
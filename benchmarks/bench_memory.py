@@ -0,0 +1,145 @@
+# benchmarks/bench_memory.py — Peak RSS per carrier sample of each image algorithm, checked against a budget
+#
+# Run from the project root:  python -m benchmarks.bench_memory [--megapixels 1 8] [--mode RGB] [--fill 0.5]
+# The same check runs under pytest as tests/test_memory_budget.py.
+#
+# Embeds (and extracts) seeded synthetic PNG carriers of two sizes with each algorithm, each in a
+# fresh child process, and measures how far the call raised the child's peak RSS above what the
+# imports alone needed. Two limits apply, both in BUDGETS bytes per carrier sample: the total
+# growth at the larger size, and the growth per *added* sample between the two sizes. Fixed costs
+# (lazy imports, FFT plans, allocator arenas, cost-map tiles) push the total up on small carriers,
+# which is why the absolute limit is taken at the larger size; the per-added-sample figure has no
+# fixed part and catches a new full-size temporary at any size. Exits with status 1 if any
+# algorithm goes over either limit. Cost maps are computed in-process (one worker).
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from PIL import Image
+from benchmarks.corpus import make_image, DEFAULT_SEED
+
+# Bytes of peak RSS growth allowed per carrier sample (H x W x C) at the default --fill and sizes. The
+# decoded carrier and PIL's buffers take about 3; float32 costs 4; the (cost, position) sort keys of
+# the selected samples 8 per payload bit; the payload bits 1 per bit.
+BUDGETS = {
+    "s-uniward": 18,
+    "wow": 18,
+    "hugo": 18,
+    "mvg": 18,
+    "stc": 8,
+}
+DEFAULT_MEGAPIXELS = (1.0, 8.0)
+
+
+def _child(algorithm: str, carrier: str, payload: str, output: str) -> int:
+    os.environ["RYGELOCK_COST_WORKERS"] = "1"
+    import numpy as np
+    from core import algorithm_stubs
+    from core.profiling import _peak_rss_bytes
+
+    runs = {
+        "s-uniward": algorithm_stubs.run_s_uniward,
+        "wow": algorithm_stubs.run_wow,
+        "hugo": algorithm_stubs.run_hugo,
+        "mvg": algorithm_stubs.run_mvg,
+        "stc": algorithm_stubs.run_stc,
+    }
+    with Image.open(carrier) as img:
+        samples = img.width * img.height * len(img.getbands())
+    np.zeros(1)  # Touch numpy's allocator before the baseline
+    baseline = _peak_rss_bytes()
+    ok = runs[algorithm](carrier, payload, output) is not None
+    embed_peak = _peak_rss_bytes()
+    extracted = algorithm_stubs.extract_lsb(output, algorithm) if ok else None
+    with open(payload, "rb") as f:
+        ok = ok and extracted == f.read()
+    print(json.dumps({"samples": samples, "embed": embed_peak - baseline, "extract": _peak_rss_bytes() - baseline,
+                      "ok": ok}))
+    return 0
+
+
+def make_carriers(work_dir: str, megapixels, mode: str = "RGB", seed: int = DEFAULT_SEED) -> dict:
+    """Writes one textured PNG carrier per size; returns {megapixels: path}."""
+    carriers = {}
+    for mp in sorted(megapixels):
+        carriers[mp] = os.path.join(work_dir, f"carrier_{mp:g}mp.png")
+        make_image(carriers[mp], mp, "textured", mode, seed)
+    return carriers
+
+
+def measure(algorithm: str, carriers: dict, work_dir: str, fill: float = 0.5) -> dict:
+    """
+    Runs the algorithm on every carrier in a child process. Returns {megapixels: child result},
+    or raises RuntimeError with the child's stderr if one of them crashed.
+    """
+    results = {}
+    payload = os.path.join(work_dir, "payload.bin")
+    output = os.path.join(work_dir, f"stego_{algorithm}.png")
+    for mp, carrier in carriers.items():
+        with Image.open(carrier) as img:
+            samples = img.width * img.height * len(img.getbands())
+        with open(payload, "wb") as f:
+            f.write(os.urandom(int(samples * fill) // 8))
+        child = subprocess.run([sys.executable, "-m", "benchmarks.bench_memory", "--child", algorithm, carrier,
+                                payload, output], capture_output=True, text=True)
+        try:
+            results[mp] = json.loads(child.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            raise RuntimeError(f"child failed at {mp:g} MP: {child.stderr.strip()[-200:]}")
+    return results
+
+
+def check_budget(algorithm: str, results: dict) -> dict:
+    """Bytes per sample at the larger size and per added sample, and whether they stay within BUDGETS."""
+    small, large = min(results), max(results)
+    lo, hi = results[small], results[large]
+    added = hi["samples"] - lo["samples"]
+    report = {
+        "total": max(hi["embed"], hi["extract"]) / hi["samples"],
+        "embed_added": (hi["embed"] - lo["embed"]) / added,
+        "extract_added": (hi["extract"] - lo["extract"]) / added,
+        "round_trip": lo["ok"] and hi["ok"],
+    }
+    budget = BUDGETS[algorithm]
+    report["within_budget"] = max(report["total"], report["embed_added"], report["extract_added"]) <= budget
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check each image algorithm's peak RSS against a bytes-per-sample budget")
+    parser.add_argument("--megapixels", nargs=2, type=float, default=list(DEFAULT_MEGAPIXELS), metavar=("SMALL", "LARGE"))
+    parser.add_argument("--mode", choices=("L", "RGB"), default="RGB")
+    parser.add_argument("--fill", type=float, default=0.5, help="Payload bits as a fraction of the carrier samples")
+    parser.add_argument("--algorithms", nargs="+", choices=sorted(BUDGETS), default=sorted(BUDGETS))
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--child", nargs=4, metavar=("ALGORITHM", "CARRIER", "PAYLOAD", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return _child(*args.child)
+
+    small, large = sorted(args.megapixels)
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="rygelock_bench_memory_") as work_dir:
+        carriers = make_carriers(work_dir, (small, large), args.mode, args.seed)
+        print(f"{small:g} and {large:g} MP {args.mode} carriers, payload {args.fill:.0%} of samples; peak RSS growth per sample")
+        print(f"  {'algorithm':<10} {f'total @{large:g} MP':>14} {'embed/added':>12} {'extract/added':>14} {'budget':>7}  result")
+        for algorithm in args.algorithms:
+            try:
+                report = check_budget(algorithm, measure(algorithm, carriers, work_dir, args.fill))
+            except RuntimeError as e:
+                print(f"  {algorithm:<10} {e}")
+                failures += 1
+                continue
+            failures += not (report["within_budget"] and report["round_trip"])
+            status = ("OVER BUDGET" if not report["within_budget"] else
+                      "ok" if report["round_trip"] else "ROUND TRIP FAILED")
+            print(f"  {algorithm:<10} {report['total']:14.1f} {report['embed_added']:12.1f}"
+                  f" {report['extract_added']:14.1f} {BUDGETS[algorithm]:7d}  {status}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
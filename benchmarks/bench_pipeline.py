@@ -0,0 +1,269 @@
+# benchmarks/bench_pipeline.py — End-to-end embed -> extract round trips over a scenario matrix
+#
+# Run from the project root:
+#   python -m benchmarks.bench_pipeline --json results.json
+#   python -m benchmarks.bench_pipeline --encryption AES Fernet --masking off --carriers png bmp --batch 1 8
+#
+# Every scenario runs embed_files and extract_payload in a fresh interpreter (own output dir,
+# own peak RSS) with timing enabled, checks that each extracted payload matches byte for byte,
+# and reports wall time, the per-stage breakdown and peak RSS. Carriers use the algorithm the
+# embed tab picks for them (detect_algorithm), so images go through the LSB, JPEG-DCT and raster
+# paths; payloads beyond that algorithm's capacity are skipped. Exits with 1 if any scenario fails
+# that is not listed in EXPECTED_FAILURES. Diff the --json output between releases to spot
+# stage-level changes.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+import subprocess
+from fnmatch import fnmatch
+from benchmarks.corpus import build_corpus, DEFAULT_CORPUS_DIR, DEFAULT_SEED
+
+ENCRYPTIONS = ("None", "AES", "Blowfish", "Fernet")
+CARRIER_FILES = {  # Carrier type -> quick-corpus carrier; BMP and TIFF are converted from the PNG
+    "png": "img-textured-RGB-1mp.png",
+    "bmp": "img-textured-RGB-1mp.png",
+    "tiff": "img-textured-RGB-1mp.png",
+    "jpg": "img-textured-RGB-1mp.jpg",
+    "mp4": "video-4mib.mp4",
+    "mp3": "audio-2000f.mp3",
+}
+# Scenario id pattern (fnmatch) -> reason, for known bugs that are tracked elsewhere. These are
+# reported as XFAIL and do not fail the run; a listed scenario that passes is reported as XPASS.
+EXPECTED_FAILURES = {}
+REQUIRED_TOOLS = {"mp3": ("ffmpeg", "ffprobe")}  # pydub decodes MP3 carriers through ffmpeg
+HEADER_ALLOWANCE = 4096  # Bytes kept free for the metadata header and length prefix
+DEFAULT_PAYLOAD_KIB = (16, 256, 2048)
+DEFAULT_BATCH = (1, 4)
+PASSWORD = "bench-password"
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _stage_walls(timings) -> dict:
+    return {stage: stats["wall_s"] for stage, stats in (timings or {}).get("stages", {}).items()}
+
+
+def _expected_failure(scenario_id: str):
+    return next((reason for pattern, reason in EXPECTED_FAILURES.items() if fnmatch(scenario_id, pattern)), None)
+
+
+def _embedded_bytes(payload_bytes: int, encryption: str) -> int:
+    """Upper estimate of what lands in the carrier: cipher padding, Fernet's base64 and the header."""
+    if encryption == "Fernet":
+        payload_bytes = (payload_bytes + 73) * 4 // 3 + 4
+    return payload_bytes + 64 + HEADER_ALLOWANCE
+
+
+def _carrier_file(entry: dict, carrier_type: str) -> str:
+    """Returns the corpus file for `carrier_type`, converting the source image once for BMP/TIFF."""
+    stem, ext = os.path.splitext(entry["path"])
+    if ext.lstrip(".") == carrier_type or carrier_type not in ("bmp", "tiff"):
+        return entry["path"]
+    path = f"{stem}.{carrier_type}"
+    if not os.path.exists(path):
+        from PIL import Image
+        tmp_path = f"{stem}.tmp.{carrier_type}"
+        with Image.open(entry["path"]) as img:
+            img.save(tmp_path)  # Uncompressed, so core.raster embeds into it in place
+        os.replace(tmp_path, path)
+    return path
+
+
+def _carrier_capacity(path: str, algorithm: str):
+    """Payload capacity (bytes) of the LSB/DCT/raster algorithm, or None for append-style carriers."""
+    from core.algorithm import LSB_ALGORITHM_FN_MAP, RASTER_ALGORITHM_FN_MAP, lsb_capacity
+    if algorithm not in LSB_ALGORITHM_FN_MAP and algorithm not in RASTER_ALGORITHM_FN_MAP:
+        return None
+    return lsb_capacity(path, algorithm, exclude_wet=True)
+
+
+# --- Child process: one scenario ---
+def run_scenario(scenario: dict, seed: int) -> dict:
+    """Embeds `batch` payloads into copies of the carrier, extracts them again and compares."""
+    import numpy as np
+    from core.steg_engine import embed_files, extract_payload
+
+    work_dir = os.environ["RYGELOCK_OUTPUT_DIR"]
+    rng = np.random.default_rng(seed)
+    ext = os.path.splitext(scenario["carrier_path"])[1]
+    carriers, payloads = [], []
+    for i in range(scenario["batch"]):
+        carrier = os.path.join(work_dir, f"carrier_{i}{ext}")
+        shutil.copyfile(scenario["carrier_path"], carrier)
+        carriers.append({"file": carrier, "algorithm": scenario["algorithm"]})
+        payloads.append(rng.integers(0, 256, scenario["payload_kib"] * 1024, dtype=np.uint8).tobytes())
+
+    config = {
+        "carriers": carriers,
+        "payloads": payloads,
+        "encryption": scenario["encryption"],
+        "password": PASSWORD if scenario["encryption"] != "None" else "",
+        "masking": scenario["masking"],
+        "generate_key": scenario["key_file"],
+        "timing": True,
+    }
+    result = {"id": scenario["id"], "status": "ok"}
+    start = time.perf_counter()
+    embedded = embed_files(config, None)
+    result["embed_s"] = round(time.perf_counter() - start, 6)
+    result["embed_stages"] = _stage_walls(embedded.get("timings"))
+    result["pipeline_bottleneck"] = (embedded.get("pipeline") or {}).get("bottleneck")
+    if embedded["status"] != "Success":
+        result.update(status="embed_failed", detail="; ".join(embedded["errors"])[-300:])
+        return result
+
+    key_data = None
+    if scenario["key_file"]:
+        with open(embedded["key_file"], "rb") as f:
+            key_data = f.read()
+
+    # output_files follow input order, so output i carries payload i
+    extract_stages = {}
+    start = time.perf_counter()
+    for output, payload in zip(embedded["output_files"], payloads):
+        extracted = extract_payload(output, config["password"] or None, key_data)
+        for stage, wall in _stage_walls(extracted.get("timings")).items():
+            extract_stages[stage] = round(extract_stages.get(stage, 0.0) + wall, 6)
+        if extracted["status"] != "success":
+            result.update(status="extract_failed", detail=extracted.get("message", "")[-300:])
+            break
+        with open(extracted["output_file"], "rb") as f:
+            if f.read() != payload:
+                result.update(status="mismatch", detail=f"Payload from {os.path.basename(output)} differs")
+                break
+    result["extract_s"] = round(time.perf_counter() - start, 6)
+    result["extract_stages"] = extract_stages
+
+    total_bytes = scenario["batch"] * scenario["payload_kib"] * 1024
+    result["payload_mb_per_s"] = round(total_bytes / (result["embed_s"] + result["extract_s"]) / 1e6, 3)
+    peak = _peak_rss_bytes()
+    result["peak_rss_mb"] = round(peak / 1e6, 1) if peak is not None else None
+    return result
+
+
+def _run_in_child(scenario: dict, seed: int, timeout: float) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="rygelock_bench_pipeline_")
+    spec_path = os.path.join(work_dir, "scenario.json")
+    with open(spec_path, "w") as f:
+        json.dump({"scenario": scenario, "seed": seed}, f)
+    env = dict(os.environ, RYGELOCK_OUTPUT_DIR=work_dir, RYGELOCK_TIMING="1")
+    env.pop("RYGELOCK_METRICS_DIR", None)
+    try:
+        proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--child", spec_path],
+                              capture_output=True, text=True, timeout=timeout, env=env)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            return {"id": scenario["id"], "status": "crashed", "detail": proc.stderr.strip()[-300:]}
+        return json.loads(lines[-1])  # The engine prints progress lines before the result line
+    except subprocess.TimeoutExpired:
+        return {"id": scenario["id"], "status": "timeout"}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def plan_scenarios(corpus: list, args) -> list:
+    from core.algorithm import detect_algorithm
+
+    by_name = {entry["name"]: entry for entry in corpus}
+    carriers = {}  # Carrier type -> (path, algorithm, capacity)
+    for carrier_type in args.carriers:
+        path = _carrier_file(by_name[CARRIER_FILES[carrier_type]], carrier_type)
+        algorithm = detect_algorithm(path) or "Default"
+        carriers[carrier_type] = (path, algorithm, _carrier_capacity(path, algorithm))
+
+    scenarios = []
+    for enc, masking, key_file, carrier_type, payload_kib, batch in itertools.product(
+            args.encryption, args.masking, args.key_file, args.carriers, args.payload_kib, args.batch):
+        path, algorithm, capacity = carriers[carrier_type]
+        scenario_id = f"{enc}/mask-{masking}/key-{key_file}/{carrier_type}/{payload_kib}KiB/x{batch}"
+        if os.path.getsize(path) <= payload_kib * 1024 * 1.2:  # embed_files' carrier size rule
+            scenarios.append({"id": scenario_id, "skip": "carrier too small"})
+            continue
+        missing = [tool for tool in REQUIRED_TOOLS.get(carrier_type, ()) if shutil.which(tool) is None]
+        if missing:
+            scenarios.append({"id": scenario_id, "skip": f"{', '.join(missing)} not installed"})
+            continue
+        if capacity is not None and _embedded_bytes(payload_kib * 1024, enc) > capacity:
+            scenarios.append({"id": scenario_id, "skip": f"over {algorithm} capacity ({capacity // 1024} KiB)"})
+            continue
+        scenarios.append({"id": scenario_id, "encryption": enc, "masking": masking == "on",
+                          "key_file": key_file == "on", "carrier_path": path, "algorithm": algorithm,
+                          "payload_kib": payload_kib, "batch": batch})
+    return scenarios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark full embed/extract round trips")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--encryption", nargs="+", choices=ENCRYPTIONS, default=list(ENCRYPTIONS))
+    parser.add_argument("--masking", nargs="+", choices=("off", "on"), default=["off", "on"])
+    parser.add_argument("--key-file", nargs="+", choices=("off", "on"), default=["off", "on"])
+    parser.add_argument("--carriers", nargs="+", choices=sorted(CARRIER_FILES), default=sorted(CARRIER_FILES))
+    parser.add_argument("--payload-kib", nargs="+", type=int, default=list(DEFAULT_PAYLOAD_KIB))
+    parser.add_argument("--batch", nargs="+", type=int, default=list(DEFAULT_BATCH), help="Carrier/payload pairs per job")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--timeout", type=float, default=900, help="Seconds per scenario")
+    parser.add_argument("--json", help="Write all results to this file")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        with open(args.child, "r") as f:
+            spec = json.load(f)
+        print(json.dumps(run_scenario(spec["scenario"], spec["seed"])))
+        return 0
+
+    corpus = build_corpus(args.corpus_dir, "quick", args.seed)
+    scenarios = plan_scenarios(corpus, args)
+    print(f"{len(scenarios)} scenarios")
+    print(f"  {'scenario':<44} {'embed s':>8} {'extract s':>9} {'MB/s':>7} {'peak RSS':>9}  slowest embed stage")
+
+    results, failures, expected = [], 0, 0
+    for scenario in scenarios:
+        if "skip" in scenario:
+            results.append({"id": scenario["id"], "status": "skipped", "detail": scenario["skip"]})
+            print(f"  {scenario['id']:<44} {'SKIPPED':>8}  {scenario['skip']}")
+            continue
+        r = _run_in_child(scenario, args.seed, args.timeout)
+        r["algorithm"] = scenario["algorithm"]
+        results.append(r)
+        reason = _expected_failure(scenario["id"])
+        if r["status"] != "ok":
+            if reason:
+                expected += 1
+                r["expected_failure"] = reason
+                print(f"  {scenario['id']:<44} {'XFAIL':>8}  {r['status']}: {reason}")
+                continue
+            failures += 1
+            print(f"  {scenario['id']:<44} {r['status'].upper():>8}  {r.get('detail', '')}")
+            continue
+        if reason:
+            print(f"  {scenario['id']:<44} {'XPASS':>8}  listed in EXPECTED_FAILURES: {reason}")
+        slowest = max(r["embed_stages"].items(), key=lambda kv: kv[1], default=("-", 0.0))
+        rss = f"{r['peak_rss_mb']:6.0f} MB" if r["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(f"  {scenario['id']:<44} {r['embed_s']:8.3f} {r['extract_s']:9.3f} {r['payload_mb_per_s']:7.2f} {rss}"
+              f"  {slowest[0]} ({slowest[1]:.3f} s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"seed": args.seed, "python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+    print(f"{failures} failing scenario(s), {expected} expected failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/bench_simulator.py — Payload-limited sender simulation vs k-cheapest LSB replacement
+#
+# Run from the project root:  python -m benchmarks.bench_simulator [--size 1024] [--payloads 0.05 0.1 0.2 0.4]
+#
+# For a seeded synthetic grayscale image and each cost map, embeds several relative payloads
+# (bits per pixel) two ways: the k cheapest pixels with their LSBs replaced (what run_* do, half of
+# them change on average), and core.embedding_simulator's optimal ±1 changes. Reports the expected
+# distortion of each, the simulator's change rate and lambda, and how long the simulation took.
+
+import sys
+import time
+import argparse
+import functools
+import numpy as np
+from core import embedding_simulator
+from core.algorithm_stubs import _s_uniward_costs, _wow_costs, _hugo_costs
+
+COST_FUNCTIONS = {
+    "s-uniward": _s_uniward_costs,
+    "wow": _wow_costs,
+    "hugo": functools.partial(_hugo_costs, gamma=1.0, sigma=1.0),
+}
+
+
+def _image(rng, size: int) -> np.ndarray:
+    base = np.cumsum(rng.normal(0, 3, (size, size)), axis=1)  # Smooth and textured regions
+    pixels = np.clip(128 + base - base.mean() + rng.normal(0, 8, (size, size)), 0, 255).astype(np.uint8)
+    pixels[: size // 8] = 128  # A flat band
+    return pixels[:, :, None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare simulated optimal embedding with k-cheapest LSB replacement")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--payloads", nargs="+", type=float, default=[0.05, 0.1, 0.2, 0.4])
+    parser.add_argument("--costs", nargs="+", choices=sorted(COST_FUNCTIONS), default=sorted(COST_FUNCTIONS))
+    parser.add_argument("--seed", type=int, default=1337)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    pixels = _image(rng, args.size)
+    print(f"{args.size}x{args.size} image, distortion = Σ cost of changed pixels (expected for k-cheapest)")
+    print(f"  {'cost':<10} {'bpp':>5} {'k-cheapest':>11} {'simulated':>10} {'ratio':>6} {'changes':>8} {'lambda':>9} {'seconds':>8}")
+    for name in args.costs:
+        rho_minus, rho_plus = embedding_simulator.ternary_costs(
+            np.where(pixels == 0, np.inf, COST_FUNCTIONS[name](pixels)),
+            np.where(pixels == 255, np.inf, COST_FUNCTIONS[name](pixels)))
+        ordered = np.sort(np.maximum(rho_minus, rho_plus).ravel())
+        for payload in args.payloads:
+            bits = int(payload * pixels.size)
+            cheapest = 0.5 * ordered[:bits].sum(dtype=np.float64)
+            start = time.perf_counter()
+            changes, lam = embedding_simulator.simulate(rho_minus, rho_plus, bits, args.seed)
+            seconds = time.perf_counter() - start
+            simulated = (rho_minus[changes == -1].sum(dtype=np.float64) + rho_plus[changes == 1].sum(dtype=np.float64))
+            print(f"  {name:<10} {payload:5.2f} {cheapest:11.4g} {simulated:10.4g} {simulated / cheapest:6.2f}"
+                  f" {np.count_nonzero(changes) / changes.size:8.2%} {lam:9.3g} {seconds:8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
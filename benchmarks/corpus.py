@@ -0,0 +1,162 @@
+# benchmarks/corpus.py — Deterministic synthetic carrier corpus for the benchmarks
+#
+# Every carrier is generated from a fixed seed, so two runs (or two machines) benchmark the
+# same bytes. Files are cached in the corpus directory and only generated when missing:
+#   python -m benchmarks.corpus [--scale quick|full] [--dir PATH]
+
+import os
+import sys
+import math
+import wave
+import struct
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+DEFAULT_SEED = 1337
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "rygelock_bench_corpus")
+
+# (image megapixels, WAV seconds, MP4 mdat MiB, MP3 frames) per scale
+SCALES = {
+    "quick": {"megapixels": (0.25, 1), "wav_seconds": (5,), "mp4_mib": (4,), "mp3_frames": (2000,)},
+    "full": {"megapixels": (0.25, 1, 4, 12, 50), "wav_seconds": (5, 60), "mp4_mib": (4, 64),
+             "mp3_frames": (2000, 20000)},
+}
+
+ROWS_PER_BLOCK = 512  # Images are generated in row blocks to bound memory at 50 MP
+
+
+def _image_shape(megapixels: float) -> tuple:
+    """(height, width) of a 4:3 image with roughly `megapixels` pixels."""
+    width = int(round(math.sqrt(megapixels * 1e6 * 4 / 3)))
+    return int(round(megapixels * 1e6 / width)), width
+
+
+def make_image(path: str, megapixels: float, kind: str = "textured", mode: str = "L", seed: int = DEFAULT_SEED):
+    """
+    Writes a synthetic image. "textured" mixes an oriented pattern with Gaussian noise (busy regions,
+    where content-adaptive costs are low); "flat" is a smooth gradient (costs are high everywhere).
+    """
+    if kind not in ("textured", "flat"):
+        raise ValueError(f"Unknown image kind: {kind}")
+    rng = np.random.default_rng(seed)
+    height, width = _image_shape(megapixels)
+    channels = 3 if mode == "RGB" else 1
+    pixels = np.empty((height, width, channels), dtype=np.uint8)
+    x = np.arange(width, dtype=np.float32)
+    for top in range(0, height, ROWS_PER_BLOCK):
+        y = np.arange(top, min(top + ROWS_PER_BLOCK, height), dtype=np.float32)[:, None]
+        for ch in range(channels):
+            if kind == "textured":
+                block = 128 + 50 * np.sin(x / (7 + ch)) * np.cos(y / 11) + 20 * np.sin((x + y) / 3)
+                block = block + rng.normal(0, 18, size=(len(y), width)).astype(np.float32)
+            else:
+                block = 40 + 160 * (x / width) * 0.5 + 80 * (y / height) + 8 * ch
+            pixels[top:top + len(y), :, ch] = np.clip(block, 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels, mode)
+    if path.lower().endswith((".jpg", ".jpeg")):
+        img.save(path, quality=90)
+    else:
+        img.save(path, compress_level=1)
+
+
+def make_wav(path: str, seconds: float, kind: str = "tone", rate: int = 44100, seed: int = DEFAULT_SEED):
+    """Writes 16-bit mono PCM: a 440 Hz tone or Gaussian noise."""
+    n = int(seconds * rate)
+    if kind == "tone":
+        samples = 12000 * np.sin(2 * np.pi * 440 * np.arange(n) / rate)
+    elif kind == "noise":
+        samples = np.random.default_rng(seed).normal(0, 6000, n)
+    else:
+        raise ValueError(f"Unknown audio kind: {kind}")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.clip(samples, -32768, 32767).astype("<i2").tobytes())
+
+
+def _box(box_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(body)) + box_type + body
+
+
+def make_mp4_skeleton(path: str, mdat_mib: float, seed: int = DEFAULT_SEED):
+    """Writes a minimal ISO-BMFF file: ftyp, moov with an mvhd, and an mdat of seeded random bytes."""
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 0x200) + b"isomiso2mp41")
+    mvhd = _box(b"mvhd", struct.pack(">IIIII", 0, 0, 0, 1000, 0)  # version/flags, times, timescale, duration
+                + struct.pack(">IH", 0x00010000, 0x0100) + b"\0" * 10  # rate 1.0, volume 1.0, reserved
+                + struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)  # identity matrix
+                + b"\0" * 24 + struct.pack(">I", 1))  # pre_defined, next_track_ID
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as f:
+        f.write(ftyp + _box(b"moov", mvhd))
+        size = int(mdat_mib * (1 << 20))
+        f.write(struct.pack(">I", 8 + size) + b"mdat")
+        for offset in range(0, size, 1 << 20):
+            f.write(rng.integers(0, 256, min(1 << 20, size - offset), dtype=np.uint8).tobytes())
+
+
+def make_mp3_skeleton(path: str, frames: int):
+    """Writes an empty ID3v2.3 tag followed by silent MPEG-1 Layer III frames (128 kbit/s, 44.1 kHz)."""
+    frame = b"\xff\xfb\x90\x64" + b"\0" * (144 * 128000 // 44100 - 4)
+    with open(path, "wb") as f:
+        f.write(b"ID3\x03\x00\x00\x00\x00\x00\x00")
+        f.write(frame * frames)
+
+
+def build_corpus(directory: str = DEFAULT_CORPUS_DIR, scale: str = "quick", seed: int = DEFAULT_SEED) -> list:
+    """
+    Generates (or reuses) the corpus for `scale` and returns one dict per carrier:
+    name, path, type ("image", "wav", "mp4", "mp3"), bytes, and pixels for images.
+    """
+    if scale not in SCALES:
+        raise ValueError(f"Unknown corpus scale: {scale}")
+    spec = SCALES[scale]
+    os.makedirs(directory, exist_ok=True)
+
+    entries = []
+
+    def add(name, carrier_type, generate, pixels=None):
+        path = os.path.join(directory, f"s{seed}-{name}")
+        if not os.path.exists(path):
+            tmp_path = path + ".tmp" + os.path.splitext(path)[1]
+            generate(tmp_path)
+            os.replace(tmp_path, path)
+        entry = {"name": name, "path": path, "type": carrier_type, "bytes": os.path.getsize(path)}
+        if pixels:
+            entry["pixels"] = pixels
+        entries.append(entry)
+
+    for mp in spec["megapixels"]:
+        height, width = _image_shape(mp)
+        for kind in ("textured", "flat"):
+            for mode in ("L", "RGB"):
+                add(f"img-{kind}-{mode}-{mp:g}mp.png", "image",
+                    lambda p, mp=mp, kind=kind, mode=mode: make_image(p, mp, kind, mode, seed), height * width)
+        add(f"img-textured-RGB-{mp:g}mp.jpg", "image",
+            lambda p, mp=mp: make_image(p, mp, "textured", "RGB", seed), height * width)
+    for seconds in spec["wav_seconds"]:
+        for kind in ("tone", "noise"):
+            add(f"wav-{kind}-{seconds}s.wav", "wav", lambda p, s=seconds, kind=kind: make_wav(p, s, kind, seed=seed))
+    for mib in spec["mp4_mib"]:
+        add(f"video-{mib}mib.mp4", "mp4", lambda p, mib=mib: make_mp4_skeleton(p, mib, seed))
+    for frames in spec["mp3_frames"]:
+        add(f"audio-{frames}f.mp3", "mp3", lambda p, frames=frames: make_mp3_skeleton(p, frames))
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--dir", default=DEFAULT_CORPUS_DIR, help="Corpus directory (files are reused)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+
+    for entry in build_corpus(args.dir, args.scale, args.seed):
+        print(f"  {entry['name']:<32} {entry['bytes'] / 1e6:9.2f} MB  {entry['path']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
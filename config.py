@@ -2,15 +2,40 @@
 
 import json
 import os
+import uuid
+import shutil
+import hashlib
+import tempfile
+import contextlib
 
 CONFIG_FILE = "user_config.json"
 
 DEFAULT_CONFIG = {
     "theme": "light",
     "audio": True,
-    "decoy_logs": False
+    "decoy_logs": False,
+    "kdf_profile": None,  # Set by `python -m core.kdf_profiles calibrate --save`
+    "output_root": None,  # Defaults to ~/Desktop/Rygelock_Output
+    "scratch_root": None,  # Per-job scratch space; point at a tmpfs mount for speed. Defaults to the system temp dir
+    "timing": False,  # Add per-stage "timings" to embed/extract results (also RYGELOCK_TIMING=1)
+    "trace_dir": None,  # Write a Chrome trace-event JSON per job here (also RYGELOCK_TRACE_DIR)
+    "metrics_textfile": None,  # Prometheus text file refreshed after every job
+    "metrics_port": None,  # Serve Prometheus metrics on 127.0.0.1:<port>/metrics
+    "profile": False,  # cProfile/tracemalloc the crypto and stego_apply sections of embed jobs (also RYGELOCK_PROFILE=1)
+    "profile_dir": None,  # Profile reports; defaults to <output root>/profiles
+    "profile_top_n": 25,  # Allocation sites listed in the allocation report
+    "cost_workers": None  # Processes for LSB cost maps of large images (also RYGELOCK_COST_WORKERS). Defaults to the CPU count
 }
 
+# Environment overrides (take precedence over user_config.json)
+OUTPUT_ROOT_ENV = "RYGELOCK_OUTPUT_DIR"
+SCRATCH_ROOT_ENV = "RYGELOCK_SCRATCH_DIR"
+
+# Outputs are spread over 256 subdirectories named after a hash prefix of the file name
+OUTPUT_SHARD_CHARS = 2
+
+_created_dirs = set()  # Output roots and shards already made, so claims skip the makedirs call
+
 def load_config():
     if not os.path.exists(CONFIG_FILE):
         return DEFAULT_CONFIG
@@ -22,7 +47,70 @@ def save_config(config):
         json.dump(config, f, indent=4)
 
 def get_output_dir():
-    desktop = os.path.join(os.path.expanduser("~"), "Desktop")
-    output_path = os.path.join(desktop, "Rygelock_Output")
-    os.makedirs(output_path, exist_ok=True)
-    return output_path
\ No newline at end of file
+    """
+    Returns the output root, creating it on first use only. The setting is re-read on every call,
+    so a changed RYGELOCK_OUTPUT_DIR or saved "output_root" applies to the next output.
+    Resolution order: RYGELOCK_OUTPUT_DIR, config "output_root", ~/Desktop/Rygelock_Output.
+    """
+    output_path = os.environ.get(OUTPUT_ROOT_ENV) or load_config().get("output_root")
+    if not output_path:
+        desktop = os.path.join(os.path.expanduser("~"), "Desktop")
+        output_path = os.path.join(desktop, "Rygelock_Output")
+    if output_path not in _created_dirs:
+        os.makedirs(output_path, exist_ok=True)
+        _created_dirs.add(output_path)
+    return output_path
+
+def get_scratch_root():
+    """Scratch root for job workspaces: RYGELOCK_SCRATCH_DIR, config "scratch_root", or the system temp dir."""
+    return os.environ.get(SCRATCH_ROOT_ENV) or load_config().get("scratch_root") or None
+
+@contextlib.contextmanager
+def job_scratch_dir():
+    """
+    Creates a private scratch directory for one job and removes it as a unit afterwards,
+    so temporary files never mix with outputs or with other jobs running concurrently.
+    """
+    scratch_root = get_scratch_root()
+    if scratch_root:
+        os.makedirs(scratch_root, exist_ok=True)
+    path = tempfile.mkdtemp(prefix="rygelock_job_", dir=scratch_root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def get_output_shard_dir(filename):
+    """Returns (and creates once) the hash-prefix subdirectory of the output root for `filename`."""
+    shard = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:OUTPUT_SHARD_CHARS]
+    shard_dir = os.path.join(get_output_dir(), shard)
+    if shard_dir not in _created_dirs:
+        os.makedirs(shard_dir, exist_ok=True)
+        _created_dirs.add(shard_dir)
+    return shard_dir
+
+def claim_output_path(filename):
+    """
+    Atomically reserves a unique output path for `filename` in its shard.
+    The file is created with O_EXCL; on a collision a random suffix is added and the claim retried,
+    so there is no exists()-then-write race and no scan of the directory.
+    """
+    shard_dir = get_output_shard_dir(filename)
+    base, ext = os.path.splitext(filename)
+    candidate = filename
+    while True:
+        path = os.path.join(shard_dir, candidate)
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            return path
+        except FileExistsError:
+            candidate = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
+
+def place_output(src_path, filename):
+    """Moves a finished file (e.g. from a job scratch dir) to a claimed output path; returns that path."""
+    path = claim_output_path(filename)
+    try:
+        os.replace(src_path, path)
+    except OSError:
+        shutil.move(src_path, path)  # Scratch dir on another filesystem (e.g. tmpfs)
+    return path
\ No newline at end of file
@@ -1,18 +1,53 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QProgressBar, QMessageBox, QApplication
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QProgressBar, QMessageBox, QApplication, QPushButton
 from PyQt5.QtCore import Qt
 
 from ui.result_viewer import ResultViewer
 
+PHASE_LABELS = {
+    "read": "Reading payload",
+    "crypto": "Encrypting",
+    "cost_map": "Computing cost map",
+    "selection": "Selecting pixels",
+    "embed": "Embedding",
+    "write": "Writing output",
+    "header": "Reading header",
+    "key": "Checking password/key",
+    "decrypt": "Decrypting",
+    "done": "Finishing",
+}
+
+
+def _format_rate(rate, unit):
+    if unit == "bytes":
+        return f"{rate / 1e6:.1f} MB/s"
+    if unit == "pixels":
+        return f"{rate / 1e6:.1f} MP/s"
+    return f"{rate:,.0f} {unit}/s"
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
 class EmbedProgressPopup(QWidget):
-    def __init__(self):
+    """
+    Modal progress window for long-running jobs. Defaults to the embedding texts;
+    other jobs (e.g. extraction) pass their own title/message and handle the result themselves.
+    """
+    def __init__(self, cancel_token=None, title="Embedding In Progress",
+                 message="Please wait while embedding is in progress..."):
         super().__init__()
-        self.setWindowTitle("Embedding In Progress")
-        self.setFixedSize(350, 120)
+        self.cancel_token = cancel_token
+        self.setWindowTitle(title)
+        self.setFixedSize(380, 190)
         self.setStyleSheet("background-color: #1e1e1e; color: white;")
 
         layout = QVBoxLayout()
 
-        self.status_label = QLabel("Please wait while embedding is in progress...")
+        self.status_label = QLabel(message)
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet("font-size: 14px;")
 
@@ -35,20 +70,53 @@ class EmbedProgressPopup(QWidget):
         self.percent_label = QLabel("Progress: 0%")
         self.percent_label.setAlignment(Qt.AlignCenter)
 
+        self.detail_label = QLabel("")
+        self.detail_label.setAlignment(Qt.AlignCenter)
+        self.detail_label.setStyleSheet("font-size: 11px; color: #aaaaaa;")
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet("background-color: #2d2d2d; border: 1px solid #444; padding: 4px;")
+        self.cancel_button.clicked.connect(self.handle_cancel)
+        self.cancel_button.setEnabled(cancel_token is not None)
+
         layout.addWidget(self.status_label)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.percent_label)
+        layout.addWidget(self.detail_label)
+        layout.addWidget(self.cancel_button)
 
         self.setLayout(layout)
         self.setWindowModality(Qt.ApplicationModal)
 
     def update_progress(self, value):
-        self.progress_bar.setValue(value)
-        self.percent_label.setText(f"Progress: {value}%")
+        # Accepts a plain percentage or a core.progress snapshot dict
+        if not isinstance(value, dict):
+            value = {"percent": int(value)}
+        percent = value.get("percent", 0)
+        self.progress_bar.setValue(percent)
+        self.percent_label.setText(f"Progress: {percent}%")
+
+        phase = value.get("phase")
+        if phase and not (self.cancel_token and self.cancel_token.cancelled):
+            self.status_label.setText(PHASE_LABELS.get(phase, phase.replace("_", " ").capitalize()) + "...")
+            details = []
+            if value.get("rate"):
+                details.append(_format_rate(value["rate"], value.get("unit", "bytes")))
+            details.append(f"ETA {_format_eta(value.get('eta_s'))}")
+            self.detail_label.setText("  |  ".join(details))
+
+    def handle_cancel(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("Cancelling...")
 
     def close_and_show_result(self, result):
         self.close()
-        if result.get("status") == "Failed":
+        if result.get("status") == "Cancelled":
+            QMessageBox.information(None, "Embedding Cancelled",
+                                    "<span style='color: orange;'>Embedding was cancelled.</span>")
+        elif result.get("status") == "Failed":
             error_text = "<br>".join(result.get("errors", ["An unknown error occurred."]))
             QMessageBox.critical(None, "Embedding Failed", f"<span style='color: orange;'>{error_text}</span>")
         else:
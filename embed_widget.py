@@ -8,6 +8,7 @@ from PyQt5.QtGui import QPixmap, QIcon, QFont
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from core.algorithm import detect_algorithm
 from core.steg_engine import embed_files
+from core.progress import CancelToken
 # Removed: from core.deception_mech import prepare_fake_output
 from utils.config import get_output_dir
 from utils.file_validator import apply_data_whitening
@@ -309,16 +310,17 @@ class EmbedWidget(QWidget):
         # if config["fake_payloads"] or config["generate_fake_key"]:
         #     prepare_fake_output(config)
 
-        self.progress_popup = EmbedProgressPopup()
+        cancel_token = CancelToken()
+        self.progress_popup = EmbedProgressPopup(cancel_token)
         self.progress_popup.show()
 
         class WorkerThread(QThread):
-            progress = pyqtSignal(int)
+            progress = pyqtSignal(object)
             done = pyqtSignal(dict)
 
             def run(self_):
                 try:
-                    result = embed_files(config, self_.progress.emit)
+                    result = embed_files(config, self_.progress.emit, cancel_token)
                 except Exception as e:
                     result = {"status": "error", "message": str(e)}
                 self_.done.emit(result)
@@ -326,4 +328,4 @@ class EmbedWidget(QWidget):
         self.worker = WorkerThread()
         self.worker.progress.connect(self.progress_popup.update_progress)
         self.worker.done.connect(self.progress_popup.close_and_show_result)
-        self.worker.start()
\ No newline at end of file
+        self.worker.start()
\ No newline at end of file
@@ -0,0 +1,108 @@
+# core/embedding_simulator.py — Payload-limited sender simulation: optimal ±1 change probabilities for a ternary cost map
+#
+# Only algorithm_stubs.simulate_embedding and benchmarks/bench_simulator use this. The drawn changes
+# carry no decodable message, so the run_* embedders keep their k-cheapest selection, which
+# extract_lsb can reverse.
+
+import numpy as np
+
+WET_COST = 1e10  # Costs at or above this (and inf/NaN) are never changed
+LAMBDA_MIN = 128 / WET_COST  # exp(-LAMBDA_MIN * WET_COST) underflows to exactly 0 in float32
+MAX_ITERATIONS = 64  # Bracketing plus bisection steps; each is one pass over the cost map
+ENTROPY_TOLERANCE = 1e-4  # Relative error allowed in the payload the found lambda carries
+LN2 = np.log(2.0)
+
+
+def ternary_costs(rho_minus, rho_plus=None) -> tuple:
+    """
+    float32 (-1, +1) cost arrays with inf/NaN and anything above WET_COST clamped to WET_COST.
+    A symmetric cost map (rho_plus None) is used for both directions. float32 inputs are
+    clamped in place instead of copied.
+    """
+    prepared = []
+    for rho in (rho_minus, rho_minus if rho_plus is None else rho_plus):
+        rho = np.nan_to_num(np.asarray(rho, dtype=np.float32), copy=False, nan=WET_COST, posinf=WET_COST)
+        if rho.size and rho.min() < 0:
+            raise ValueError("Embedding costs must be non-negative.")
+        prepared.append(np.minimum(rho, WET_COST, out=rho))
+    return prepared[0], prepared[1]
+
+
+def _weights(lam: float, rho_minus: np.ndarray, rho_plus: np.ndarray) -> tuple:
+    lam = np.float32(max(lam, LAMBDA_MIN))
+    return np.exp(-lam * rho_minus), np.exp(-lam * rho_plus)
+
+
+def change_probabilities(lam: float, rho_minus: np.ndarray, rho_plus: np.ndarray) -> tuple:
+    """Gibbs distribution of the changes: p(±1) = exp(-lam * rho±) / (1 + exp(-lam * rho-) + exp(-lam * rho+))."""
+    p_minus, p_plus = _weights(lam, rho_minus, rho_plus)
+    z = 1 + p_minus + p_plus
+    p_minus /= z
+    p_plus /= z
+    return p_minus, p_plus
+
+
+def entropy_bits(lam: float, rho_minus: np.ndarray, rho_plus: np.ndarray) -> float:
+    """
+    Payload, in bits, that changes drawn at `lam` carry: their total ternary entropy. With ln p± = -lam rho± - ln z
+    it is Σ ln z + lam (p- rho- + p+ rho+), so no logarithm of a (possibly zero) probability is taken.
+    """
+    w_minus, w_plus = _weights(lam, rho_minus, rho_plus)
+    z = w_minus + w_plus
+    nats = np.log1p(z).sum(dtype=np.float64)  # log1p keeps tiny change rates (small payloads) exact
+    z += 1
+    w_minus *= rho_minus
+    w_plus *= rho_plus
+    w_minus += w_plus
+    w_minus /= z
+    nats += max(lam, LAMBDA_MIN) * w_minus.sum(dtype=np.float64)
+    return float(nats / LN2)
+
+
+def find_lambda(rho_minus: np.ndarray, rho_plus: np.ndarray, message_bits: float) -> float:
+    """
+    Lagrange multiplier whose change probabilities carry `message_bits`. The entropy falls as lambda
+    grows, so lambda is bracketed by doubling/halving and then bisected geometrically, which copes
+    with cost maps of any scale. Raises ValueError if even LAMBDA_MIN cannot carry the payload.
+    """
+    if message_bits <= 0:
+        return np.inf
+    if entropy_bits(LAMBDA_MIN, rho_minus, rho_plus) < message_bits:
+        raise ValueError("Payload too large for the carrier's non-wet capacity.")
+    finite = rho_minus[rho_minus < WET_COST]
+    lam = 1 / max(float(np.median(finite)) if finite.size else 1.0, 1e-6)  # Starts near the right scale
+    lo = hi = None
+    for _ in range(MAX_ITERATIONS):
+        bits = entropy_bits(lam, rho_minus, rho_plus)
+        if abs(bits - message_bits) <= ENTROPY_TOLERANCE * message_bits:
+            break
+        if bits > message_bits:
+            lo = lam  # Too many changes: lambda must grow
+        else:
+            hi = lam
+        if hi is None:
+            lam *= 2
+        elif lo is None and lam / 2 > LAMBDA_MIN:
+            lam /= 2
+        else:
+            lo = lo or LAMBDA_MIN
+            lam = float(np.sqrt(lo * hi))
+    return lam
+
+
+def simulate(rho_minus, rho_plus=None, message_bits: float = 0, seed=None) -> tuple:
+    """
+    Simulates a payload-limited sender that embeds `message_bits` bits with minimal expected distortion:
+    finds lambda, then draws every change in one pass from a seeded np.random.Generator (an int seed,
+    a Generator, or None for fresh entropy). Returns (int8 changes in {-1, 0, +1} shaped like the
+    costs, lambda). Samples at WET_COST never change.
+    """
+    rho_minus, rho_plus = ternary_costs(rho_minus, rho_plus)
+    lam = find_lambda(rho_minus, rho_plus, message_bits)
+    if not np.isfinite(lam):
+        return np.zeros(rho_minus.shape, dtype=np.int8), lam
+    p_minus, p_plus = change_probabilities(lam, rho_minus, rho_plus)
+    u = np.random.default_rng(seed).random(p_minus.shape, dtype=np.float32)
+    changes = (u < p_minus + p_plus).astype(np.int8)
+    changes[u < p_minus] = -1
+    return changes, lam
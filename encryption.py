@@ -1,22 +1,47 @@
 from Crypto.Cipher import AES, Blowfish
 from Crypto.Random import get_random_bytes
-from Crypto.Protocol.KDF import PBKDF2
 from cryptography.fernet import Fernet, InvalidToken
 import base64
 import hashlib
+import hmac
+import numpy as np
 import os # Added for os.urandom if needed for KDF salt, though PBKDF2 handles it
+from core.kdf_profiles import run_kdf, normalize_kdf_params, LEGACY_KDF_PARAMS
+from core.key_cache import KEY_CACHE, zeroize
+from core.timing import span
+from core.metrics import KDF_RUNS
 
 BLOCK_SIZE_AES = 16
 BLOCK_SIZE_BLOWFISH = 8
-PBKDF2_ITER = 100_000
+PBKDF2_ITER = LEGACY_KDF_PARAMS["iterations"] # Legacy default; the real parameters now travel in the header
 SALT_SIZE = 16 # For salts directly managed by us (e.g., prepended to ciphertext)
 
+# Derived key length per cipher (bytes)
+KEY_SIZES = {"AES": 32, "Blowfish": 56, "Fernet": 32}
+
+# Key-check value: a short HMAC of a fixed label under the derived key. It lets the
+# extractor reject a wrong password/key file right after key derivation, without
+# touching the (possibly huge) ciphertext.
+KEY_CHECK_LABEL = b"RYGELOCK-KEY-CHECK-V1"
+KEY_CHECK_SIZE = 8
+
 # --- Helper function for Key Derivation ---
 # This function will now incorporate `key_data` if provided.
-def _derive_key_material(password: str, salt: bytes, key_data: bytes = None, dkLen: int = 32) -> bytes:
+def _derive_key_material(password: str, salt: bytes, key_data: bytes = None, dkLen: int = 32,
+                         kdf_params: dict = None, use_cache: bool = False) -> bytes:
     """
-    Derives a cryptographic key using PBKDF2, combining password and optional key_data.
+    Derives a cryptographic key, combining password and optional key_data.
+    kdf_params selects the KDF and its cost (see core/kdf_profiles.py); None means legacy PBKDF2.
+    use_cache looks the key up in the session cache (core/key_cache.py) first; decryption paths set it
+    and get a bytearray copy back, which they zeroize once the cipher is done with it.
     """
+    kdf_params = normalize_kdf_params(kdf_params)
+    if use_cache:
+        return KEY_CACHE.get_or_derive(
+            password.encode('utf-8'), salt, key_data, dkLen, kdf_params,
+            lambda: _derive_key_material(password, salt, key_data, dkLen, kdf_params)
+        )
+
     password_bytes = password.encode('utf-8')
     if key_data:
         # Combine password and key_data for a stronger seed for PBKDF2
@@ -32,27 +57,53 @@ def _derive_key_material(password: str, salt: bytes, key_data: bytes = None, dkL
     # PBKDF2 returns the derived key (dkLen bytes long)
     # The 'salt' here is the random salt *for PBKDF2 itself*, not the `SALT_SIZE` from `key_data`.
     # PBKDF2 handles its internal salt generation if not explicitly given, but here we pass ours.
-    return PBKDF2(combined_password_seed, salt, dkLen=dkLen, count=PBKDF2_ITER)
+    KDF_RUNS.inc(kdf=kdf_params["algorithm"])
+    with span(f"kdf.{kdf_params['algorithm']}"):
+        return run_kdf(combined_password_seed, salt, dkLen, kdf_params)
+
+# ----------------------- CBC helper --------------------------
+def _cbc_encrypt(cipher, data: bytes, salt: bytes, iv: bytes, block_size: int) -> bytearray:
+    """
+    PKCS7-pads and CBC-encrypts `data` straight into one preallocated salt|iv|ciphertext buffer,
+    so large payloads are copied once (no padded copy, no final concatenation).
+    """
+    data = memoryview(data).cast('B')
+    full = len(data) - len(data) % block_size
+    pad_len = block_size - len(data) % block_size
+    head = len(salt) + len(iv)
+    out = bytearray(head + full + block_size)
+    out[:len(salt)] = salt
+    out[len(salt):head] = iv
+    view = memoryview(out)
+    if full:
+        cipher.encrypt(data[:full], output=view[head:head + full])
+    # PKCS7 padding equivalent on the final (partial) block
+    cipher.encrypt(data[full:].tobytes() + bytes([pad_len]) * pad_len, output=view[head + full:])
+    return out
 
 # --------------------------- AES ----------------------------
-def encrypt_aes(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = get_random_bytes(SALT_SIZE) # Salt for PBKDF2
-    key = _derive_key_material(password, salt, key_data, dkLen=32) # AES key is 32 bytes for AES-256
+def encrypt_aes(data: bytes, password: str, key_data: bytes = None, salt: bytes = None, key: bytes = None,
+                kdf_params: dict = None) -> bytes:
+    salt = salt or get_random_bytes(SALT_SIZE) # Salt for PBKDF2
+    key = key or _derive_key_material(password, salt, key_data, dkLen=32, kdf_params=kdf_params) # AES key is 32 bytes for AES-256
     iv = get_random_bytes(BLOCK_SIZE_AES) # IV for CBC mode
     cipher = AES.new(key, AES.MODE_CBC, iv)
-    # PKCS7 padding equivalent
-    pad_len = BLOCK_SIZE_AES - len(data) % BLOCK_SIZE_AES
-    data += bytes([pad_len]) * pad_len
-    encrypted = cipher.encrypt(data)
-    return salt + iv + encrypted # Prepend salt and IV to the ciphertext
+    return _cbc_encrypt(cipher, data, salt, iv, BLOCK_SIZE_AES) # Salt and IV prepended to the ciphertext
 
-def decrypt_aes(data: bytes, password: str, key_data: bytes = None) -> bytes:
+def decrypt_aes(data: bytes, password: str, key_data: bytes = None, key: bytes = None,
+                kdf_params: dict = None) -> bytes:
     salt = data[:SALT_SIZE]
     iv = data[SALT_SIZE:SALT_SIZE + BLOCK_SIZE_AES]
     encrypted = data[SALT_SIZE + BLOCK_SIZE_AES:]
-    key = _derive_key_material(password, salt, key_data, dkLen=32)
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    decrypted = cipher.decrypt(encrypted)
+    derived = not key
+    key = key or _derive_key_material(password, salt, key_data, dkLen=32, kdf_params=kdf_params,
+                                      use_cache=True)
+    try:
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        decrypted = cipher.decrypt(encrypted)
+    finally:
+        if derived:
+            zeroize(key)
     # Unpad
     pad_len = decrypted[-1]
     # Check for valid padding length (important for integrity check)
@@ -61,26 +112,30 @@ def decrypt_aes(data: bytes, password: str, key_data: bytes = None) -> bytes:
     return decrypted[:-pad_len]
 
 # ------------------------- Blowfish --------------------------
-def encrypt_blowfish(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = get_random_bytes(SALT_SIZE)
+def encrypt_blowfish(data: bytes, password: str, key_data: bytes = None, salt: bytes = None, key: bytes = None,
+                     kdf_params: dict = None) -> bytes:
+    salt = salt or get_random_bytes(SALT_SIZE)
     # Blowfish key length can be variable (32-448 bits, i.e., 4-56 bytes)
     # Let's derive 56 bytes to provide maximum strength for Blowfish
-    key = _derive_key_material(password, salt, key_data, dkLen=56)
+    key = key or _derive_key_material(password, salt, key_data, dkLen=56, kdf_params=kdf_params)
     iv = get_random_bytes(BLOCK_SIZE_BLOWFISH)
     cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
-    # PKCS7 padding equivalent
-    pad_len = BLOCK_SIZE_BLOWFISH - len(data) % BLOCK_SIZE_BLOWFISH
-    data += bytes([pad_len]) * pad_len
-    encrypted = cipher.encrypt(data)
-    return salt + iv + encrypted
+    return _cbc_encrypt(cipher, data, salt, iv, BLOCK_SIZE_BLOWFISH)
 
-def decrypt_blowfish(data: bytes, password: str, key_data: bytes = None) -> bytes:
+def decrypt_blowfish(data: bytes, password: str, key_data: bytes = None, key: bytes = None,
+                     kdf_params: dict = None) -> bytes:
     salt = data[:SALT_SIZE]
     iv = data[SALT_SIZE:SALT_SIZE + BLOCK_SIZE_BLOWFISH]
     encrypted = data[SALT_SIZE + BLOCK_SIZE_BLOWFISH:]
-    key = _derive_key_material(password, salt, key_data, dkLen=56)
-    cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
-    decrypted = cipher.decrypt(encrypted)
+    derived = not key
+    key = key or _derive_key_material(password, salt, key_data, dkLen=56, kdf_params=kdf_params,
+                                      use_cache=True)
+    try:
+        cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
+        decrypted = cipher.decrypt(encrypted)
+    finally:
+        if derived:
+            zeroize(key)
     # Unpad
     pad_len = decrypted[-1]
     # Check for valid padding length
@@ -89,58 +144,116 @@ def decrypt_blowfish(data: bytes, password: str, key_data: bytes = None) -> byte
     return decrypted[:-pad_len]
 
 # -------------------------- Fernet ---------------------------
-def encrypt_fernet(data: bytes, password: str, key_data: bytes = None) -> bytes:
-    salt = get_random_bytes(SALT_SIZE)
+def encrypt_fernet(data: bytes, password: str, key_data: bytes = None, salt: bytes = None, key: bytes = None,
+                   kdf_params: dict = None) -> bytes:
+    salt = salt or get_random_bytes(SALT_SIZE)
     # Fernet key needs to be 32 URL-safe base64-encoded bytes
-    key_material = _derive_key_material(password, salt, key_data, dkLen=32)
+    key_material = key or _derive_key_material(password, salt, key_data, dkLen=32, kdf_params=kdf_params)
     fernet_key = base64.urlsafe_b64encode(key_material)
     f = Fernet(fernet_key)
-    encrypted = f.encrypt(data)
+    encrypted = f.encrypt(data if isinstance(data, bytes) else bytes(data)) # Fernet only accepts bytes
     return salt + encrypted # Prepend salt to the Fernet token
 
-def decrypt_fernet(data: bytes, password: str, key_data: bytes = None) -> bytes:
+def decrypt_fernet(data: bytes, password: str, key_data: bytes = None, key: bytes = None,
+                   kdf_params: dict = None) -> bytes:
     salt = data[:SALT_SIZE]
     encrypted = data[SALT_SIZE:]
-    key_material = _derive_key_material(password, salt, key_data, dkLen=32)
-    fernet_key = base64.urlsafe_b64encode(key_material)
+    derived = not key
+    key_material = key or _derive_key_material(password, salt, key_data, dkLen=32, kdf_params=kdf_params,
+                                               use_cache=True)
+    try:
+        fernet_key = base64.urlsafe_b64encode(key_material)
+    finally:
+        if derived:
+            zeroize(key_material)
     f = Fernet(fernet_key)
     return f.decrypt(encrypted) # Fernet handles its own integrity/padding internally
 
+# ----------------------- Key Check ---------------------------
+def compute_key_check(key: bytes) -> str:
+    """
+    Returns the hex key-check value for a derived key (HMAC-SHA256 of a fixed label, truncated).
+    """
+    return hmac.new(key, KEY_CHECK_LABEL, hashlib.sha256).digest()[:KEY_CHECK_SIZE].hex()
+
+def derive_file_key(password: str, salt: bytes, algorithm: str, key_data: bytes = None,
+                    kdf_params: dict = None, use_cache: bool = False) -> bytes:
+    """
+    Derives the cipher key for `algorithm` from the password, KDF salt and optional key_data.
+    """
+    if algorithm not in KEY_SIZES:
+        raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
+    return _derive_key_material(password, salt, key_data, dkLen=KEY_SIZES[algorithm], kdf_params=kdf_params,
+                                use_cache=use_cache)
+
+def verify_key_check(password: str, salt: bytes, algorithm: str, key_check: str, key_data: bytes = None,
+                     kdf_params: dict = None) -> bytes:
+    """
+    Derives the key and compares it against a stored key-check value.
+    Returns the derived key (a bytearray the caller zeroizes) so the caller can decrypt without a
+    second KDF run.
+    Raises ValueError if the password/key file does not match.
+    """
+    key = derive_file_key(password, salt, algorithm, key_data, kdf_params=kdf_params, use_cache=True)
+    if not hmac.compare_digest(compute_key_check(key), key_check):
+        zeroize(key)
+        raise ValueError("Incorrect password or key file.")
+    return key
+
 # ---------------------- Dispatcher ---------------------------
 # These functions are the main entry points for your UI
-def encrypt_file(data: bytes, algorithm: str, password: str, key_data: bytes = None) -> bytes:
+def encrypt_file(data: bytes, algorithm: str, password: str, key_data: bytes = None,
+                 salt: bytes = None, key: bytes = None, kdf_params: dict = None) -> bytes:
     """
     Encrypts data using the specified algorithm, password, and optional key_data.
     """
     if not password: # Ensure password is not empty for encryption
         raise ValueError("Password cannot be empty for encryption.")
 
-    if algorithm == "AES":
-        return encrypt_aes(data, password, key_data)
-    elif algorithm == "Fernet":
-        return encrypt_fernet(data, password, key_data)
-    elif algorithm == "Blowfish":
-        return encrypt_blowfish(data, password, key_data)
-    else:
-        raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
+    with span(f"encrypt.{algorithm.lower()}", len(data)):
+        if algorithm == "AES":
+            return encrypt_aes(data, password, key_data, salt=salt, key=key, kdf_params=kdf_params)
+        elif algorithm == "Fernet":
+            return encrypt_fernet(data, password, key_data, salt=salt, key=key, kdf_params=kdf_params)
+        elif algorithm == "Blowfish":
+            return encrypt_blowfish(data, password, key_data, salt=salt, key=key, kdf_params=kdf_params)
+        else:
+            raise ValueError(f"Unsupported encryption algorithm: {algorithm}")
 
-def decrypt_file(data: bytes, password: str, algorithm: str, key_data: bytes = None) -> bytes:
+def encrypt_file_with_key_check(data: bytes, algorithm: str, password: str, key_data: bytes = None,
+                                kdf_params: dict = None) -> tuple:
+    """
+    Same as encrypt_file, but also returns the key-check value of the derived key
+    so it can be stored in the payload header. Returns (ciphertext, key_check).
+    """
+    if not password:
+        raise ValueError("Password cannot be empty for encryption.")
+    salt = get_random_bytes(SALT_SIZE)
+    key = derive_file_key(password, salt, algorithm, key_data, kdf_params=kdf_params)
+    encrypted = encrypt_file(data, algorithm, password, key_data, salt=salt, key=key)
+    return encrypted, compute_key_check(key)
+
+def decrypt_file(data: bytes, password: str, algorithm: str, key_data: bytes = None, key: bytes = None,
+                 kdf_params: dict = None) -> bytes:
     """
     Decrypts data using the specified algorithm, password, and optional key_data.
+    If `key` is given (e.g. from verify_key_check), key derivation is skipped.
+    kdf_params must match the parameters used at encryption (stored in the payload header).
     Raises ValueError for decryption failures (wrong password/key, corruption).
     """
     if not password: # Ensure password is not empty for decryption
         raise ValueError("Password cannot be empty for decryption.")
 
     try:
-        if algorithm == "AES":
-            return decrypt_aes(data, password, key_data)
-        elif algorithm == "Fernet":
-            return decrypt_fernet(data, password, key_data)
-        elif algorithm == "Blowfish":
-            return decrypt_blowfish(data, password, key_data)
-        else:
-            raise ValueError(f"Unsupported decryption algorithm: {algorithm}")
+        with span(f"decrypt.{algorithm.lower()}", len(data)):
+            if algorithm == "AES":
+                return decrypt_aes(data, password, key_data, key=key, kdf_params=kdf_params)
+            elif algorithm == "Fernet":
+                return decrypt_fernet(data, password, key_data, key=key, kdf_params=kdf_params)
+            elif algorithm == "Blowfish":
+                return decrypt_blowfish(data, password, key_data, key=key, kdf_params=kdf_params)
+            else:
+                raise ValueError(f"Unsupported decryption algorithm: {algorithm}")
     except (ValueError, InvalidToken) as e:
         # Re-raise with a more generic message for UI, but preserve original for debugging
         raise ValueError(f"Decryption failed. Incorrect password/key or corrupted data. Original error: {e}")
@@ -148,32 +261,29 @@ def decrypt_file(data: bytes, password: str, algorithm: str, key_data: bytes = N
 # -------------------- Optional Masking ------------------------
 # This masking function is independent of encryption key derivation.
 # It acts as an additional obfuscation layer.
-def apply_masking(data: bytes) -> bytes:
+def apply_masking(data: bytes, seed: bytes = None) -> bytes:
     """
     Applies a simple XOR mask for obfuscation. This is symmetric; applying it twice
-    with the same mask reveals the original data. The mask is derived from the
-    first 32 bytes of the input data.
+    with the same mask reveals the original data. The mask is derived from `seed`, or
+    without one from the first 32 bytes of the input data, which the mask then scrambles:
+    such data cannot be unmasked afterwards. steg_engine seeds it with the KDF salt it
+    stores in the header.
     """
-    if len(data) < 32: # Ensure enough data to derive a mask
-        # If data is too short, pad it or use a simpler mask
-        # For simplicity, let's just use the whole data as seed if too short
-        mask_seed = data
-    else:
-        mask_seed = data[:32]
+    if seed is None:
+        # If data is too short, use the whole data as seed
+        seed = bytes(data[:32])
 
-    # Derive a repeatable mask from a segment of the data
-    # NOTE: This makes masking reversible. If you want truly random masking,
-    # the mask itself would need to be embedded or known via other means.
-    mask = hashlib.sha256(mask_seed).digest() # 32-byte mask
+    mask = np.frombuffer(hashlib.sha256(seed).digest(), dtype=np.uint8) # 32-byte mask
 
     # XOR each byte with the repeating mask
-    return bytes(b ^ mask[i % len(mask)] for i, b in enumerate(data))
+    view = np.frombuffer(data, dtype=np.uint8)
+    return np.bitwise_xor(view, np.resize(mask, view.size)).tobytes()
 
 # You might want an explicit de-masking function if the masking
 # isn't simply reversible by applying the same function.
 # For this current apply_masking, applying it again would reverse it:
-def apply_demasking(data: bytes) -> bytes:
+def apply_demasking(data: bytes, seed: bytes) -> bytes:
     """
-    Reverses the effect of apply_masking, assuming the same mask derivation.
+    Reverses the effect of apply_masking with the same seed.
     """
-    return apply_masking(data) # It's its own inverse in this case
\ No newline at end of file
+    return apply_masking(data, seed) # It's its own inverse in this case
@@ -1,13 +1,43 @@
 import os
-import json
 
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QFileDialog, QLineEdit, QTextEdit,
     QVBoxLayout, QHBoxLayout, QGridLayout, QMessageBox, QSpacerItem, QSizePolicy
 )
 from PyQt5.QtGui import QFont, QPixmap, QIcon
-from PyQt5.QtCore import Qt
-from core.steg_engine import extract_payload  # Ensure this import is correct
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+from core.steg_engine import extract_payload, analyze_file  # Ensure this import is correct
+from core.progress import CancelToken
+from ui.embed_progress_popup import EmbedProgressPopup
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+
+class JobRunnable(QRunnable):
+    """
+    Runs fn(*args, **kwargs) on a QThreadPool thread and reports back through signals,
+    which Qt delivers on the GUI thread. with_progress=True passes progress_callback to fn.
+    """
+    def __init__(self, fn, *args, with_progress=False, **kwargs):
+        super().__init__()
+        self.signals = JobSignals()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        if with_progress:
+            self.kwargs["progress_callback"] = self.signals.progress.emit
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        self.signals.result.emit(result)
 
 
 class ExtractWidget(QWidget):
@@ -16,6 +46,10 @@ class ExtractWidget(QWidget):
         self.init_ui()
         self.analysis_metadata = {}
         self.key_data_from_file = None  # <<< NEW: To store key file content as bytes
+        self.thread_pool = QThreadPool.globalInstance()
+        self.active_job = None  # Keeps the running JobRunnable (and its signals) alive
+        self.progress_popup = None
+        self.extract_request = (None, None)  # (password, key_data) of the running extraction
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -232,58 +266,86 @@ class ExtractWidget(QWidget):
         self.analysis_metadata = {}
         self.key_data_from_file = None  # <<< Reset the stored key data
 
+    def set_busy(self, busy):
+        self.analyze_btn.setEnabled(not busy)
+        self.extract_btn.setEnabled(not busy)
+        self.reset_btn.setEnabled(not busy)
+
+    def start_job(self, job, on_result):
+        self.active_job = job
+        job.signals.result.connect(on_result)
+        job.signals.error.connect(self.on_job_error)
+        self.set_busy(True)
+        self.thread_pool.start(job)
+
+    def finish_job(self):
+        self.active_job = None
+        self.set_busy(False)
+        if self.progress_popup is not None:
+            self.progress_popup.close()
+            self.progress_popup = None
+
+    def on_job_error(self, message):
+        self.finish_job()
+        self.status_box.setText(f"Error: {message}")
+
     def handle_analyze(self):
         self.status_box.clear()
         carrier_path = self.carrier_display.text().strip()
         if not carrier_path or not os.path.exists(carrier_path):
             self.status_box.setText("Please select a valid carrier file.")
             return
-        try:
-            # --- MODIFIED: Removed REAL_TAG check ---
-            with open(carrier_path, "rb") as f:
-                data_to_analyze = f.read() # Read the entire file as the data to analyze directly
-
-            marker_index = data_to_analyze.find(b"RYGELHDR\0")
-            if marker_index == -1:
+        # Header parsing (and, for LSB carriers, the cost map) runs on the thread pool; the result
+        # is cached for a following Extract
+        cancel_token = CancelToken()
+        self.progress_popup = EmbedProgressPopup(cancel_token, title="Analysis In Progress",
+                                                 message="Please wait while the file is analyzed...")
+        self.progress_popup.show()
+        job = JobRunnable(analyze_file, carrier_path, cancel_token=cancel_token, with_progress=True)
+        job.signals.progress.connect(self.progress_popup.update_progress)
+        self.status_box.setText("Analyzing...")
+        self.start_job(job, self.on_analyze_result)
+
+    def on_analyze_result(self, result):
+        self.finish_job()
+        if result["status"] == "cancelled":
+            self.status_box.setText("Analysis cancelled.")
+            return
+        if result["status"] != "success":
+            message = result.get("message", "")
+            if message == "Metadata not found in file.":
                 self.status_box.setText("This file is not a valid Rygelock stego file (metadata not found).")
-                return
-
-            meta_start = marker_index + len(b"RYGELHDR\0")
-            meta_end = data_to_analyze.find(b"\0", meta_start)
-
-            if meta_end == -1:
+            elif message == "Malformed metadata block.":
                 self.status_box.setText("Malformed metadata block in stego file.")
-                return
-
-            meta_raw = data_to_analyze[meta_start:meta_end]
-            metadata = json.loads(meta_raw.decode("utf-8"))
-            self.analysis_metadata = metadata
-
-            # Provide more useful analysis info to the user
-            status_message = "File analysis complete.\n"
-            status_message += f"Embedded Type: {metadata.get('type', 'Unknown')}\n"
-            if metadata.get('encryption') and metadata['encryption'] != "None":
-                status_message += f"Encryption: {metadata['encryption']} (Password Required)\n"
+            elif message == "Metadata corrupted.":
+                self.status_box.setText("Analyze error: Metadata is corrupted or not valid JSON.")
             else:
-                status_message += "Encryption: None\n"
+                self.status_box.setText(f"Analyze error: {message}")
+            return
 
-            if metadata.get('generate_key_used', False):
-                status_message += "Key File: REQUIRED for extraction.\n"
-            else:
-                status_message += "Key File: Not required for extraction.\n"
+        metadata = result["metadata"]
+        self.analysis_metadata = metadata
 
-            if metadata.get('whitened', False):
-                status_message += "Data Whitening: Applied (will be de-whitened).\n"
-            # --- REMOVED: Matryoshka Layers display ---
-            # if metadata.get('matryoshka_layers', 1) > 1:
-            #     status_message += f"Matryoshka Layers: {metadata['matryoshka_layers']}\n"
+        # Provide more useful analysis info to the user
+        status_message = "File analysis complete.\n"
+        status_message += f"Embedded Type: {metadata.get('type', 'Unknown')}\n"
+        if metadata.get('encryption') and metadata['encryption'] != "None":
+            status_message += f"Encryption: {metadata['encryption']} (Password Required)\n"
+        else:
+            status_message += "Encryption: None\n"
 
-            self.status_box.setText(status_message + "Ready to extract.")
+        if metadata.get('generate_key_used', False):
+            status_message += "Key File: REQUIRED for extraction.\n"
+        else:
+            status_message += "Key File: Not required for extraction.\n"
 
-        except json.JSONDecodeError:
-            self.status_box.setText("Analyze error: Metadata is corrupted or not valid JSON.")
-        except Exception as e:
-            self.status_box.setText(f"Analyze error: {str(e)}")
+        if metadata.get('whitened', False):
+            status_message += "Data Whitening: Applied (will be de-whitened).\n"
+        # --- REMOVED: Matryoshka Layers display ---
+        # if metadata.get('matryoshka_layers', 1) > 1:
+        #     status_message += f"Matryoshka Layers: {metadata['matryoshka_layers']}\n"
+
+        self.status_box.setText(status_message + "Ready to extract.")
 
     def handle_extract(self):
         path = self.carrier_display.text().strip()
@@ -295,12 +357,28 @@ class ExtractWidget(QWidget):
 
         # We now pass the key_data_from_file (which is already bytes or None)
         key_data = self.key_data_from_file
+        self.extract_request = (password, key_data)
+
+        cancel_token = CancelToken()
+        self.progress_popup = EmbedProgressPopup(cancel_token, title="Extraction In Progress",
+                                                 message="Please wait while extraction is in progress...")
+        self.progress_popup.show()
+
+        # KDF, decryption and the output write run on the thread pool so the window stays responsive
+        job = JobRunnable(extract_payload, path, password=password, key_data=key_data,
+                          cancel_token=cancel_token, with_progress=True)
+        job.signals.progress.connect(self.progress_popup.update_progress)
+        self.status_box.setText("Extracting...")
+        self.start_job(job, self.on_extract_result)
 
-        # Call the extract_payload from core.steg_engine
-        result = extract_payload(path, password=password, key_data=key_data)
+    def on_extract_result(self, result):
+        self.finish_job()
+        password, key_data = self.extract_request
 
         if result["status"] == "success":
             self.status_box.setText("Extraction complete.\nSaved: " + result["output_file"])
+        elif result["status"] == "cancelled":
+            self.status_box.setText("Extraction cancelled.")
         else:
             # Display a more user-friendly message, potentially linking to analysis
             error_message = result.get("message", "Unknown error during extraction.")
@@ -311,4 +389,4 @@ class ExtractWidget(QWidget):
                 'encryption'] != "None" and not password:
                 error_message += "\nHint: This payload is encrypted and requires a password."
 
-            self.status_box.setText(f"Extraction failed.\nReason: {error_message}")
\ No newline at end of file
+            self.status_box.setText(f"Extraction failed.\nReason: {error_message}")
@@ -1,6 +1,7 @@
 # utils/file_validator.py — Validate carrier/payload file formats for Rygelock
 
 import os
+import numpy as np
 
 SUPPORTED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".webp"}
 SUPPORTED_AUDIO_EXTENSIONS = {".wav", ".flac", ".aiff", ".aif", ".ogg"}
@@ -38,10 +39,19 @@ def get_file_type(filepath):
         return "misc"
     return "unknown"
 
+WHITENING_KEY = 0xA5  # XOR mask
+_WHITENING_TABLE = bytes(b ^ WHITENING_KEY for b in range(256))
+
 def apply_data_whitening(data: bytes) -> bytes:
-    key = 0xA5  # XOR mask
-    return bytes(b ^ key for b in data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return data.translate(_WHITENING_TABLE)
 
 def apply_data_dewhitening(data: bytes) -> bytes:
-    key = 0xA5  # Same XOR mask
-    return bytes(b ^ key for b in data)
\ No newline at end of file
+    return apply_data_whitening(data)  # XOR with the same mask is its own inverse
+
+def apply_data_whitening_inplace(buf: bytearray) -> bytearray:
+    """Whitens a writable buffer in place (no copy); returns the same buffer."""
+    view = np.frombuffer(buf, dtype=np.uint8)
+    np.bitwise_xor(view, WHITENING_KEY, out=view)
+    return buf
\ No newline at end of file
@@ -0,0 +1,112 @@
+# core/filter_bank.py — Daubechies-8 directional filter bank, convolved at full resolution with cached FFT spectra
+
+import functools
+import numpy as np
+import pywt
+from scipy import fft
+
+FILTER_SIZE = 16
+PADDING = FILTER_SIZE  # Two chained 'same' convolutions each reach 8 pixels out; the padding covers both
+
+
+def filter_factors() -> list:
+    """(column, row) 1-D db8 filters whose outer products are the LH, HL and HH detail filters."""
+    wavelet = pywt.Wavelet("db8")
+    lo, hi = np.array(wavelet.dec_lo), np.array(wavelet.dec_hi)
+    return [(lo, hi), (hi, lo), (hi, hi)]
+
+
+def directional_filters() -> np.ndarray:
+    """The three 16x16 db8 detail filters (LH, HL, HH) used by S-UNIWARD and WOW, as a (3, 16, 16) array."""
+    return np.stack([np.outer(column, row) for column, row in filter_factors()])
+
+
+FACTORS = filter_factors()
+FILTERS = directional_filters()
+
+
+@functools.lru_cache(maxsize=16)  # Tiles of one image share a handful of shapes
+def filter_spectra(rows: int, cols: int) -> tuple:
+    """
+    Spectra of the filters and of their 180-degree-rotated magnitudes at an FFT size that fits a
+    linear convolution of a rows x cols (padded) image. Returns (FFT shape, filters, |rotated|).
+    Each filter is separable, so its rfft2 spectrum is the outer product of its factors' spectra;
+    only those are kept, as (column (n_rows, 1, 1), row (n_cols // 2 + 1, 1)) complex64 pairs that
+    broadcast over color channels. A cached shape costs kilobytes instead of six full-size spectra.
+    """
+    shape = (fft.next_fast_len(rows + FILTER_SIZE - 1, real=True), fft.next_fast_len(cols + FILTER_SIZE - 1, real=True))
+
+    def spectra(column, row):
+        return (fft.fft(column, n=shape[0]).astype(np.complex64)[:, None, None],
+                fft.rfft(row, n=shape[1]).astype(np.complex64)[:, None])
+
+    forward = [spectra(column, row) for column, row in FACTORS]
+    rotated = [spectra(np.abs(column[::-1]), np.abs(row[::-1])) for column, row in FACTORS]
+    return shape, forward, rotated
+
+
+def _times(spectrum, factors, out=None) -> np.ndarray:
+    # spectrum times one filter's 2-D spectrum, as a broadcast multiply along each axis
+    column, row = factors
+    out = np.multiply(spectrum, column, out=out)
+    out *= row
+    return out
+
+
+def _same(spectrum, shape, rows, cols) -> np.ndarray:
+    # Inverse of a product of spectra, cropped to the 'same'-size part of the linear convolution
+    full = fft.irfft2(spectrum, s=shape, axes=(-3, -2))
+    start = (FILTER_SIZE - 1) // 2
+    return full[..., start:start + rows, start:start + cols, :]
+
+
+def pad_symmetric(pixels: np.ndarray) -> np.ndarray:
+    """float32 copy of (..., H, W, C) pixels mirrored by PADDING on both spatial axes."""
+    pad = ((0, 0),) * (pixels.ndim - 3) + ((PADDING, PADDING), (PADDING, PADDING), (0, 0))
+    return np.pad(pixels.astype(np.float32), pad, mode="symmetric")
+
+
+def residuals(padded: np.ndarray):
+    """
+    Directional residuals of a pad_symmetric image, one 'same'-size (..., H', W', C) array per filter,
+    all from a single forward FFT. Yielded one at a time, so a caller that reduces them as they come
+    never holds all three; each is a fresh array the caller may overwrite.
+    """
+    rows, cols = padded.shape[-3:-1]
+    shape, forward, _ = filter_spectra(rows, cols)
+    image = fft.rfft2(padded, s=shape, axes=(-3, -2))
+    for k in range(len(FILTERS)):
+        yield _same(_times(image, forward[k]), shape, rows, cols)
+
+
+def spread(maps) -> np.ndarray:
+    """
+    Σ_k maps[k] convolved with |filter k| rotated by 180 degrees: how much changing each pixel
+    disturbs every residual it feeds. The products are summed in the frequency domain as the maps
+    arrive (any iterable, in filter order) and inverted with one FFT.
+    """
+    total = None
+    for k, m in enumerate(maps):
+        rows, cols = m.shape[-3:-1]
+        shape, _, rotated = filter_spectra(rows, cols)
+        product = fft.rfft2(m, s=shape, axes=(-3, -2))
+        _times(product, rotated[k], out=product)
+        if total is None:
+            total = product
+        else:
+            total += product
+    return _same(total, shape, rows, cols)
+
+
+def spread_each(maps):
+    """Like spread(), but yields one convolved map per direction instead of their sum."""
+    for k, m in enumerate(maps):
+        rows, cols = m.shape[-3:-1]
+        shape, _, rotated = filter_spectra(rows, cols)
+        product = fft.rfft2(m, s=shape, axes=(-3, -2))
+        _times(product, rotated[k], out=product)
+        yield _same(product, shape, rows, cols)
+
+
+def crop(padded: np.ndarray) -> np.ndarray:
+    return padded[..., PADDING:-PADDING, PADDING:-PADDING, :]
@@ -0,0 +1,421 @@
+# core/jpeg_coeffs.py — Quantized DCT coefficients of baseline JPEGs, read and rewritten without decoding pixels
+
+import os
+import functools
+import numpy as np
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+# Huffman-coded sequential DCT frames (8-bit); progressive and arithmetic-coded files are not parsed
+BASELINE_SOF = (0xC0, 0xC1)
+UNSUPPORTED_SOF = (0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+SOS, DHT, DQT, DRI, EOI = 0xDA, 0xC4, 0xDB, 0xDD, 0xD9
+LOOKUP_BITS = 16  # Huffman codes are at most 16 bits, so one table lookup decodes any symbol
+GROUP_SYMBOLS = 8  # Most AC symbols decoded by one grouped lookup
+STREAM_PADDING = b"\xff" * 4  # Fill bits past the end of the scan, so window reads never run out
+
+# Natural (row-major) index of each zigzag position
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+])
+
+
+class JpegCoefficients:
+    """
+    The entropy-coded scan of a baseline JPEG, decoded down to one record per nonzero coefficient:
+    its component, block, zigzag index, value, and the bit position in the (unstuffed) scan where
+    its magnitude bits end. Changing a coefficient's LSB within its size category (|c| >= 2) only
+    flips that bit, so the scan can be rewritten with the original Huffman tables in place.
+    """
+
+    def __init__(self, data, scan_start, scan_end, stream, interval_starts, rst_markers, components,
+                 quant_tables, blocks, dc, ac):
+        self.data = data                        # Original file bytes
+        self.scan_start = scan_start            # Offset of the entropy-coded data
+        self.scan_end = scan_end                # Offset of the marker that ends the scan
+        self.stream = stream                    # Unstuffed scan bytes, restart intervals concatenated
+        self.interval_starts = interval_starts  # Byte offset of each restart interval in stream
+        self.rst_markers = rst_markers          # The RSTn markers between intervals, as found
+        self.components = components            # Per component: id, h, v, quant table id, block rows/cols
+        self.quant_tables = quant_tables        # Table id -> 64 quantizer steps, zigzag order
+        self.blocks = blocks                    # Per block in scan order: (component, row, col) arrays
+        self.dc = dc                            # Per block: DC difference value
+        self.ac = ac                            # Per nonzero AC coefficient: block, k, value, end_bit
+
+    @property
+    def shape(self) -> tuple:
+        return self.components[0]["rows"], self.components[0]["cols"]
+
+    def coefficients(self) -> list:
+        """Per component, a (block rows, block cols, 64) int16 array of quantized coefficients in zigzag order."""
+        block_comp, block_row, block_col = self.blocks
+        dc = self._dc_values()
+        arrays = []
+        for c, comp in enumerate(self.components):
+            coeffs = np.zeros((comp["rows"], comp["cols"], 64), dtype=np.int16)
+            mine = block_comp == c
+            coeffs[block_row[mine], block_col[mine], 0] = dc[mine]
+            ac_mine = mine[self.ac["block"]]
+            blocks = self.ac["block"][ac_mine]
+            coeffs[block_row[blocks], block_col[blocks], self.ac["k"][ac_mine]] = self.ac["value"][ac_mine]
+            arrays.append(coeffs)
+        return arrays
+
+    def _dc_values(self) -> np.ndarray:
+        # DC is coded as the difference to the previous block of the same component; the predictor
+        # resets to 0 at every restart marker
+        block_comp = self.blocks[0]
+        values = np.zeros(block_comp.size, dtype=np.int64)
+        for c in range(len(self.components)):
+            idx = np.flatnonzero(block_comp == c)
+            sums = np.cumsum(self.dc["value"][idx])
+            interval = self.dc["interval"][idx]
+            first = np.flatnonzero(np.r_[True, interval[1:] != interval[:-1]])
+            base = np.r_[0, sums][first]  # Running sum before each interval's first block
+            values[idx] = sums - np.repeat(base, np.diff(np.r_[first, idx.size]))
+        return values
+
+    def write(self, output_path, flip_bits: np.ndarray):
+        """Writes the JPEG with the given scan bits (positions in `stream`) inverted."""
+        stream = self.stream.copy()
+        flip_bits = np.asarray(flip_bits, dtype=np.int64)
+        np.bitwise_xor.at(stream, flip_bits >> 3, (0x80 >> (flip_bits & 7)).astype(np.uint8))
+        bounds = list(self.interval_starts) + [stream.size]
+        with open(output_path, "wb") as f:
+            f.write(self.data[:self.scan_start])
+            for i in range(len(bounds) - 1):
+                if i:
+                    f.write(self.rst_markers[i - 1])
+                f.write(_stuff(stream[bounds[i]:bounds[i + 1]]).tobytes())
+            f.write(self.data[self.scan_end:])
+
+
+# --- Marker parsing ---
+def _u16(data, offset) -> int:
+    return (data[offset] << 8) | data[offset + 1]
+
+
+def _parse_dqt(segment, tables):
+    i = 0
+    while i < len(segment):
+        precision, table_id = segment[i] >> 4, segment[i] & 15
+        size = 128 if precision else 64
+        dtype = ">u2" if precision else np.uint8
+        tables[table_id] = np.frombuffer(segment[i + 1:i + 1 + size], dtype=dtype).astype(np.int64)
+        i += 1 + size
+
+
+def _parse_dht(segment, tables):
+    i = 0
+    while i < len(segment):
+        table_class, table_id = segment[i] >> 4, segment[i] & 15
+        counts = segment[i + 1:i + 17]
+        tables[(table_class, table_id)] = (counts, segment[i + 17:i + 17 + sum(counts)])
+        i += 17 + sum(counts)
+
+
+@functools.lru_cache(maxsize=16)  # Most encoders use the same few tables, so they are built once
+def _huffman_lookup(counts: bytes, symbols: bytes) -> np.ndarray:
+    """
+    A 2**16-entry table indexed by the next 16 scan bits. Each entry packs the total bits the symbol
+    consumes (code length plus the magnitude bits that follow it) << 8 | the symbol; 0 marks an
+    invalid code. Decoding a symbol is one lookup, and the magnitude bits are skipped, not read.
+    """
+    table = np.zeros(1 << LOOKUP_BITS, dtype=np.int64)
+    code, s = 0, 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            symbol = symbols[s]
+            span = 1 << (LOOKUP_BITS - length)
+            table[code * span:(code + 1) * span] = ((length + (symbol & 15)) << 8) | symbol
+            code += 1
+            s += 1
+        code <<= 1
+    return table
+
+
+@functools.lru_cache(maxsize=16)
+def _group_table(counts: bytes, symbols: bytes) -> dict:
+    """
+    AC lookup that decodes every symbol fitting in the 16 bits looked up (always at least one), so the
+    scan loop runs once per group instead of once per symbol. "lookup" entries pack the bits consumed
+    | k advance << 5 | ends-with-EOB << 12. For the grouped ([0]) and single-symbol ([1]) lookups,
+    "count" is the number of nonzero coefficients decoded, and "ends", "ks" and "sizes" give each
+    one's end bit, k offset and magnitude size relative to the start of the group.
+    """
+    single = _huffman_lookup(counts, symbols)
+    look = np.arange(1 << LOOKUP_BITS, dtype=np.int64)
+    consumed = np.zeros(look.size, dtype=np.int64)
+    advance = np.zeros(look.size, dtype=np.int64)
+    done = np.zeros(look.size, dtype=bool)
+    eob = np.zeros(look.size, dtype=bool)
+    count = np.zeros((2, look.size), dtype=np.int64)
+    ends = np.zeros((2, look.size, GROUP_SYMBOLS), dtype=np.int16)
+    ks = np.zeros((2, look.size, GROUP_SYMBOLS), dtype=np.int16)
+    sizes = np.zeros((2, look.size, GROUP_SYMBOLS), dtype=np.int16)
+    for j in range(GROUP_SYMBOLS):
+        e = single[(look << consumed) & 0xFFFF]  # Zero-filled past the window; rejected below unless it fits
+        total, rs = e >> 8, e & 255
+        take = ~done & (e != 0) & ((consumed + total <= LOOKUP_BITS) | (j == 0))
+        is_eob = take & (rs == 0)
+        consumed += np.where(take, total, 0)
+        nonzero = np.flatnonzero(take & (rs & 15 > 0))  # ZRL and EOB carry no coefficient
+        slot = count[0, nonzero]
+        ends[0, nonzero, slot] = consumed[nonzero]
+        ks[0, nonzero, slot] = advance[nonzero] + (rs[nonzero] >> 4)
+        sizes[0, nonzero, slot] = rs[nonzero] & 15
+        count[0, nonzero] += 1
+        advance += np.where(take & ~is_eob, (rs >> 4) + 1, 0)
+        eob |= is_eob
+        done |= ~take | is_eob
+    lookup = np.where(consumed > 0, consumed | (np.minimum(advance, 127) << 5) | (eob << 12), 0)
+    count[1] = (single & 15) > 0
+    ends[1, :, 0] = single >> 8
+    ks[1, :, 0] = (single >> 4) & 15
+    sizes[1, :, 0] = single & 15
+    return {"lookup": lookup.tolist(), "single": single.tolist(), "count": count,
+            "ends": ends.reshape(-1), "ks": ks.reshape(-1), "sizes": sizes.reshape(-1)}
+
+
+def _find_scan_end(arr: np.ndarray, start: int) -> int:
+    """Offset of the first marker after `start` that is neither a stuffed 0xFF00 nor an RSTn."""
+    ff = start + np.flatnonzero(arr[start:-1] == 0xFF)
+    following = arr[ff + 1]
+    markers = ff[(following != 0) & ((following < 0xD0) | (following > 0xD7))]
+    if markers.size == 0:
+        raise ValueError("JPEG scan is not terminated by a marker.")
+    return int(markers[0])
+
+
+def _unstuff(scan: np.ndarray):
+    """Removes stuffed zero bytes and splits at RSTn markers: (stream, interval starts, markers)."""
+    ff = np.flatnonzero(scan[:-1] == 0xFF)
+    following = scan[ff + 1]
+    rst = ff[(following >= 0xD0) & (following <= 0xD7)]
+    keep = np.ones(scan.size, dtype=bool)
+    keep[ff[following == 0] + 1] = False
+    keep[rst] = False
+    keep[rst + 1] = False
+    kept_before = np.cumsum(keep) - keep
+    starts = [0] + kept_before[rst + 2].tolist() if rst.size else [0]
+    markers = [scan[r:r + 2].tobytes() for r in rst]
+    return scan[keep], starts, markers
+
+
+def _stuff(stream: np.ndarray) -> np.ndarray:
+    return np.insert(stream, np.flatnonzero(stream == 0xFF) + 1, 0)
+
+
+# --- Entropy decoding ---
+def _decode_scan(win, interval_bits, mcus: int, restart: int, mcu_blocks: list):
+    """
+    Walks the Huffman-coded scan; this is the only sequential part. DC symbols are decoded one at a
+    time and recorded as end bit << 4 | size. AC symbols are decoded a group per lookup and recorded
+    as start bit << 23 | single-symbol flag << 22 | k << 16 | the 16 bits looked up; coefficient
+    positions, sizes and values are expanded from those records afterwards with NumPy.
+    """
+    dcs, acs = [], []
+    dc_append, ac_append = dcs.append, acs.append
+    p = interval_bits[0]
+    interval = 0
+    for m in range(mcus):
+        if restart and m and m % restart == 0:
+            interval += 1
+            p = interval_bits[interval]  # Byte-aligned start after the RSTn marker
+        for dc_table, ac_groups, ac_single in mcu_blocks:
+            e = dc_table[(win[p >> 3] >> (8 - (p & 7))) & 0xFFFF]
+            if not e:
+                raise ValueError("Invalid DC Huffman code in JPEG scan.")
+            p += e >> 8
+            dc_append(p << 4 | (e & 15))
+            k = 1
+            while True:
+                look = (win[p >> 3] >> (8 - (p & 7))) & 0xFFFF
+                e = ac_groups[look]
+                if not e:
+                    raise ValueError("Invalid AC Huffman code in JPEG scan.")
+                ac_append(p << 23 | k << 16 | look)
+                p += e & 31
+                k += (e >> 5) & 127
+                if k >= 64 or e & 4096:
+                    break
+            if k > 64 or (k == 64 and e & 4096):
+                # The block ended at its 63rd coefficient inside the group (no EOB is coded there), so
+                # the group read into the next block: redo it one symbol at a time
+                last = acs.pop()
+                p, k = last >> 23, (last >> 16) & 63
+                while k < 64:
+                    look = (win[p >> 3] >> (8 - (p & 7))) & 0xFFFF
+                    e = ac_single[look]
+                    if not e:
+                        raise ValueError("Invalid AC Huffman code in JPEG scan.")
+                    ac_append(p << 23 | 1 << 22 | k << 16 | look)
+                    p += e >> 8
+                    if not e & 255:
+                        break
+                    k += ((e >> 4) & 15) + 1
+                if k > 64:
+                    raise ValueError("JPEG block has more than 64 coefficients.")
+    return np.array(dcs, dtype=np.int64), np.array(acs, dtype=np.int64)
+
+
+def _expand_groups(records: np.ndarray, table_of_record: np.ndarray, groups: list):
+    """Per nonzero AC coefficient in the records: record index, end bit, k and magnitude size."""
+    start, single = records >> 23, (records >> 22) & 1
+    k0, look = (records >> 16) & 63, records & 0xFFFF
+    entry = (table_of_record * 2 + single) * (1 << LOOKUP_BITS) + look
+    counts = np.concatenate([g["count"].reshape(-1) for g in groups])[entry]
+    rec = np.repeat(np.arange(records.size), counts)
+    slot = np.arange(rec.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    flat = entry[rec] * GROUP_SYMBOLS + slot
+    ends = np.concatenate([g["ends"] for g in groups])[flat]
+    ks = np.concatenate([g["ks"] for g in groups])[flat]
+    sizes = np.concatenate([g["sizes"] for g in groups])[flat]
+    return rec, start[rec] + ends, k0[rec] + ks, sizes.astype(np.int64)
+
+
+def _magnitudes(windows: np.ndarray, end_bits: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Signed values of the `sizes`-bit magnitude fields ending at `end_bits` (JPEG's EXTEND)."""
+    start = end_bits - sizes
+    raw = (windows[start >> 3] >> (24 - (start & 7) - sizes)) & ((1 << sizes) - 1)
+    half = (1 << sizes) >> 1
+    return np.where(raw < half, raw - (1 << sizes) + 1, raw) * (sizes > 0)
+
+
+def _block_layout(components, scan_components, mcux, mcuy):
+    """Component/row/col of every block in scan order, and the blocks of one MCU."""
+    if len(scan_components) == 1:  # Non-interleaved: one block per MCU, raster order
+        c = scan_components[0]
+        rows, cols = np.divmod(np.arange(components[c]["rows"] * components[c]["cols"]), components[c]["cols"])
+        return [c], (np.full(rows.size, c), rows, cols)
+    order, dr, dc = [], [], []
+    for c in scan_components:
+        for v in range(components[c]["v"]):
+            for h in range(components[c]["h"]):
+                order.append(c)
+                dr.append(v)
+                dc.append(h)
+    order, dr, dc = np.array(order), np.array(dr), np.array(dc)
+    mcu_row, mcu_col = np.divmod(np.arange(mcux * mcuy), mcux)
+    v = np.array([components[c]["v"] for c in order])
+    h = np.array([components[c]["h"] for c in order])
+    rows = (mcu_row[:, None] * v + dr).ravel()
+    cols = (mcu_col[:, None] * h + dc).ravel()
+    return order.tolist(), (np.tile(order, mcux * mcuy), rows, cols)
+
+
+def read_jpeg(path):
+    """
+    Parses a baseline (sequential, Huffman-coded, single-scan, 8-bit) JPEG into JpegCoefficients.
+    Returns None for files this module does not handle (progressive, arithmetic-coded, multi-scan),
+    and raises ValueError for corrupt scans. The last file parsed is kept, since a capacity check
+    and the embedding that follows it read the same carrier.
+    """
+    st = os.stat(path)
+    return _read_jpeg(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=1)
+def _read_jpeg(path, mtime_ns, size):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:2] != b"\xff\xd8":
+        return None
+    quant, huffman, frame, restart = {}, {}, None, 0
+    i = 2
+    while True:
+        while i < len(data) and data[i] == 0xFF and i + 1 < len(data) and data[i + 1] == 0xFF:
+            i += 1  # Fill bytes
+        if i + 4 > len(data) or data[i] != 0xFF:
+            return None
+        marker, length = data[i + 1], _u16(data, i + 2)
+        segment = data[i + 4:i + 2 + length]
+        if marker in UNSUPPORTED_SOF:
+            return None
+        if marker in BASELINE_SOF:
+            if segment[0] != 8:
+                return None
+            frame = {"height": _u16(segment, 1), "width": _u16(segment, 3),
+                     "components": [{"id": segment[6 + 3 * c], "h": segment[7 + 3 * c] >> 4,
+                                     "v": segment[7 + 3 * c] & 15, "tq": segment[8 + 3 * c]}
+                                    for c in range(segment[5])]}
+        elif marker == DQT:
+            _parse_dqt(segment, quant)
+        elif marker == DHT:
+            _parse_dht(segment, huffman)
+        elif marker == DRI:
+            restart = _u16(segment, 0)
+        elif marker == SOS:
+            break
+        elif marker == EOI:
+            return None
+        i += 2 + length
+    if frame is None or frame["height"] == 0:
+        return None  # Height defined by a DNL marker
+    components = frame["components"]
+    ids = [comp["id"] for comp in components]
+    scan = [(segment[1 + 2 * j], segment[2 + 2 * j]) for j in range(segment[0])]
+    spectral = segment[1 + 2 * len(scan):4 + 2 * len(scan)]
+    if spectral[0] != 0 or spectral[1] != 63 or spectral[2] != 0 or len(scan) != len(components):
+        return None  # Only a single scan covering every component in full
+
+    hmax = max(comp["h"] for comp in components)
+    vmax = max(comp["v"] for comp in components)
+    mcux = -(-frame["width"] // (8 * hmax))
+    mcuy = -(-frame["height"] // (8 * vmax))
+    for comp in components:
+        if len(components) == 1:
+            comp["rows"] = -(-(-(-frame["height"] * comp["v"] // vmax)) // 8)
+            comp["cols"] = -(-(-(-frame["width"] * comp["h"] // hmax)) // 8)
+        else:
+            comp["rows"], comp["cols"] = mcuy * comp["v"], mcux * comp["h"]
+    scan_components = [ids.index(comp_id) for comp_id, _ in scan]
+    if any(comp["tq"] not in quant for comp in components):
+        return None
+    tables, ac_ids = {}, []
+    for c, (_, selectors) in zip(scan_components, scan):
+        if (0, selectors >> 4) not in huffman or (1, selectors & 15) not in huffman:
+            return None
+        if selectors & 15 not in ac_ids:
+            ac_ids.append(selectors & 15)
+        tables[c] = (_huffman_lookup(*huffman[(0, selectors >> 4)]).tolist(), ac_ids.index(selectors & 15))
+    groups = [_group_table(*huffman[(1, t)]) for t in ac_ids]
+
+    arr = np.frombuffer(data, dtype=np.uint8)
+    scan_start = i + 2 + length
+    scan_end = _find_scan_end(arr, scan_start)
+    j = scan_end
+    while j + 1 < len(data) and data[j + 1] == 0xFF:
+        j += 1
+    if data[j + 1] != EOI:
+        return None  # Further scans follow
+    stream, interval_starts, rst_markers = _unstuff(arr[scan_start:scan_end])
+
+    mcu_order, blocks = _block_layout(components, scan_components, mcux, mcuy)
+    mcus = blocks[0].size // len(mcu_order)
+    if restart and len(interval_starts) != -(-mcus // restart):
+        raise ValueError("JPEG restart markers do not match the restart interval.")
+    padded = np.concatenate([stream, np.frombuffer(STREAM_PADDING, dtype=np.uint8)])
+    windows = (padded[:-2].astype(np.uint32) << 16) | (padded[1:-1].astype(np.uint32) << 8) | padded[2:]
+    interval_bits = [8 * s for s in interval_starts]
+    mcu_blocks = [(tables[c][0], groups[tables[c][1]]["lookup"], groups[tables[c][1]]["single"]) for c in mcu_order]
+    dc_packed, ac_packed = _decode_scan(memoryview(windows), interval_bits, mcus, restart, mcu_blocks)
+    if dc_packed.size and dc_packed[-1] >> 4 > 8 * stream.size:
+        raise ValueError("JPEG scan ended before the last block.")
+
+    windows = windows.astype(np.int64)
+    dc_end, dc_size = dc_packed >> 4, dc_packed & 15
+    record_block = np.searchsorted(dc_end, ac_packed >> 23, side="right") - 1
+    ac_table = np.array([tables[c][1] for c in range(len(components))])[blocks[0][record_block]]
+    rec, ac_end, ac_k, ac_size = _expand_groups(ac_packed, ac_table, groups)
+    interval_of_block = np.repeat(np.arange(len(interval_starts)),
+                                  np.diff(np.r_[[restart * m * len(mcu_order) for m in range(len(interval_starts))],
+                                                blocks[0].size])) if restart else np.zeros(blocks[0].size, dtype=np.int64)
+    dc = {"value": _magnitudes(windows, dc_end, dc_size), "interval": interval_of_block}
+    ac = {"block": record_block[rec], "k": ac_k, "size": ac_size,
+          "value": _magnitudes(windows, ac_end, ac_size), "end_bit": ac_end}
+    return JpegCoefficients(data, scan_start, scan_end, stream, interval_starts, rst_markers, components,
+                            quant, blocks, dc, ac)
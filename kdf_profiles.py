@@ -0,0 +1,143 @@
+# core/kdf_profiles.py — KDF profiles: parameter handling and host calibration for Rygelock
+
+import sys
+import time
+import argparse
+from Crypto.Protocol.KDF import PBKDF2, scrypt
+from utils.config import load_config, save_config
+
+SUPPORTED_KDFS = ("pbkdf2", "scrypt")
+
+# Parameters used before profiles existed. Headers without a "kdf" entry use these.
+LEGACY_KDF_PARAMS = {"algorithm": "pbkdf2", "iterations": 100_000}
+
+DEFAULT_TARGET_MS = 250
+
+# Bounds keep calibration sane and apply to payload headers too, so a crafted header can neither
+# request absurd work nor weaken the KDF below what calibration would ever pick
+MIN_PBKDF2_ITER = 20_000
+MAX_PBKDF2_ITER = 10_000_000
+SCRYPT_R = 8
+SCRYPT_P = 1
+MIN_SCRYPT_LOG_N = 14
+MAX_SCRYPT_LOG_N = 20  # 2**20 * 128 * r bytes = 1 GiB of memory per derivation
+MAX_SCRYPT_MEMORY = 128 * SCRYPT_R * 2 ** MAX_SCRYPT_LOG_N
+
+
+def normalize_kdf_params(params: dict = None) -> dict:
+    """
+    Validates KDF parameters (from config or a payload header) and returns a clean copy.
+    None returns the legacy PBKDF2 parameters. Raises ValueError for unknown or out-of-range values.
+    """
+    if not params:
+        return dict(LEGACY_KDF_PARAMS)
+
+    algorithm = params.get("algorithm")
+    if algorithm == "pbkdf2":
+        iterations = int(params.get("iterations", LEGACY_KDF_PARAMS["iterations"]))
+        if not MIN_PBKDF2_ITER <= iterations <= MAX_PBKDF2_ITER:
+            raise ValueError(f"PBKDF2 iteration count out of range: {iterations}")
+        return {"algorithm": "pbkdf2", "iterations": iterations}
+    elif algorithm == "scrypt":
+        n = int(params.get("n", 2 ** MIN_SCRYPT_LOG_N))
+        r = int(params.get("r", SCRYPT_R))
+        p = int(params.get("p", SCRYPT_P))
+        if n < 2 ** MIN_SCRYPT_LOG_N or n & (n - 1) or n > 2 ** MAX_SCRYPT_LOG_N:
+            raise ValueError(f"scrypt N must be a power of two from 2**{MIN_SCRYPT_LOG_N} to 2**{MAX_SCRYPT_LOG_N}: {n}")
+        if not (SCRYPT_R <= r <= 32 and 1 <= p <= 16) or 128 * r * n > MAX_SCRYPT_MEMORY:
+            raise ValueError(f"scrypt r/p out of range: r={r}, p={p}")
+        return {"algorithm": "scrypt", "n": n, "r": r, "p": p}
+    else:
+        raise ValueError(f"Unsupported KDF algorithm: {algorithm}")
+
+
+def run_kdf(secret: bytes, salt: bytes, dkLen: int, params: dict = None) -> bytes:
+    """
+    Runs the KDF described by `params` (see normalize_kdf_params) and returns dkLen bytes.
+    """
+    params = normalize_kdf_params(params)
+    if params["algorithm"] == "scrypt":
+        return scrypt(secret, salt, key_len=dkLen, N=params["n"], r=params["r"], p=params["p"])
+    return PBKDF2(secret, salt, dkLen=dkLen, count=params["iterations"])
+
+
+def benchmark_kdf(params: dict, rounds: int = 3) -> float:
+    """
+    Returns the best-of-`rounds` wall time in seconds for one 32-byte derivation.
+    """
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run_kdf(b"rygelock-calibration", b"\0" * 16, 32, params)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate(algorithm: str = "pbkdf2", target_ms: float = DEFAULT_TARGET_MS) -> dict:
+    """
+    Benchmarks the KDF on this host and picks cost parameters that take about target_ms
+    per derivation. Returns the profile dict (suitable for the payload header).
+    """
+    target = target_ms / 1000.0
+
+    if algorithm == "pbkdf2":
+        probe = {"algorithm": "pbkdf2", "iterations": MIN_PBKDF2_ITER}
+        per_iter = benchmark_kdf(probe) / MIN_PBKDF2_ITER
+        iterations = int(target / per_iter) // 1000 * 1000
+        iterations = max(MIN_PBKDF2_ITER, min(MAX_PBKDF2_ITER, iterations))
+        profile = {"algorithm": "pbkdf2", "iterations": iterations}
+    elif algorithm == "scrypt":
+        # scrypt cost grows linearly with N; keep the largest power of two under the target
+        log_n = MIN_SCRYPT_LOG_N
+        while log_n < MAX_SCRYPT_LOG_N:
+            candidate = {"algorithm": "scrypt", "n": 2 ** (log_n + 1), "r": SCRYPT_R, "p": SCRYPT_P}
+            if benchmark_kdf(candidate, rounds=1) > target:
+                break
+            log_n += 1
+        profile = {"algorithm": "scrypt", "n": 2 ** log_n, "r": SCRYPT_R, "p": SCRYPT_P}
+    else:
+        raise ValueError(f"Unsupported KDF algorithm: {algorithm}")
+
+    profile["measured_ms"] = round(benchmark_kdf(profile) * 1000, 1)
+    return profile
+
+
+def get_active_profile() -> dict:
+    """
+    Returns the KDF parameters new payloads should be encrypted with
+    (the calibrated profile from the user config, or the legacy default).
+    """
+    return normalize_kdf_params(load_config().get("kdf_profile"))
+
+
+def save_profile(profile: dict):
+    config = dict(load_config())
+    config["kdf_profile"] = normalize_kdf_params(profile)
+    save_config(config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rygelock KDF profile tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="Benchmark the KDF and pick parameters for a target latency")
+    cal.add_argument("--algorithm", choices=SUPPORTED_KDFS, default="pbkdf2")
+    cal.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS)
+    cal.add_argument("--save", action="store_true", help="Store the profile in the user config")
+
+    sub.add_parser("show", help="Print the active KDF profile")
+
+    args = parser.parse_args(argv)
+    if args.command == "calibrate":
+        profile = calibrate(args.algorithm, args.target_ms)
+        print(f"[KDF] Calibrated profile: {profile}")
+        if args.save:
+            save_profile(profile)
+            print("[KDF] Profile saved to user config.")
+    else:
+        print(f"[KDF] Active profile: {get_active_profile()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
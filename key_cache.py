@@ -0,0 +1,111 @@
+# core/key_cache.py — Session cache of derived keys for repeated extraction attempts
+
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from core.metrics import KEY_CACHE_LOOKUPS
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_TTL_SECONDS = 300
+
+
+def zeroize(buf: bytearray):
+    """Overwrites a key buffer with zeros."""
+    buf[:] = bytes(len(buf))
+
+
+class DerivedKeyCache:
+    """
+    LRU cache of KDF outputs keyed by (salt, password/key fingerprint, KDF params, key length).
+    Entries expire after `ttl_seconds` and are zeroized when evicted or cleared.
+    Callers get their own bytearray copy of the key and should zeroize() it when done; the cache
+    can only wipe its own copy (not the KDF's immutable result or copies made by cipher objects).
+    Only the decryption path uses it: encryption always draws a fresh salt, so it would never hit.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # cache key -> (bytearray key, expires_at)
+        self._lock = threading.Lock()
+        # Per-process secret so the cache never holds a plain hash of the password
+        self._fingerprint_secret = os.urandom(32)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fingerprint(self, password: bytes, key_data: bytes = None) -> bytes:
+        mac = hmac.new(self._fingerprint_secret, digestmod=hashlib.sha256)
+        mac.update(len(password).to_bytes(8, "big") + password)
+        mac.update(key_data or b"")
+        return mac.digest()
+
+    def _cache_key(self, password: bytes, salt: bytes, key_data: bytes, dkLen: int, kdf_params: dict) -> tuple:
+        params = tuple(sorted((kdf_params or {}).items()))
+        return bytes(salt), self._fingerprint(password, key_data), params, dkLen
+
+    def _evict(self, cache_key):
+        buf, _ = self._entries.pop(cache_key)
+        zeroize(buf)
+        self.evictions += 1
+
+    def _purge_expired(self, now: float):
+        expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for k in expired:
+            self._evict(k)
+
+    def get_or_derive(self, password: bytes, salt: bytes, key_data: bytes, dkLen: int, kdf_params: dict,
+                      derive) -> bytearray:
+        """
+        Returns a copy of the cached key for these inputs, or calls `derive()` and caches its result.
+        """
+        cache_key = self._cache_key(password, salt, key_data, dkLen, kdf_params)
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                KEY_CACHE_LOOKUPS.inc(result="hit")
+                return bytearray(entry[0])
+            self.misses += 1
+        KEY_CACHE_LOOKUPS.inc(result="miss")
+
+        # Derive outside the lock so slow KDF runs don't serialize unrelated lookups
+        key = derive()
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._evict(cache_key)
+            self._entries[cache_key] = (bytearray(key), time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+        return bytearray(key)
+
+    def clear(self):
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._evict(cache_key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+# Shared instance used by core/encryption.py
+KEY_CACHE = DerivedKeyCache()
+
+
+def get_key_cache() -> DerivedKeyCache:
+    return KEY_CACHE
@@ -1,6 +1,9 @@
+import re
 import json
 import random
+import struct
 import hashlib
+import functools
 from datetime import datetime
 
 # Custom 2-character encoding dictionary (partial sample shown)
@@ -18,53 +21,96 @@ KEY_DICT = {
 
 REVERSE_KEY_DICT = {v: k for k, v in KEY_DICT.items()}
 
+# Legacy (v1) text codec table: one str.translate call replaces the per-character loop
+_ENCODE_TABLE = str.maketrans(KEY_DICT)
 
-def generate_dict_checksum() -> str:
-    """Generates a hash checksum of the dictionary for validation."""
+# v1 tokens are always two ASCII alphanumerics; every alphanumeric is a KEY_DICT key, so characters
+# passed through unencoded (e.g. "_") can never start a token and tokenizing is unambiguous.
+_V1_TOKEN_RE = re.compile(r'[A-Za-z0-9]{2}|.', re.DOTALL)
+
+
+class _V1DecodeTable(dict):
+    """Token -> character table; misses resolve like the legacy decoder (unknown tokens become '?')."""
+
+    def __missing__(self, token):
+        return '?' if len(token) == 2 or token.isalnum() else token
+
+
+_DECODE_TABLE = _V1DecodeTable(REVERSE_KEY_DICT)
+
+# Key format v2: fixed binary header followed by compact JSON
+#   magic (4) | version (1) | dict checksum, raw SHA-256 (32) | salt (8) | body length (4, big-endian) | body
+KEY_FORMAT_VERSION = 2
+KEY_V2_MAGIC = b"RYGK"
+_KEY_V2_HEADER = struct.Struct(">4sB32s8sI")
+KEY_SALT_LENGTH = 8
+
+
+@functools.lru_cache(maxsize=None)
+def _dict_checksum_digest() -> bytes:
     raw = ''.join(sorted(KEY_DICT.keys())) + ''.join(sorted(KEY_DICT.values()))
-    return hashlib.sha256(raw.encode()).hexdigest()
+    return hashlib.sha256(raw.encode()).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def generate_dict_checksum() -> str:
+    """Generates a hash checksum of the dictionary for validation (computed once per process)."""
+    return _dict_checksum_digest().hex()
 
 
-def generate_salt(length=8) -> str:
+def generate_salt(length=KEY_SALT_LENGTH) -> str:
     """Returns a random salt."""
     chars = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
     return ''.join(random.choice(chars) for _ in range(length))
 
 
-def encode_key_metadata(metadata: dict) -> bytes:  # <<< Changed return type hint to bytes
+def encode_key_metadata(metadata: dict, version: int = KEY_FORMAT_VERSION) -> bytes:
     """
-    Encodes the metadata dictionary into a custom-encoded string,
-    appends a salt and checksum, and returns the result as bytes.
+    Encodes the metadata dictionary into key file bytes, adding a salt and the dictionary checksum.
+    version=2 (default) writes the compact binary layout; version=1 writes the legacy text encoding.
     """
-    metadata = metadata.copy()
-    metadata['salt'] = generate_salt()
-    metadata['dict_checksum'] = generate_dict_checksum()
-
-    json_str = json.dumps(metadata)
-    encoded_str_parts = []
-    for char in json_str:
-        encoded_str_parts.append(KEY_DICT.get(char, char))  # Use .get() with default for unknown chars
+    if version == 1:
+        metadata = metadata.copy()
+        metadata['salt'] = generate_salt()
+        metadata['dict_checksum'] = generate_dict_checksum()
+        # Unknown characters pass through unchanged, as before
+        return json.dumps(metadata).translate(_ENCODE_TABLE).encode('utf-8')
+    elif version == 2:
+        metadata = {k: v for k, v in metadata.items() if k not in ('salt', 'dict_checksum')}
+        body = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+        header = _KEY_V2_HEADER.pack(KEY_V2_MAGIC, KEY_FORMAT_VERSION, _dict_checksum_digest(),
+                                     generate_salt().encode('ascii'), len(body))
+        return header + body
+    else:
+        raise ValueError(f"Unsupported key format version: {version}")
 
-    encoded_str = ''.join(encoded_str_parts)
 
-    # CRITICAL: Encode the final string to bytes before returning
-    return encoded_str.encode('utf-8')
+def _decode_key_v2(encoded_bytes: bytes) -> dict:
+    if len(encoded_bytes) < _KEY_V2_HEADER.size:
+        raise ValueError("Failed to decode key. Possibly corrupted or invalid.")
+    _, version, checksum, salt, body_len = _KEY_V2_HEADER.unpack_from(encoded_bytes)
+    if version != KEY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported key format version: {version}")
+    if checksum != _dict_checksum_digest():
+        raise ValueError("Dictionary mismatch! Key may be incompatible.")
+    body = encoded_bytes[_KEY_V2_HEADER.size:_KEY_V2_HEADER.size + body_len]
+    if len(body) != body_len:
+        raise ValueError("Failed to decode key. Possibly corrupted or invalid.")
+    try:
+        obj = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError("Failed to decode key. Possibly corrupted or invalid.")
+    obj['salt'] = salt.decode('ascii', errors='replace')
+    obj['dict_checksum'] = checksum.hex()
+    return obj
 
 
-def decode_key_metadata(encoded_bytes: bytes) -> dict:  # <<< Changed input type hint to bytes
-    """
-    Decodes the custom-encoded bytes back into a metadata dictionary.
-    Performs a dictionary checksum validation.
-    """
-    encoded_str = encoded_bytes.decode('utf-8')  # <<< Decode bytes to string first
+def _decode_key_v1(encoded_bytes: bytes) -> dict:
+    encoded_str = encoded_bytes.decode('utf-8')
 
-    i = 0
-    decoded = ''
-    while i < len(encoded_str):
-        token = encoded_str[i:i + 2]
-        char = REVERSE_KEY_DICT.get(token, '?')  # Use .get() with default for unknown tokens
-        decoded += char
-        i += 2
+    # Split into 2-character tokens plus passed-through characters in one regex pass, then join once
+    # (the old loop grew the string token by token and lost alignment after any passed-through char).
+    decoded = ''.join(map(_DECODE_TABLE.__getitem__, _V1_TOKEN_RE.findall(encoded_str)))
 
     try:
         obj = json.loads(decoded)
@@ -72,4 +118,14 @@ def decode_key_metadata(encoded_bytes: bytes) -> dict:  # <<< Changed input type
             raise ValueError("Dictionary mismatch! Key may be incompatible.")
         return obj
     except json.JSONDecodeError:
-        raise ValueError("Failed to decode key. Possibly corrupted or invalid.")
\ No newline at end of file
+        raise ValueError("Failed to decode key. Possibly corrupted or invalid.")
+
+
+def decode_key_metadata(encoded_bytes: bytes) -> dict:
+    """
+    Decodes key file bytes back into a metadata dictionary.
+    Accepts both the v2 binary layout and legacy v1 text keys, and validates the dictionary checksum.
+    """
+    if encoded_bytes[:len(KEY_V2_MAGIC)] == KEY_V2_MAGIC:
+        return _decode_key_v2(encoded_bytes)
+    return _decode_key_v1(encoded_bytes)
@@ -0,0 +1,403 @@
+# core/metrics.py — In-process metrics registry with Prometheus text exposition
+
+import os
+import json
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.config import load_config
+
+METRICS_PREFIX = "rygelock_"
+METRICS_DIR_ENV = "RYGELOCK_METRICS_DIR"  # Shared directory for multi-process aggregation
+DEFAULT_METRICS_PORT = 9464
+
+# Seconds; covers a cached KDF hit up to a multi-minute video embed
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+# --- Metric types ---
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _export_values(self) -> list:
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    def _reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _merge(self, values):
+        with self._lock:
+            for key, v in values:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + v
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _merge(self, values):
+        # Deltas (snapshot(reset=True)) add up; aggregated() keeps other processes' gauges per pid instead
+        with self._lock:
+            for key, v in values:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + v
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)  # Index of the first bucket with le >= value
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]  # counts..., +Inf, sum
+            entry[slot] += 1
+            entry[-1] += value
+
+    def _export_values(self) -> list:
+        with self._lock:
+            return [[list(k), list(v)] for k, v in self._values.items()]
+
+    def _merge(self, values):
+        with self._lock:
+            for key, v in values:
+                key = tuple(key)
+                entry = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, x in enumerate(v):
+                    entry[i] += x
+
+
+# --- Registry ---
+class MetricsRegistry:
+    """
+    Holds the process's metrics. Updates take one lock per metric, so it is cheap enough
+    to leave on. Other processes (e.g. candidate-search workers) contribute via
+    snapshot(reset=True) -> merge(), or by flushing to a shared RYGELOCK_METRICS_DIR.
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        full_name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {full_name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collector(self, fn):
+        """fn(registry) runs before each export, e.g. to refresh gauges from other components."""
+        self._collectors.append(fn)
+
+    def _collect(self):
+        for fn in self._collectors:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"[Metrics] Collector failed: {e}")
+
+    # --- Multi-process aggregation ---
+    def snapshot(self, reset: bool = False) -> dict:
+        """JSON-serializable copy of all values; reset=True turns it into a delta (for workers)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snap = {}
+        for m in metrics:
+            snap[m.name] = {"type": m.kind, "help": m.help, "labelnames": list(m.labelnames),
+                            "values": m._export_values()}
+            if isinstance(m, Histogram):
+                snap[m.name]["buckets"] = list(m.buckets)
+            if reset:
+                m._reset()
+        return snap
+
+    def merge(self, snapshot: dict, pid: int = None):
+        """
+        Adds another process's snapshot: counters and histograms add up. Gauges add up too
+        (worker deltas), unless `pid` is given: a gauge is a level, not a count, so one
+        process's gauges are then kept apart under an extra "pid" label.
+        """
+        types = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+        for full_name, data in snapshot.items():
+            cls = types[data["type"]]
+            labelnames, values = data["labelnames"], data["values"]
+            if cls is Gauge and pid is not None:
+                labelnames = list(labelnames) + ["pid"]
+                values = [[list(key) + [str(pid)], v] for key, v in values]
+            with self._lock:
+                metric = self._metrics.get(full_name)
+                if metric is None:
+                    kwargs = {"buckets": data["buckets"]} if cls is Histogram else {}
+                    metric = self._metrics[full_name] = cls(full_name, data["help"], labelnames, **kwargs)
+            metric._merge(values)
+
+    def flush_to_dir(self, directory: str = None):
+        """Writes this process's snapshot to <dir>/metrics_<pid>.json (atomic replace)."""
+        directory = directory or os.environ.get(METRICS_DIR_ENV)
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+        return path
+
+    def aggregated(self, directory: str = None) -> "MetricsRegistry":
+        """
+        This registry plus the flushed snapshot of every other live process in `directory`.
+        Snapshots of processes that have exited are deleted (their gauges would be stale and
+        their counters would otherwise be added forever). Gauges are reported per pid.
+        """
+        combined = MetricsRegistry(self.prefix)
+        combined._collectors = list(self._collectors)
+        combined.merge(self.snapshot(), pid=os.getpid())
+        directory = directory or os.environ.get(METRICS_DIR_ENV)
+        if directory and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if not (name.startswith("metrics_") and name.endswith(".json")):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    pid = int(name[len("metrics_"):-len(".json")])
+                except ValueError:
+                    continue
+                if pid == os.getpid():
+                    continue
+                try:
+                    if not _pid_alive(pid):
+                        os.remove(path)
+                        continue
+                    with open(path) as f:
+                        combined.merge(json.load(f), pid=pid)
+                except (OSError, ValueError) as e:
+                    print(f"[Metrics] Skipping {name}: {e}")
+        combined._collect()
+        return combined
+
+    # --- Prometheus exposition ---
+    def render(self) -> str:
+        """Prometheus text format (version 0.0.4) of this registry's current values (see aggregated())."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {_escape_help(m.help)}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for key, value in sorted(m._export_values(), key=lambda kv: kv[0]):
+                labels = list(zip(m.labelnames, key))
+                if isinstance(m, Histogram):
+                    cumulative = 0
+                    for le, count in zip(list(m.buckets) + ["+Inf"], value[:-1]):
+                        cumulative += count
+                        le = le if le == "+Inf" else _format_value(le)
+                        lines.append(f"{m.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                    lines.append(f"{m.name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                    lines.append(f"{m.name}_count{_format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{m.name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> str:
+        """Atomically writes the exposition (for node_exporter's textfile collector)."""
+        text = self.aggregated().render()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid is running (a reused pid counts as alive)."""
+    if os.name == "nt":  # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # Exists, owned by another user
+        return True
+    return True
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) or abs(value) >= 1e15 else str(int(value)) + ".0"
+    return str(value)
+
+
+# --- HTTP endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.aggregated().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_http_server(port: int = DEFAULT_METRICS_PORT, addr: str = "127.0.0.1", registry=None):
+    """Serves /metrics from a daemon thread; binds to localhost unless told otherwise. Returns the server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# --- Shared registry and Rygelock metrics ---
+REGISTRY = MetricsRegistry()
+
+EMBED_JOBS = REGISTRY.counter("embed_jobs_total", "Embedding jobs finished, by status", ("status",))
+EMBED_PAIRS = REGISTRY.counter("embed_pairs_total", "Carrier/payload pairs embedded, by algorithm and status",
+                               ("algorithm", "status"))
+EMBEDDED_BYTES = REGISTRY.counter("embedded_bytes_total", "Payload bytes embedded")
+EXTRACT_JOBS = REGISTRY.counter("extract_jobs_total", "Extraction attempts finished, by status", ("status",))
+EXTRACTED_BYTES = REGISTRY.counter("extracted_bytes_total", "Payload bytes extracted")
+STEGO_APPLY = REGISTRY.counter("stego_apply_total", "stego_apply calls, by algorithm and status",
+                               ("algorithm", "status"))
+KDF_RUNS = REGISTRY.counter("kdf_invocations_total", "Key derivations actually run (cache misses), by KDF",
+                            ("kdf",))
+JOBS_IN_PROGRESS = REGISTRY.gauge("jobs_in_progress", "Jobs currently running, by kind", ("job",))
+JOB_SECONDS = REGISTRY.histogram("job_duration_seconds", "Wall time per job, by kind", ("job",))
+STAGE_SECONDS = REGISTRY.histogram("stage_duration_seconds", "Wall time per pipeline stage and item", ("stage",))
+STEGO_APPLY_SECONDS = REGISTRY.histogram("stego_apply_duration_seconds", "Wall time per stego_apply call",
+                                         ("algorithm",))
+
+
+KEY_CACHE_LOOKUPS = REGISTRY.counter("key_cache_lookups_total", "Derived-key cache lookups, by result (hit/miss)",
+                                     ("result",))
+
+
+def _collect_key_cache(registry):
+    # Runs on the (possibly multi-process) combined registry, so the ratio covers all processes
+    from core.key_cache import get_key_cache  # Late import: key_cache itself reports into this module
+    lookups = dict((key[0], value) for key, value in registry.counter(
+        "key_cache_lookups_total", KEY_CACHE_LOOKUPS.help, ("result",))._export_values())
+    total = lookups.get("hit", 0) + lookups.get("miss", 0)
+    registry.gauge("key_cache_hit_ratio", "Derived-key cache hits / lookups").set(
+        lookups.get("hit", 0) / total if total else 0.0)
+    registry.gauge("key_cache_entries", "Derived keys currently cached in this process").set(
+        get_key_cache().stats()["size"])
+
+
+REGISTRY.add_collector(_collect_key_cache)
+
+
+def get_registry() -> MetricsRegistry:
+    return REGISTRY
+
+
+def export_after_job():
+    """Refreshes the configured sinks after a job: the textfile (config "metrics_textfile") and the metrics dir."""
+    try:
+        if os.environ.get(METRICS_DIR_ENV):
+            REGISTRY.flush_to_dir()
+        path = load_config().get("metrics_textfile")
+        if path:
+            REGISTRY.write_textfile(path)
+    except OSError as e:
+        print(f"[Metrics] Export failed: {e}")
+
+
+def start_configured_server():
+    """Starts the HTTP endpoint if the user config sets "metrics_port"; returns the server or None."""
+    port = load_config().get("metrics_port")
+    if not port:
+        return None
+    try:
+        return start_http_server(int(port))
+    except OSError as e:
+        print(f"[Metrics] Could not start HTTP endpoint on port {port}: {e}")
+        return None
@@ -0,0 +1,137 @@
+# core/parallel_costs.py — Cost maps computed in halo-padded row tiles, across a process pool for large images
+
+import os
+import atexit
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, wait
+from core.progress import ensure_progress
+from utils.config import load_config
+
+WORKERS_ENV = "RYGELOCK_COST_WORKERS"  # Cost worker processes; "1" computes every tile in-process
+TILE_ROWS = 128  # Canonical tile height: the tiling, and so every cost, never depends on the worker count
+PARALLEL_MIN_PIXELS = 4_000_000  # Below this, pool round trips cost more than the cost map itself
+PROBE_SIZE = 16  # Rows/cols of the corner a cost function is tried on to learn its output dtype
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def cost_workers(workers: int = None) -> int:
+    """Explicit argument wins, then RYGELOCK_COST_WORKERS, then user config "cost_workers", then the CPU count."""
+    if workers is None and os.environ.get(WORKERS_ENV):
+        workers = int(os.environ[WORKERS_ENV])
+    if workers is None:
+        workers = load_config().get("cost_workers")
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def tile_bounds(height: int) -> list:
+    return [(r, min(r + TILE_ROWS, height)) for r in range(0, height, TILE_ROWS)]
+
+
+def _cost_tile(cost_fn, pixels: np.ndarray, r0: int, r1: int, halo: int) -> np.ndarray:
+    """Costs of rows r0:r1, computed on the tile plus `halo` rows of real neighbours on each side."""
+    lo, hi = max(0, r0 - halo), min(pixels.shape[-3], r1 + halo)
+    return cost_fn(pixels[..., lo:hi, :, :])[..., r0 - lo:r1 - lo, :, :]
+
+
+def compute_costs(cost_fn, pixels: np.ndarray, halo: int = None, progress=None, workers: int = None) -> np.ndarray:
+    """
+    cost_fn(pixels) for an (H, W, C) image or an (N, H, W, C) stack of them, computed in TILE_ROWS-row
+    tiles. `halo` is how many rows of neighbours a cost depends on; a cost function whose costs are
+    not local (halo None) runs on the whole array. Inputs above PARALLEL_MIN_PIXELS are split across the worker pool through shared memory, so
+    neither the pixels nor the costs are pickled. The result is identical for any worker count.
+    """
+    progress = ensure_progress(progress)
+    if halo is None:
+        costs = cost_fn(pixels)
+        progress.advance(pixels.size)
+        return costs
+    bounds = tile_bounds(pixels.shape[-3])
+    workers = min(cost_workers(workers), len(bounds))
+    if workers > 1 and pixels.size // pixels.shape[-1] >= PARALLEL_MIN_PIXELS:
+        return _compute_shared(cost_fn, pixels, halo, bounds, workers, progress)
+    costs = None
+    for r0, r1 in bounds:
+        tile = _cost_tile(cost_fn, pixels, r0, r1, halo)
+        if costs is None:
+            costs = np.empty(pixels.shape, dtype=tile.dtype)
+        costs[..., r0:r1, :, :] = tile
+        progress.advance(tile.size)
+    return costs
+
+
+# --- Process pool ---
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # One pool per process, shared by concurrent jobs, so parallel embeds don't multiply the workers
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+        return _pool
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+: the parent owns the block
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _shared_tile(cost_fn, spec: tuple, r0: int, r1: int, halo: int):
+    """Worker side: reads the tile (and halo) from the shared pixels and writes its costs in place."""
+    src_name, shape, dtype, dst_name, cost_dtype = spec
+    src, dst = _attach(src_name), _attach(dst_name)
+    try:
+        pixels = np.ndarray(shape, dtype=dtype, buffer=src.buf)
+        costs = np.ndarray(shape, dtype=cost_dtype, buffer=dst.buf)
+        costs[..., r0:r1, :, :] = _cost_tile(cost_fn, pixels, r0, r1, halo)
+        del pixels, costs  # Views must go before the mappings close
+    finally:
+        src.close()
+        dst.close()
+
+
+def _compute_shared(cost_fn, pixels, halo, bounds, workers, progress) -> np.ndarray:
+    cost_dtype = cost_fn(pixels[..., :PROBE_SIZE, :PROBE_SIZE, :]).dtype
+    row_samples = pixels[..., 0, :, :].size
+    src = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+    dst = shared_memory.SharedMemory(create=True, size=pixels.size * cost_dtype.itemsize)
+    try:
+        shared = np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=src.buf)
+        shared[...] = pixels
+        del shared
+        spec = (src.name, pixels.shape, pixels.dtype.str, dst.name, cost_dtype.str)
+        pool = _get_pool(workers)
+        futures = [pool.submit(_shared_tile, cost_fn, spec, r0, r1, halo) for r0, r1 in bounds]
+        try:
+            for future, (r0, r1) in zip(futures, bounds):
+                future.result()
+                progress.advance((r1 - r0) * row_samples)
+        finally:
+            for future in futures:
+                future.cancel()
+            wait(futures)  # Workers still writing must finish before the blocks are unlinked
+        costs = np.ndarray(pixels.shape, dtype=cost_dtype, buffer=dst.buf)
+        result = costs.copy()
+        del costs
+        return result
+    finally:
+        src.close()
+        src.unlink()
+        dst.close()
+        dst.unlink()
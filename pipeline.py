@@ -0,0 +1,218 @@
+# core/pipeline.py — Bounded multi-stage pipeline overlapping I/O, crypto and embedding work
+
+import os
+import time
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 2  # Items buffered between stages before the upstream stage blocks
+_END = object()  # End-of-stream marker passed down the queues
+
+
+# --- I/O helpers ---
+def advise_sequential(path: str, willneed: bool = True):
+    """
+    Hints the kernel that `path` will be read front to back soon so readahead
+    (including NFS readahead) can start before the consumer gets there.
+    No-op on platforms without posix_fadvise.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if willneed:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_sequential(path: str) -> bytearray:
+    """Reads a whole file into a writable buffer with a sequential-access hint."""
+    data = bytearray(os.path.getsize(path))
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            n = f.readinto(view[offset:])
+            if not n:
+                raise IOError(f"Unexpected end of file while reading {path}")
+            offset += n
+    return data
+
+
+class StageFailed:
+    """Placeholder that carries an item's exception through the remaining stages."""
+
+    def __init__(self, stage: str, error: Exception):
+        self.stage = stage
+        self.error = error
+
+    def __repr__(self):
+        return f"StageFailed({self.stage!r}, {self.error!r})"
+
+
+class _Stage:
+    def __init__(self, name, fn, workers):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.items = 0
+        self.busy = 0.0      # Time spent inside fn
+        self.starved = 0.0   # Time waiting for input
+        self.blocked = 0.0   # Time waiting for space downstream (backpressure)
+        self.peak_backlog = 0
+        self.live_workers = workers
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues.
+    Each stage has its own worker threads, so a slow disk read, a crypto call and an
+    embedding can all be in flight at once; full queues block upstream stages
+    instead of letting work pile up in memory.
+
+    Usage:
+        pipe = Pipeline()
+        pipe.add_stage("read", read_fn, workers=2)
+        pipe.add_stage("embed", embed_fn, workers=4)
+        outcomes = pipe.run(items)   # One result or StageFailed per item, in input order
+        pipe.stats()                 # Per-stage occupancy, to find the bottleneck
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, stop_on_error: bool = True):
+        self.queue_size = max(1, queue_size)
+        self.stop_on_error = stop_on_error
+        self._stages = []
+        self._wall = 0.0
+        self._stop = threading.Event()
+
+    def add_stage(self, name: str, fn, workers: int = 1):
+        """Appends a stage; fn(value) -> value runs on `workers` threads."""
+        self._stages.append(_Stage(name, fn, max(1, workers)))
+        return self
+
+    # --- Execution ---
+    def _timed_put(self, stage, out_q, entry):
+        start = time.perf_counter()
+        out_q.put(entry)
+        waited = time.perf_counter() - start
+        if stage is not None:
+            with stage.lock:
+                stage.blocked += waited
+
+    def _worker(self, stage, in_q, out_q):
+        while True:
+            start = time.perf_counter()
+            entry = in_q.get()
+            waited = time.perf_counter() - start
+            with stage.lock:
+                stage.starved += waited
+                stage.peak_backlog = max(stage.peak_backlog, in_q.qsize() + 1)
+
+            if entry is _END:
+                in_q.put(_END)  # Let sibling workers see it too
+                with stage.lock:
+                    stage.live_workers -= 1
+                    last = stage.live_workers == 0
+                if last:
+                    out_q.put(_END)
+                return
+
+            idx, value = entry
+            if not isinstance(value, StageFailed):
+                start = time.perf_counter()
+                try:
+                    value = stage.fn(value)
+                except BaseException as e:  # Incl. cancellation; a dead worker would stall the pipeline
+                    value = StageFailed(stage.name, e)
+                    if self.stop_on_error:
+                        self._stop.set()
+                elapsed = time.perf_counter() - start
+                with stage.lock:
+                    stage.busy += elapsed
+                    stage.items += 1
+            self._timed_put(stage, out_q, (idx, value))
+
+    def _feed(self, items, first_q):
+        for idx, value in enumerate(items):
+            if self._stop.is_set():
+                break
+            first_q.put((idx, value))
+        first_q.put(_END)
+
+    def run(self, items, on_result=None) -> list:
+        """
+        Pushes `items` through all stages and returns their outcomes in input order.
+        A failing item becomes a StageFailed; with stop_on_error no new items are started
+        after the first failure (items already in flight still finish).
+        `on_result(idx, value)` is called on the calling thread as items complete.
+        """
+        if not self._stages:
+            raise ValueError("Pipeline has no stages")
+
+        self._stop.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self._stages]
+        queues.append(queue.Queue())  # Results: unbounded, drained by the caller
+        for stage in self._stages:
+            stage.live_workers = stage.workers
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), name="pipeline-feed", daemon=True)]
+        for i, stage in enumerate(self._stages):
+            for w in range(stage.workers):
+                threads.append(threading.Thread(target=self._worker, args=(stage, queues[i], queues[i + 1]),
+                                                name=f"pipeline-{stage.name}-{w}", daemon=True))
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        outcomes = {}
+        while True:
+            entry = queues[-1].get()
+            if entry is _END:
+                break
+            idx, value = entry
+            outcomes[idx] = value
+            if on_result is not None:
+                on_result(idx, value)
+
+        for t in threads:
+            t.join()
+        self._wall = time.perf_counter() - start
+        return [outcomes[i] for i in sorted(outcomes)]
+
+    # --- Statistics ---
+    def stats(self) -> dict:
+        """
+        Occupancy per stage for the last run. `utilization` is busy time over the wall time
+        available to the stage's workers; the stage closest to 1.0 is the bottleneck.
+        High `blocked_s` means downstream can't keep up, high `starved_s` means upstream can't.
+        """
+        stages = []
+        for stage in self._stages:
+            capacity = self._wall * stage.workers
+            stages.append({
+                "stage": stage.name,
+                "workers": stage.workers,
+                "items": stage.items,
+                "busy_s": round(stage.busy, 4),
+                "starved_s": round(stage.starved, 4),
+                "blocked_s": round(stage.blocked, 4),
+                "peak_backlog": stage.peak_backlog,
+                "utilization": round(stage.busy / capacity, 3) if capacity else 0.0,
+            })
+        bottleneck = max(stages, key=lambda s: s["utilization"])["stage"] if stages else None
+        return {"wall_s": round(self._wall, 4), "queue_size": self.queue_size,
+                "bottleneck": bottleneck, "stages": stages}
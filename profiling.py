@@ -0,0 +1,202 @@
+# core/profiling.py — Opt-in cProfile/tracemalloc profiling of embedding jobs
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+from datetime import datetime
+from utils.config import load_config, get_output_dir
+
+PROFILE_ENV = "RYGELOCK_PROFILE"  # "1" profiles every job
+DEFAULT_TOP_N = 25
+TRACEMALLOC_FRAMES = 10
+
+# Collapsed-stack reconstruction limits (see _collapsed_stacks)
+MAX_STACK_DEPTH = 64
+MIN_STACK_SHARE = 1e-4
+
+# cProfile can only have one active profiler per interpreter on newer Pythons, and tracemalloc
+# peaks are process-wide, so profiled sections run one at a time.
+_profile_lock = threading.Lock()
+
+
+def profiling_enabled(config: dict = None) -> bool:
+    """Job config "profile" wins, then RYGELOCK_PROFILE, then the user config."""
+    if config and config.get("profile") is not None:
+        return bool(config["profile"])
+    if os.environ.get(PROFILE_ENV):
+        return os.environ[PROFILE_ENV].lower() not in ("0", "false", "no")
+    return bool(load_config().get("profile"))
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    if filename == "~":  # Built-ins
+        return name.replace(";", ":")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+
+def _collapsed_stacks(stats: pstats.Stats) -> dict:
+    """
+    Approximates folded stacks ("a;b;c" -> microseconds) from cProfile's caller graph.
+    cProfile keeps only caller->callee edges, so each function's self time is split over
+    its callers in proportion to the time spent in it from each one, recursively.
+    """
+    entries = stats.stats  # func -> (cc, nc, tt, ct, callers{caller: (nc, cc, tt, ct)})
+    memo = {}
+
+    def paths(func, on_path):
+        if func in memo:
+            return memo[func]
+        callers = entries.get(func, (0, 0, 0, 0, {}))[4]
+        total = sum(edge[2] for caller, edge in callers.items() if caller not in on_path)
+        result = []
+        if not callers or total <= 0 or len(on_path) >= MAX_STACK_DEPTH:
+            result = [((func,), 1.0)]
+        else:
+            for caller, edge in callers.items():
+                if caller in on_path:  # Recursion: cut the cycle here
+                    continue
+                share = edge[2] / total
+                if share < MIN_STACK_SHARE:
+                    continue
+                for stack, weight in paths(caller, on_path | {func}):
+                    if weight * share >= MIN_STACK_SHARE:
+                        result.append((stack + (func,), weight * share))
+            result = result or [((func,), 1.0)]
+        if not on_path:
+            memo[func] = result
+        return result
+
+    folded = {}
+    for func, (_, _, tt, _, _) in entries.items():
+        if tt <= 0:
+            continue
+        for stack, weight in paths(func, frozenset()):
+            key = ";".join(_label(f) for f in stack)
+            folded[key] = folded.get(key, 0) + tt * weight * 1e6
+    return folded
+
+
+class JobProfiler:
+    """
+    Collects cProfile data and tracemalloc peaks for the sections of one job, then writes
+    <name>.pstats, <name>.collapsed.txt (flamegraph.pl / speedscope) and <name>.allocations.txt.
+    """
+
+    def __init__(self, job: str, out_dir: str = None, top_n: int = DEFAULT_TOP_N):
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.job = job
+        self.name = f"{job}_{stamp}_{os.getpid()}"
+        self.out_dir = out_dir or os.path.join(get_output_dir(), "profiles")
+        self.top_n = top_n
+        self.sections = []
+        self.peak_traced = 0
+        self._traced_at_start = 0
+        self._profiles = []
+        self._started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        # Peaks are counted from here: memory traced before the job (if tracing was already on) is not its own
+        tracemalloc.reset_peak()
+        self._traced_at_start = tracemalloc.get_traced_memory()[0]
+        return self
+
+    @contextlib.contextmanager
+    def section(self, name: str, pair=None):
+        """Profiles the enclosed block (CPU via cProfile, memory via tracemalloc)."""
+        with _profile_lock:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                wall = time.perf_counter() - started
+                current, peak = tracemalloc.get_traced_memory()
+                self._profiles.append(profile)
+                self.peak_traced = max(self.peak_traced, peak - self._traced_at_start)
+                self.sections.append({"section": name, "pair": pair, "wall_s": round(wall, 6),
+                                      "peak_traced_bytes": peak - before, "net_allocated_bytes": current - before})
+
+    def finish(self, result: dict):
+        """
+        Writes the reports and adds result["profile"] and result["peak_memory_bytes"]: the job's
+        tracemalloc peak above what was traced when it started. ru_maxrss is the process's
+        lifetime high-water mark, so it is only reported as profile["process_peak_rss_bytes"].
+        """
+        if tracemalloc.is_tracing():  # Allocations between sections
+            self.peak_traced = max(self.peak_traced, tracemalloc.get_traced_memory()[1] - self._traced_at_start)
+        report = {"sections": self.sections, "peak_traced_bytes": self.peak_traced,
+                  "process_peak_rss_bytes": _peak_rss_bytes()}
+        try:
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+            os.makedirs(self.out_dir, exist_ok=True)
+            base = os.path.join(self.out_dir, self.name)
+
+            if self._profiles:
+                stats = pstats.Stats(self._profiles[0])
+                for profile in self._profiles[1:]:
+                    stats.add(profile)
+                stats.dump_stats(base + ".pstats")
+                report["pstats"] = base + ".pstats"
+
+                with open(base + ".collapsed.txt", "w") as f:
+                    for stack, micros in sorted(_collapsed_stacks(stats).items()):
+                        if micros >= 1:
+                            f.write(f"{stack} {int(micros)}\n")
+                report["collapsed_stacks"] = base + ".collapsed.txt"
+
+            if snapshot is not None:
+                with open(base + ".allocations.txt", "w") as f:
+                    f.write(f"Top {self.top_n} allocation sites still live at end of job '{self.job}'\n")
+                    for stat in snapshot.statistics("lineno")[:self.top_n]:
+                        f.write(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback[0]}\n")
+                    f.write("\nPer-section peaks\n")
+                    for s in sorted(self.sections, key=lambda s: -s["peak_traced_bytes"]):
+                        f.write(f"{s['peak_traced_bytes'] / 1024:10.1f} KiB  {s['section']} (pair {s['pair']})\n")
+                report["allocations"] = base + ".allocations.txt"
+        except OSError as e:
+            print(f"[Profiling] Could not write profile output: {e}")
+
+        result["profile"] = report
+        result["peak_memory_bytes"] = self.peak_traced
+
+
+def start_job_profiling(job: str, config: dict = None):
+    """Returns a started JobProfiler if profiling is enabled for this job, else None."""
+    if not profiling_enabled(config):
+        return None
+    user_config = load_config()
+    out_dir = (config or {}).get("profile_dir") or user_config.get("profile_dir")
+    top_n = (config or {}).get("profile_top_n") or user_config.get("profile_top_n") or DEFAULT_TOP_N
+    return JobProfiler(job, out_dir, int(top_n)).start()
+
+
+def profiled(profiler, name: str, pair=None):
+    """profiler.section(...) or a no-op context when profiling is off."""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.section(name, pair)
@@ -0,0 +1,208 @@
+# core/progress.py — Progress reporting and cooperative cancellation for embedding jobs
+
+import time
+import threading
+from core.timing import span, NULL_SPAN
+
+# Phases a carrier/payload pair goes through, with their share of the pair's progress.
+# Algorithms that skip a phase (e.g. appending needs no cost map) simply never enter it.
+# Other job types pass their own table to JobProgress.
+PHASES = (
+    ("read", 0.05),
+    ("crypto", 0.10),
+    ("cost_map", 0.40),
+    ("selection", 0.10),
+    ("embed", 0.25),
+    ("write", 0.10),
+)
+
+
+def _phase_spans(phases) -> dict:
+    """Maps phase name -> (start, weight) within a task's 0..1 progress."""
+    return {name: (sum(w for _, w in phases[:i]), weight) for i, (name, weight) in enumerate(phases)}
+
+DEFAULT_MIN_INTERVAL = 0.1  # Seconds between callbacks (~10 updates/s)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job once its CancelToken is set. Derives from BaseException (like
+    KeyboardInterrupt) so the algorithms' broad `except Exception` handlers don't swallow it.
+    """
+
+
+class CancelToken:
+    """Thread-safe cancel flag shared between the UI and a running job."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("Job cancelled by user")
+
+
+class TaskProgress:
+    """
+    Progress of one carrier/payload pair. Algorithms receive this as `progress` and call
+    phase() when they enter a phase, advance() as units (bytes, pixels) are processed, and
+    check() at chunk/tile boundaries so cancellation takes effect promptly.
+    """
+
+    def __init__(self, job, task_id):
+        self._job = job
+        self.task_id = task_id
+        self.phase_name = None
+        self.total = 0
+        self.done = 0
+        self.unit = "bytes"
+        self.phase_started = time.monotonic()
+        self.finished = False
+        self._span = NULL_SPAN
+
+    def phase(self, name: str, total: int = 0, unit: str = "bytes"):
+        """Starts a phase; this also times it (core.timing) until the next phase or end_phase()."""
+        self.check()
+        self._span.end()
+        self._span = span(name, int(total), unit, pair=self.task_id)
+        self.phase_name = name
+        self.total = max(0, int(total))
+        self.done = 0
+        self.unit = unit
+        self.phase_started = time.monotonic()
+        self._job._report(self)
+
+    def advance(self, n: int = 1):
+        self.done += n
+        self.check()
+        self._job._report(self)
+
+    def update(self, done: int):
+        self.done = done
+        self.check()
+        self._job._report(self)
+
+    def check(self):
+        self._job.cancel_token.raise_if_cancelled()
+
+    def end_phase(self):
+        """Closes the current phase's timing span (called when a pipeline stage hands the task on)."""
+        self._span.end()
+        self._span = NULL_SPAN
+
+    def finish(self):
+        self.end_phase()
+        self.finished = True
+        self._job._report(self)
+
+    def fraction(self) -> float:
+        if self.finished:
+            return 1.0
+        if self.phase_name is None:
+            return 0.0
+        spans = self._job.phase_spans
+        start, weight = spans.get(self.phase_name) or spans.get("embed", (0.0, 0.0))  # Algorithm-specific phases
+        within = min(1.0, self.done / self.total) if self.total else 0.0
+        return start + weight * within
+
+
+class NullProgress(TaskProgress):
+    """Stand-in used when an algorithm is called without a progress context."""
+
+    def __init__(self):
+        pass
+
+    def phase(self, name, total=0, unit="bytes"):
+        pass
+
+    def advance(self, n=1):
+        pass
+
+    def update(self, done):
+        pass
+
+    def check(self):
+        pass
+
+    def end_phase(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def fraction(self):
+        return 0.0
+
+
+NULL_PROGRESS = NullProgress()
+
+
+def ensure_progress(progress) -> TaskProgress:
+    return progress if progress is not None else NULL_PROGRESS
+
+
+class JobProgress:
+    """
+    Aggregates TaskProgress objects (one per pair, possibly running concurrently) into
+    a single rate-limited stream of snapshots for the UI. The callback receives a dict:
+        percent, phase, task, done, total, unit, rate (units/s in the current phase), eta_s
+    """
+
+    def __init__(self, callback=None, cancel_token: CancelToken = None, tasks: int = 1,
+                 min_interval: float = DEFAULT_MIN_INTERVAL, phases=PHASES):
+        self.callback = callback
+        self.phase_spans = _phase_spans(phases)
+        self.cancel_token = cancel_token or CancelToken()
+        self.tasks = {}
+        self.task_count = max(1, tasks)
+        self.min_interval = min_interval
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def task(self, task_id) -> TaskProgress:
+        with self._lock:
+            if task_id not in self.tasks:
+                self.tasks[task_id] = TaskProgress(self, task_id)
+            return self.tasks[task_id]
+
+    def fraction(self) -> float:
+        return sum(t.fraction() for t in list(self.tasks.values())) / self.task_count
+
+    def _report(self, task: TaskProgress):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_emit < self.min_interval:
+                return
+            fraction = self.fraction()
+            percent = int(fraction * 100)
+            self._last_emit = now
+
+        elapsed = now - self.started
+        phase_elapsed = now - task.phase_started
+        snapshot = {
+            "percent": percent,
+            "phase": task.phase_name,
+            "task": task.task_id,
+            "done": task.done,
+            "total": task.total,
+            "unit": task.unit,
+            "rate": task.done / phase_elapsed if phase_elapsed > 0 else 0.0,
+            "eta_s": elapsed * (1 - fraction) / fraction if fraction > 0 else None,
+        }
+        self.callback(snapshot)
+
+    def complete(self):
+        """Emits a final 100% snapshot."""
+        if self.callback is not None:
+            self.callback({"percent": 100, "phase": "done", "task": None, "done": 0, "total": 0,
+                           "unit": "bytes", "rate": 0.0, "eta_s": 0.0})
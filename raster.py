@@ -0,0 +1,171 @@
+# core/raster.py — Direct sample access for uncompressed BMP and TIFF carriers
+
+import os
+import shutil
+import struct
+import numpy as np
+
+RASTER_EXTENSIONS = (".bmp", ".tif", ".tiff")
+FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, XFS, ...)
+
+# TIFF tags
+_TIFF_WIDTH, _TIFF_HEIGHT, _TIFF_BITS, _TIFF_COMPRESSION, _TIFF_PHOTOMETRIC = 256, 257, 258, 259, 262
+_TIFF_STRIP_OFFSETS, _TIFF_SAMPLES, _TIFF_ROWS_PER_STRIP, _TIFF_PLANAR, _TIFF_EXTRA_SAMPLES = 273, 277, 278, 284, 338
+_TIFF_TYPE_SIZES = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4)}  # BYTE, SHORT, LONG
+
+
+class RasterLayout:
+    """
+    Where each sample of an uncompressed 8-bit raster sits in its file, in the logical order
+    PIL decodes it to (top-down rows, RGB channel order, alpha separate). The LSB algorithms
+    use this to read and write pixels in place instead of decoding and re-encoding the image.
+    """
+
+    def __init__(self, mode, width, height, pixel_bytes, channel_offsets, alpha_offset, row_offsets):
+        self.mode = mode                        # "L", "LA", "RGB" or "RGBA", as PIL reports it
+        self.width = width
+        self.height = height
+        self.pixel_bytes = pixel_bytes          # Bytes per pixel in the file (incl. alpha/padding)
+        self.channel_offsets = np.asarray(channel_offsets, dtype=np.int64)  # Logical color channel -> byte in pixel
+        self.alpha_offset = alpha_offset
+        self.row_offsets = np.asarray(row_offsets, dtype=np.int64)          # Logical row -> file offset
+
+    @property
+    def channels(self) -> int:
+        return len(self.channel_offsets)
+
+    @property
+    def samples(self) -> int:
+        return self.width * self.height * self.channels
+
+    def sample_offsets(self, indices) -> np.ndarray:
+        """File offsets of flat (H, W, C) sample indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        row, rest = np.divmod(indices, self.width * self.channels)
+        col, channel = np.divmod(rest, self.channels)
+        return self.row_offsets[row] + col * self.pixel_bytes + self.channel_offsets[channel]
+
+    def read_pixels(self, data) -> tuple:
+        """(H, W, C) color samples and the (H, W) alpha channel (or None) from the mapped file."""
+        pixels = np.empty((self.height, self.width, self.channels), dtype=np.uint8)
+        alpha = np.empty((self.height, self.width), dtype=np.uint8) if self.alpha_offset is not None else None
+        row_bytes = self.width * self.pixel_bytes
+        for r, offset in enumerate(self.row_offsets):
+            row = np.asarray(data[offset:offset + row_bytes]).reshape(self.width, self.pixel_bytes)
+            pixels[r] = row[:, self.channel_offsets]
+            if alpha is not None:
+                alpha[r] = row[:, self.alpha_offset]
+        return pixels, alpha
+
+
+# --- Header parsing ---
+def _parse_bmp(f, file_size):
+    header = f.read(54)
+    if len(header) < 54 or header[:2] != b"BM":
+        return None
+    data_offset, dib_size, width, height, _, bpp, compression = struct.unpack("<I I i i H H I", header[10:34])
+    if compression != 0 or bpp not in (8, 24, 32) or width <= 0 or height == 0:
+        return None  # RLE / bitfields / low bit depths go through PIL
+    if bpp == 8:
+        # PIL only decodes 8-bit BMPs as "L" when the palette is the full identity gray ramp
+        colors = struct.unpack("<I", header[46:50])[0]
+        if colors not in (0, 256):
+            return None
+        f.seek(14 + dib_size)
+        palette = np.frombuffer(f.read(1024), dtype=np.uint8)
+        if palette.size != 1024 or not (palette.reshape(256, 4)[:, :3] == np.arange(256)[:, None]).all():
+            return None
+        mode, channel_offsets = "L", (0,)
+    else:
+        mode, channel_offsets = "RGB", (2, 1, 0)  # BGR / BGRX
+    rows = abs(height)
+    stride = (width * bpp + 31) // 32 * 4
+    if data_offset + stride * rows > file_size:
+        return None
+    order = np.arange(rows) if height < 0 else np.arange(rows - 1, -1, -1)  # Positive height: bottom-up
+    return RasterLayout(mode, width, rows, bpp // 8, channel_offsets, None, data_offset + order * stride)
+
+
+def _parse_tiff(f, file_size):
+    magic = f.read(8)
+    if magic[:4] == b"II*\0":
+        endian = "<"
+    elif magic[:4] == b"MM\0*":
+        endian = ">"
+    else:
+        return None
+    f.seek(struct.unpack(endian + "I", magic[4:8])[0])
+    count = struct.unpack(endian + "H", f.read(2))[0]
+    entries = f.read(12 * count)
+    tags = {}
+    for i in range(count):
+        tag, field_type, n, raw = struct.unpack(endian + "HHI4s", entries[12 * i:12 * i + 12])
+        if field_type not in _TIFF_TYPE_SIZES:
+            continue
+        code, size = _TIFF_TYPE_SIZES[field_type]
+        if n * size <= 4:
+            data = raw[:n * size]
+        else:
+            here = f.tell()
+            f.seek(struct.unpack(endian + "I", raw)[0])
+            data = f.read(n * size)
+            f.seek(here)
+        tags[tag] = struct.unpack(f"{endian}{n}{code}", data)
+
+    def tag(name, default=None):
+        return tags.get(name, (default,))
+
+    width, height = tag(_TIFF_WIDTH)[0], tag(_TIFF_HEIGHT)[0]
+    samples = tag(_TIFF_SAMPLES, 1)[0]
+    if (width is None or height is None or tag(_TIFF_COMPRESSION, 1)[0] != 1 or tag(_TIFF_PLANAR, 1)[0] != 1
+            or set(tag(_TIFF_BITS, 1)) != {8} or _TIFF_STRIP_OFFSETS not in tags):
+        return None  # Compressed, planar, tiled or not 8-bit: PIL path
+    photometric, extra = tag(_TIFF_PHOTOMETRIC)[0], tags.get(_TIFF_EXTRA_SAMPLES, ())
+    layouts = {(1, 1, ()): "L", (1, 2, (2,)): "LA", (2, 3, ()): "RGB", (2, 4, (2,)): "RGBA"}
+    mode = layouts.get((photometric, samples, tuple(extra)))
+    if mode is None:
+        return None  # WhiteIsZero, premultiplied alpha, CMYK, ...
+
+    rows_per_strip = min(tag(_TIFF_ROWS_PER_STRIP, height)[0], height)
+    strip_offsets = np.asarray(tags[_TIFF_STRIP_OFFSETS], dtype=np.int64)
+    rows = np.arange(height)
+    row_offsets = strip_offsets[rows // rows_per_strip] + (rows % rows_per_strip) * width * samples
+    if row_offsets.max() + width * samples > file_size:
+        return None
+    alpha = samples - 1 if mode in ("LA", "RGBA") else None
+    color = tuple(range(samples - 1 if alpha is not None else samples))
+    return RasterLayout(mode, width, height, samples, color, alpha, row_offsets)
+
+
+def parse_raster(path):
+    """RasterLayout of an uncompressed 8-bit BMP/TIFF, or None if the file needs a real decoder."""
+    if os.path.splitext(path)[1].lower() not in RASTER_EXTENSIONS:
+        return None
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if path.lower().endswith(".bmp"):
+                return _parse_bmp(f, file_size)
+            return _parse_tiff(f, file_size)
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+# --- File access ---
+def clone_file(src: str, dst: str):
+    """
+    Copies src to dst, sharing extents (reflink) where the filesystem supports it, so an
+    in-place embed afterwards only allocates the blocks it actually modifies.
+    """
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)  # Uses copy_file_range/sendfile where available
+
+
+def map_raster(path: str, writable: bool = False) -> np.memmap:
+    return np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r")
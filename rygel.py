@@ -5,11 +5,13 @@ import sys
 from PyQt5.QtWidgets import QApplication
 from ui.main_window import MainWindow
 from core.style_sheet import glass_style
+from core.metrics import start_configured_server
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
 
     app.setStyleSheet(glass_style)
+    start_configured_server()  # Only if "metrics_port" is set in the user config
 
     window = MainWindow()
     window.show()
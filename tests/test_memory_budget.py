@@ -0,0 +1,27 @@
+# tests/test_memory_budget.py — Peak RSS budgets of the image algorithms (benchmarks/bench_memory)
+#
+# Run from the project root:  python -m pytest tests
+#
+# Each algorithm embeds and extracts the bench's two carrier sizes in child processes; the test
+# fails if the round trip breaks or peak RSS growth goes over BUDGETS bytes per sample, either in
+# total at the larger size or per added sample between the sizes.
+
+import pytest
+
+from benchmarks.bench_memory import BUDGETS, DEFAULT_MEGAPIXELS, make_carriers, measure, check_budget
+
+
+@pytest.fixture(scope="module")
+def carriers(tmp_path_factory):
+    work_dir = str(tmp_path_factory.mktemp("memory_budget"))
+    return work_dir, make_carriers(work_dir, DEFAULT_MEGAPIXELS)
+
+
+@pytest.mark.parametrize("algorithm", sorted(BUDGETS))
+def test_peak_rss_within_budget(algorithm, carriers):
+    work_dir, paths = carriers
+    report = check_budget(algorithm, measure(algorithm, paths, work_dir))
+    assert report["round_trip"], f"{algorithm} did not return the embedded payload"
+    assert report["within_budget"], (
+        f"{algorithm}: {report['total']:.1f} B/sample in total, {report['embed_added']:.1f} embed and "
+        f"{report['extract_added']:.1f} extract per added sample; budget {BUDGETS[algorithm]}")
@@ -0,0 +1,231 @@
+# core/timing.py — Lightweight span timing for embedding/extraction jobs
+
+import os
+import json
+import time
+import threading
+import contextvars
+from datetime import datetime
+from utils.config import load_config
+
+TIMING_ENV = "RYGELOCK_TIMING"        # "1" enables timings for every job
+TRACE_DIR_ENV = "RYGELOCK_TRACE_DIR"  # Directory for Chrome trace-event JSON files
+
+# The recorder and tags (e.g. pair index) of the code currently running. Threads start with
+# an empty context, so pipeline stages re-bind them per item (see bind()).
+_recorder = contextvars.ContextVar("rygelock_timing_recorder", default=None)
+_tags = contextvars.ContextVar("rygelock_timing_tags", default=None)
+
+
+class _NullSpan:
+    """Returned when timing is off: every operation is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, n):
+        pass
+
+    def tag(self, **tags):
+        pass
+
+    def end(self):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, recorder, name, amount=0, unit="bytes", tags=None):
+        self.recorder = recorder
+        self.name = name
+        self.amount = amount
+        self.unit = unit
+        self.tags = tags
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.ended = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    def add(self, n):
+        self.amount += n
+
+    def tag(self, **tags):
+        """Attaches tags learned while the span runs (e.g. status, error); they show up in the trace."""
+        self.tags = {**(self.tags or {}), **tags}
+
+    def end(self):
+        if self.ended:
+            return
+        self.ended = True
+        self.recorder._record(self, time.perf_counter(), time.thread_time() - self.cpu_start)
+
+
+def span(name: str, amount: int = 0, unit: str = "bytes", **tags):
+    """
+    Times a block: `with span("kdf"): ...` or `s = span("write", n); ...; s.end()`.
+    `amount` counts bytes (or `unit`s) processed, for throughput. Costs one context
+    lookup when no recorder is active.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return NULL_SPAN
+    bound = _tags.get()
+    if bound:
+        tags = {**bound, **tags}
+    return Span(recorder, name, amount, unit, tags)
+
+
+class bind:
+    """Activates `recorder` (and tags such as pair=idx) for the current thread/context."""
+
+    def __init__(self, recorder, **tags):
+        self.recorder = recorder
+        self.tags = tags
+
+    def __enter__(self):
+        self._tokens = (_recorder.set(self.recorder), _tags.set({**(_tags.get() or {}), **self.tags}))
+        return self.recorder
+
+    def __exit__(self, *exc):
+        _recorder.reset(self._tokens[0])
+        _tags.reset(self._tokens[1])
+        return False
+
+
+def current_recorder():
+    return _recorder.get()
+
+
+class TimingRecorder:
+    """Collects finished spans for one job and summarizes them per pair and per stage."""
+
+    def __init__(self, job: str = "job"):
+        self.job = job
+        self.started = time.perf_counter()
+        self._events = []
+        self._lock = threading.Lock()
+
+    def _record(self, s: Span, end: float, cpu: float):
+        with self._lock:
+            self._events.append((s.name, s.start, end, cpu, s.amount, s.unit, s.tags, s.thread))
+
+    @staticmethod
+    def _stats(wall, cpu, calls, amounts) -> dict:
+        entry = {"wall_s": round(wall, 6), "cpu_s": round(cpu, 6), "calls": calls}
+        for unit, amount in amounts.items():
+            if not amount:
+                continue
+            if unit == "bytes":
+                entry["bytes"] = amount
+                entry["mb_per_s"] = round(amount / wall / 1e6, 2) if wall > 0 else None
+            else:
+                entry[unit] = amount
+                entry[f"{unit}_per_s"] = round(amount / wall, 1) if wall > 0 else None
+        return entry
+
+    def summary(self) -> dict:
+        """
+        {"wall_s": ..., "stages": {stage: stats}, "pairs": {pair: {stage: stats}}}
+        Stats per stage: wall_s, cpu_s, calls, and bytes/mb_per_s (or <unit>/<unit>_per_s).
+        Nested spans (e.g. kdf inside crypto) are reported separately, not subtracted.
+        """
+        totals, pairs = {}, {}
+        with self._lock:
+            events = list(self._events)
+        for name, start, end, cpu, amount, unit, tags, _ in events:
+            pair = (tags or {}).get("pair")
+            buckets = [totals] if pair is None else [totals, pairs.setdefault(str(pair), {})]
+            for bucket in buckets:
+                acc = bucket.setdefault(name, [0.0, 0.0, 0, {}])
+                acc[0] += end - start
+                acc[1] += cpu
+                acc[2] += 1
+                acc[3][unit] = acc[3].get(unit, 0) + amount
+
+        def finish(bucket):
+            return {name: self._stats(*acc) for name, acc in bucket.items()}
+
+        return {
+            "wall_s": round(time.perf_counter() - self.started, 6),
+            "stages": finish(totals),
+            "pairs": {pair: finish(bucket) for pair, bucket in sorted(pairs.items(), key=lambda kv: int(kv[0]))},
+        }
+
+    def chrome_trace(self) -> dict:
+        """Trace-event JSON (chrome://tracing, Perfetto): one complete ("X") event per span."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+        trace = []
+        for name, start, end, cpu, amount, unit, tags, thread in events:
+            args = dict(tags or {})
+            args["cpu_ms"] = round(cpu * 1000, 3)
+            if amount:
+                args[unit] = amount
+            trace.append({"name": name, "cat": self.job, "ph": "X", "pid": pid, "tid": thread,
+                          "ts": round((start - self.started) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                          "args": args})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> str:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        os.replace(tmp_path, path)
+        return path
+
+
+# --- Job configuration ---
+def timing_enabled(config: dict = None) -> bool:
+    """Job config "timing" wins, then RYGELOCK_TIMING, then the user config."""
+    if config and config.get("timing") is not None:
+        return bool(config["timing"])
+    if os.environ.get(TIMING_ENV):
+        return os.environ[TIMING_ENV].lower() not in ("0", "false", "no")
+    return bool(load_config().get("timing"))
+
+
+def _trace_dir(config: dict = None):
+    return (config or {}).get("trace_dir") or os.environ.get(TRACE_DIR_ENV) or load_config().get("trace_dir")
+
+
+def trace_path_for(job: str, config: dict = None):
+    """Where to write the Chrome trace for this job, or None (job config "trace_dir" or RYGELOCK_TRACE_DIR)."""
+    trace_dir = _trace_dir(config)
+    if not trace_dir:
+        return None
+    os.makedirs(trace_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(trace_dir, f"rygelock_{job}_{stamp}_{os.getpid()}.trace.json")
+
+
+def start_job_timing(job: str, config: dict = None):
+    """Returns a TimingRecorder if timing or tracing is enabled for this job, else None (zero overhead)."""
+    if timing_enabled(config) or _trace_dir(config):
+        return TimingRecorder(job)
+    return None
+
+
+def finish_job_timing(recorder, result: dict, config: dict = None):
+    """Adds result["timings"] and, when configured, writes the Chrome trace (result["trace_file"])."""
+    if recorder is None:
+        return
+    result["timings"] = recorder.summary()
+    path = trace_path_for(recorder.job, config)
+    if path:
+        try:
+            result["trace_file"] = recorder.write_chrome_trace(path)
+        except OSError as e:
+            print(f"[Timing] Could not write trace: {e}")